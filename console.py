@@ -10,22 +10,38 @@ Commands:
 - create: Creates a new object of a given class.
 - show: Displays an object based on class and ID.
 - destroy: Deletes an object based on class and ID.
-- all: Shows all objects, optionally filtered by class.
+- all: Shows all objects, optionally filtered by class and paginated.
 - update: Updates an object's attribute based on class, ID, and key-value.
+- compact: Folds the storage log into a fresh snapshot file.
+- fsck: Checks the storage files and reports the objects lost.
+- begin, commit, rollback: Group the following changes into one save,
+  or undo them.
+- nearby: Shows the objects of a class within a distance of a point.
+- nearest: Shows the objects of a class nearest to a point.
+- search: Shows the objects whose text matches keywords, best match first.
+- count: Shows the number of objects of a class.
+- stats: Shows the count, sum, average, minimum and maximum of an
+  attribute, optionally for each value of another attribute.
+- <class>.where(...): Shows the objects of a class matching conditions,
+  as in Place.where(price_by_night<100).order_by(-max_guest).limit(5);
+  ending the chain with .count() shows their number instead.
 
 The prompt for the CLI is set to "(hbnb) ".
 """
 
 import cmd
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.review import Review
-from models.place import Place
-from models.amenity import Amenity
+import re
 from models import storage
-from datetime import datetime
+from models.engine import model_classes
+
+
+ARGUMENTS = r'(?:"[^"]*"|\'[^\']*\'|[^()"\'])*'
+CALLS = re.compile(rf'(\.\w+\({ARGUMENTS}\))+')
+CALL = re.compile(rf'\.(\w+)\(({ARGUMENTS})\)')
+ARGUMENT = re.compile(r'(?:"[^"]*"|\'[^\']*\'|[^,])+')
+CONDITION = re.compile(r'\s*(\w+)\s*(==|!=|<=|>=|=|<|>)\s*(.*?)\s*')
+COMPARISONS = {'==': 'eq', '=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le',
+               '>': 'gt', '>=': 'ge'}
 
 
 class HBNBCommand(cmd.Cmd):
@@ -37,7 +53,11 @@ class HBNBCommand(cmd.Cmd):
     prompt = "(hbnb) "  # CLI prompt displayed to the user
 
     def do_quit(self, line):
-        """Handles the 'quit' command to exit the program."""
+        """
+        Handles the 'quit' command to exit the program, once the pending
+        writes of storage are done.
+        """
+        storage.close()
         return True
 
     def help_quit(self):
@@ -45,13 +65,40 @@ class HBNBCommand(cmd.Cmd):
         print("Quit command to exit the program\n")
 
     def do_EOF(self, line):
-        """Handles the End of File (Ctrl+D) command to exit."""
+        """
+        Handles the End of File (Ctrl+D) command to exit, once the
+        pending writes of storage are done.
+        """
+        storage.close()
         return True
 
     def emptyline(self):
         """Overrides default behavior; does nothing on empty input."""
         pass
 
+    @staticmethod
+    def check_instance_args(args):
+        """
+        Checks that the arguments name an existing class and an id,
+        printing the matching error message otherwise.
+
+        Args:
+            args (list): The command arguments.
+
+        Returns:
+            bool: True if both the class name and the id are present.
+        """
+        if not args:
+            print("** class name missing **")
+            return False
+        if args[0] not in HBNBCommand.allowed_classes:
+            print("** class doesn't exist **")
+            return False
+        if len(args) < 2:
+            print("** instance id missing **")
+            return False
+        return True
+
     def do_create(self, arg):
         """
         Creates a new instance of a class and saves it to storage.
@@ -67,7 +114,7 @@ class HBNBCommand(cmd.Cmd):
             if args[0] not in HBNBCommand.allowed_classes:
                 print("** class doesn't exist **")
             else:
-                obj = eval(f"{args[0]}()")
+                obj = model_classes()[args[0]]()
                 storage.new(obj)
                 storage.save()
                 print(obj.id)
@@ -84,28 +131,14 @@ class HBNBCommand(cmd.Cmd):
         Usage:
             show <class_name> <id>
         """
-        match_attrs = False
         args = arg.split()
-        if args:
-            if args[0] not in HBNBCommand.allowed_classes:
-                print("** class doesn't exist **")
-            try:
-                args[1]
-            except IndexError:
-                print("** instance id missing **")
-        else:
-            print("** class name missing **")
-
-        all_objs = storage.all()
-        for k, v in all_objs.items():
-            attr_names = k.split('.')
-            if attr_names[0] == args[0] and attr_names[1] == args[1]:
-                match_attrs = True
-                obj = eval(f"{args[0]}(**v)")
-                print(obj)
-                break
-        if not match_attrs:
+        if not self.check_instance_args(args):
+            return
+        obj = storage.get(args[0], args[1])
+        if obj is None:
             print("** no instance found **")
+        else:
+            print(obj)
 
     def do_destroy(self, arg):
         """
@@ -117,55 +150,69 @@ class HBNBCommand(cmd.Cmd):
         Usage:
             destroy <class_name> <id>
         """
-        match_attrs = False
         args = arg.split()
-        if args:
-            if args[0] not in HBNBCommand.allowed_classes:
-                print("** class doesn't exist **")
-            try:
-                args[1]
-            except IndexError:
-                print("** instance id missing **")
-        else:
-            print("** class name missing **")
-
-        all_objs = storage.all()
-        for k, v in all_objs.items():
-            attr_names = k.split('.')
-            if attr_names[0] == args[0] and attr_names[1] == args[1]:
-                del all_objs[k]
-                storage.save()
-                match_attrs = True
-                break
-        if not match_attrs:
+        if not self.check_instance_args(args):
+            return
+        obj = storage.get(args[0], args[1])
+        if obj is None:
             print("** no instance found **")
+        else:
+            storage.delete(obj)
+            storage.save()
 
     def do_all(self, arg):
         """
         Displays all instances or instances of a specific class.
 
+        The instances are printed one by one as storage yields them, in
+        the same list format as a whole, so the output starts at once and
+        no list of all the instances is built. --limit and --offset print
+        one page of the instances.
+
         Args:
-            arg (str): Optional class name to filter instances.
+            arg (str): Optional class name to filter instances, and
+                       optional --limit and --offset values.
 
         Usage:
-            all [<class_name>]
+            all [<class_name>] [--limit <n>] [--offset <n>]
         """
-        list1 = []
-        args = arg.split()
-        all_objs = storage.all()
-        if args:
-            if args[0] not in HBNBCommand.allowed_classes:
-                print("** class doesn't exist **")
+        args = arg.replace('=', ' ').split()
+        options = {'--limit': None, '--offset': 0}
+        cls = None
+        while args:
+            name = args.pop(0)
+            if name in options:
+                try:
+                    options[name] = int(args.pop(0))
+                except (IndexError, ValueError):
+                    print("** invalid number **")
+                    return
+                if options[name] < 0:
+                    print("** invalid number **")
+                    return
+            elif cls is None and name in HBNBCommand.allowed_classes:
+                cls = name
             else:
-                for k, v in all_objs.items():
-                    obj = eval(f"{args[0]}(**v)")
-                    list1.append(obj.__str__())
-        else:
-            for k, v in all_objs.items():
-                class_name = k.split('.')[0]
-                obj = eval(f"{class_name}(**v)")
-                list1.append(obj.__str__())
-        print(list1)
+                print("** class doesn't exist **")
+                return
+        self.print_objects(storage.iterate(cls, options['--offset'],
+                                           options['--limit']))
+
+    @staticmethod
+    def print_objects(objects):
+        """
+        Prints instances as a list of their string representations, one
+        by one as they are produced.
+
+        Args:
+            objects (iterable): The instances to print.
+        """
+        print('[', end='')
+        separator = ''
+        for obj in objects:
+            print(separator + repr(obj.__str__()), end='')
+            separator = ', '
+        print(']')
 
     def do_update(self, arg):
         """
@@ -178,7 +225,6 @@ class HBNBCommand(cmd.Cmd):
         Usage:
             update <class_name> <id> <attribute_name> <attribute_value>
         """
-        match_id = False
         args = arg.split()
         if not args:
             print("** class name missing **")
@@ -202,21 +248,271 @@ class HBNBCommand(cmd.Cmd):
                         except IndexError:
                             print("** value missing **")
                         else:
-                            all_objs = storage.all()
-                            for k, v in all_objs.items():
-                                if k == f"{args[0]}.{args[1]}":
-                                    class_name = k.split('.')[0]
-                                    obj = eval(f"{class_name}(**v)")
-                                    del all_objs[k]
-                                    setattr(obj, args[2],
-                                            convert_string(args[3]))
-                                    obj.updated_at = datetime.now()
-                                    storage.new(obj)
-                                    storage.save()
-                                    match_id = True
-                                    break
-                            if not match_id:
+                            obj = storage.get(args[0], args[1])
+                            if obj is None:
                                 print("** no instance found **")
+                                return
+                            setattr(obj, args[2], convert_string(args[3]))
+                            obj.save()
+
+    def do_compact(self, arg):
+        """
+        Folds the storage log into a fresh snapshot so the next start
+        only replays the changes made after it.
+
+        Usage:
+            compact
+        """
+        storage.compact()
+
+    def do_begin(self, arg):
+        """
+        Opens a transaction: the following changes are only saved by
+        commit, all at once, or undone by rollback.
+
+        Usage:
+            begin
+        """
+        try:
+            storage.begin()
+        except RuntimeError:
+            print("** transaction already open **")
+
+    def do_commit(self, arg):
+        """
+        Saves every change made since begin.
+
+        Usage:
+            commit
+        """
+        try:
+            storage.commit()
+        except RuntimeError:
+            print("** no transaction open **")
+
+    def do_rollback(self, arg):
+        """
+        Undoes every change made since begin.
+
+        Usage:
+            rollback
+        """
+        try:
+            storage.rollback()
+        except RuntimeError:
+            print("** no transaction open **")
+
+    def do_fsck(self, arg):
+        """
+        Reads every storage file and shows, for each one, the objects
+        found intact, the damaged byte ranges skipped, the bytes lost
+        and the read throughput.
+
+        Usage:
+            fsck
+        """
+        for report in storage.fsck():
+            name = report['format']
+            if report['compression'] is not None:
+                name += '+' + report['compression']
+            seconds = max(report['seconds'], 1e-9)
+            print(f"{report['path']}: {name}, {report['records']} "
+                  f"records, {report['size']} bytes in "
+                  f"{seconds * 1000:.1f} ms "
+                  f"({report['size'] / seconds / 1e6:.1f} MB/s)")
+            if report['error'] is not None:
+                print(f"  unreadable after {report['records']} records: "
+                      f"{report['error']}")
+            elif report['damaged']:
+                ranges = ', '.join(f"{start}-{end}"
+                                   for start, end in report['damaged'])
+                print(f"  {report['lost']} bytes lost in "
+                      f"{len(report['damaged'])} damaged ranges: {ranges}")
+            else:
+                print("  ok")
+
+    def do_nearby(self, arg):
+        """
+        Shows the instances of a class positioned within a distance of a
+        point, nearest first.
+
+        Args:
+            arg (str): Class name, latitude, longitude and distance in km.
+
+        Usage:
+            nearby <class_name> <latitude> <longitude> <radius_km>
+        """
+        args = self.check_geo_args(arg.split(), "radius")
+        if args is not None:
+            found = storage.nearby(args[0], args[1], args[2],
+                                   radius_km=args[3])
+            print([obj.__str__() for distance, obj in found])
+
+    def do_nearest(self, arg):
+        """
+        Shows the k instances of a class positioned nearest to a point,
+        nearest first.
+
+        Args:
+            arg (str): Class name, latitude, longitude and k.
+
+        Usage:
+            nearest <class_name> <latitude> <longitude> <k>
+        """
+        args = self.check_geo_args(arg.split(), "k")
+        if args is not None:
+            found = storage.nearby(args[0], args[1], args[2], k=int(args[3]))
+            print([obj.__str__() for distance, obj in found])
+
+    def do_search(self, arg):
+        """
+        Shows the instances whose indexed text uses any of the given
+        words, best match first, optionally of one class only.
+
+        Args:
+            arg (str): An optional class name followed by the words.
+
+        Usage:
+            search [<class_name>] <word> [<word> ...]
+        """
+        args = arg.split()
+        cls = None
+        if args and args[0] in HBNBCommand.allowed_classes:
+            cls = args.pop(0)
+        if not args:
+            print("** query missing **")
+            return
+        found = storage.search(' '.join(args), cls)
+        print([obj.__str__() for score, obj in found])
+
+    def do_count(self, arg):
+        """
+        Shows the number of instances of a class.
+
+        Args:
+            arg (str): Class name.
+
+        Usage:
+            count <class_name>
+        """
+        args = arg.split()
+        if not args:
+            print("** class name missing **")
+        elif args[0] not in HBNBCommand.allowed_classes:
+            print("** class doesn't exist **")
+        else:
+            print(storage.count(args[0]))
+
+    def do_stats(self, arg):
+        """
+        Shows the count, sum, average, minimum and maximum of a numeric
+        attribute over the instances of a class, or for each value of
+        another attribute. Values that are not numbers are skipped.
+
+        Args:
+            arg (str): Class name, attribute and optional grouping
+                       attribute.
+
+        Usage:
+            stats <class_name> <attribute_name> [by <attribute_name>]
+        """
+        args = arg.split()
+        if not args:
+            print("** class name missing **")
+        elif args[0] not in HBNBCommand.allowed_classes:
+            print("** class doesn't exist **")
+        elif len(args) < 2:
+            print("** attribute name missing **")
+        elif len(args) > 2 and (args[2] != "by" or len(args) < 4):
+            print("** usage: stats <class> <attribute> [by <attribute>] **")
+        else:
+            by = args[3] if len(args) > 2 else None
+            print(storage.aggregate(args[0], args[1], by))
+
+    def default(self, line):
+        """
+        Runs a query written as a chain of method calls on a class name,
+        for example Place.where(price_by_night<100, city_id="1234")
+        .order_by(-max_guest).offset(10).limit(5), and shows the matching
+        instances, or their number when the chain ends with .count().
+
+        Conditions compare an attribute to a value with ==, =, !=, <, <=,
+        > or >=. Quoted values may hold commas and parentheses. Any other
+        line is reported as unknown syntax.
+
+        Args:
+            line (str): The command line.
+        """
+        name, _, calls = line.partition('.')
+        if name not in HBNBCommand.allowed_classes or \
+                not CALLS.fullmatch('.' + calls.strip()):
+            return super().default(line)
+        query = storage.query(name)
+        counting = False
+        for method, args in CALL.findall('.' + calls):
+            if method == 'where':
+                for condition in ARGUMENT.findall(args):
+                    match = CONDITION.fullmatch(condition)
+                    if match is None:
+                        print("** invalid condition **")
+                        return
+                    attr, symbol, value = match.groups()
+                    query = query.where(**{
+                        f"{attr}__{COMPARISONS[symbol]}":
+                        convert_string(value)})
+            elif method == 'order_by' and args.strip():
+                query = query.order_by(args.strip().strip('"\''))
+            elif method in ('limit', 'offset'):
+                try:
+                    n = int(args)
+                except ValueError:
+                    n = -1
+                if n < 0:
+                    print("** invalid number **")
+                    return
+                query = getattr(query, method)(n)
+            elif method == 'count' and not args.strip():
+                counting = True
+            else:
+                return super().default(line)
+        if counting:
+            print(query.count())
+        else:
+            self.print_objects(query)
+
+    @staticmethod
+    def check_geo_args(args, last):
+        """
+        Checks the arguments of a distance query, printing the matching
+        error message when one is missing or is not a number, or when the
+        radius or k is negative.
+
+        Args:
+            args (list): The command arguments.
+            last (str): The name of the fourth argument.
+
+        Returns:
+            list: The class name followed by the three numbers, or None.
+        """
+        if not args:
+            print("** class name missing **")
+            return None
+        if args[0] not in HBNBCommand.allowed_classes:
+            print("** class doesn't exist **")
+            return None
+        names = ["latitude", "longitude", last]
+        if len(args) < 4:
+            print(f"** {names[len(args) - 1]} missing **")
+            return None
+        try:
+            numbers = [float(value) for value in args[1:4]]
+        except ValueError:
+            print("** invalid number **")
+            return None
+        if numbers[2] < 0 or last == "k" and not numbers[2].is_integer():
+            print("** invalid number **")
+            return None
+        return [args[0]] + numbers
 
 
 def convert_string(value):
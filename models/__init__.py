@@ -1,8 +1,59 @@
 #!/usr/bin/python3
 """__init__ method for models package, or
-Module for FileStorage autoinit."""
+Module for FileStorage autoinit.
 
-from models.engine.file_storage import FileStorage
+Setting the environment variable HBNB_TYPE_STORAGE to db stores the
+objects in the SQLite database named by HBNB_SQLITE_DB (./hbnb.db by
+default) instead of file.json.
 
-storage = FileStorage()
-storage.reload()
+Setting the environment variable HBNB_FILE_JOURNAL to 1 makes the
+storage append changes to a log file instead of rewriting file.json
+on every save, and setting HBNB_FILE_SHARDED to 1 stores each class
+in its own file. HBNB_FILE_MAX_LIVE and HBNB_FILE_MAX_LIVE_BYTES bound
+the number and the estimated memory of the instances kept hydrated,
+and setting HBNB_FILE_LAZY to 1 writes an offset index next to the
+file so that startup only reads the index and each object is parsed
+when it is first read. HBNB_FILE_FORMAT selects the format of the file,
+pretty (the default), compact, marshal or records, the checksummed
+format from which reload() recovers the intact objects of a damaged
+file, and HBNB_FILE_COMPRESSION its compression, gzip or lzma.
+HBNB_FILE_SYNC chooses when the writes are flushed to disk:
+always (the default), batched, every HBNB_FILE_SYNC_MS milliseconds
+(100 by default), or never. Setting HBNB_FILE_WRITE_BEHIND to 1 makes
+save() return at once and leaves the writing to a background thread,
+which writes once no save came for HBNB_FILE_DEBOUNCE_MS milliseconds
+(50 by default).
+
+A storage file that cannot be read does not stop the import: the error
+is printed, pointing to the fsck console command, and the objects read
+before it stay loaded."""
+
+from os import getenv
+from sys import stderr
+from models.engine.serializers import CorruptFileError
+
+if getenv('HBNB_TYPE_STORAGE') == 'db':
+    from models.engine.db_storage import DBStorage
+    storage = DBStorage(getenv('HBNB_SQLITE_DB'))
+else:
+    from models.engine.file_storage import FileStorage
+    max_live, max_live_bytes = (
+        int(value) if value else None
+        for value in (getenv('HBNB_FILE_MAX_LIVE'),
+                      getenv('HBNB_FILE_MAX_LIVE_BYTES')))
+    storage = FileStorage(journal=getenv('HBNB_FILE_JOURNAL') == '1',
+                          sharded=getenv('HBNB_FILE_SHARDED') == '1',
+                          max_live=max_live, max_live_bytes=max_live_bytes,
+                          lazy=getenv('HBNB_FILE_LAZY') == '1',
+                          serializer=getenv('HBNB_FILE_FORMAT'),
+                          compression=getenv('HBNB_FILE_COMPRESSION'),
+                          durability=getenv('HBNB_FILE_SYNC') or 'always',
+                          sync_interval_ms=int(
+                              getenv('HBNB_FILE_SYNC_MS') or 100),
+                          write_behind=getenv('HBNB_FILE_WRITE_BEHIND') == '1',
+                          debounce_ms=int(
+                              getenv('HBNB_FILE_DEBOUNCE_MS') or 50))
+try:
+    storage.reload()
+except CorruptFileError as e:
+    print(f"** {e}; run fsck to see what can be recovered **", file=stderr)
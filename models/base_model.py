@@ -51,7 +51,7 @@ class BaseModel:
             for k, v in kwargs.items():
                 if k != '__class__':
                     if k == 'created_at' or k == 'updated_at':
-                        v = datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%f')
+                        v = datetime.fromisoformat(v)
                     setattr(self, k, v)
         else:
             self.id = str(uuid4())
@@ -75,8 +75,10 @@ class BaseModel:
         Updates the updated_at attribute with the current datetime. This
         method is intended to be called whenever the instance is modified,
         providing an accurate timestamp of the last modification.
+        The instance is handed back to storage so the change is recorded.
         """
         self.updated_at = datetime.now()
+        storage.new(self)
         storage.save()
 
     def to_dict(self):
@@ -21,6 +21,10 @@ class City(BaseModel):
         name (str): The last name of the user. Defaults to an
                          empty string.
         state_id (str): state id from State class instance
+        _hash_indexes (tuple): Attributes indexed by the storage for
+                               equality lookups.
     """
     name = ""
     state_id = ""
+
+    _hash_indexes = ('state_id',)
@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+"""Storage engines for the models package."""
+
+
+def model_classes():
+    """
+    Returns the model classes that can be stored, keyed by class name.
+
+    The model modules import the storage from the models package, so they
+    are imported here lazily rather than when the engines are loaded.
+
+    Returns:
+        dict: The model classes keyed by their name.
+    """
+    from models.base_model import BaseModel
+    from models.user import User
+    from models.state import State
+    from models.city import City
+    from models.amenity import Amenity
+    from models.place import Place
+    from models.review import Review
+    return {cls.__name__: cls for cls in
+            (BaseModel, User, State, City, Amenity, Place, Review)}
@@ -0,0 +1,259 @@
+#!/usr/bin/python3
+"""
+This module defines the QueryCache class, a bounded cache of the
+results of storage reads, and the `cached` decorator that storage
+engines put on their read methods.
+
+Every class has a write version that the storage bumps whenever an
+object of the class is created, updated or deleted. A cached result is
+tagged with the version of its class when it is computed, and it is
+only served while that version is current, so a write makes the results
+of its class stale at once without touching the cache. Results that do
+not belong to one class are tagged with the number of writes to any
+class.
+
+The cache never holds the instances a result is made of: each instance
+is replaced by a Ref holding its "ClassName.id" key, and a hit rebuilds
+the result, asking the storage for the instance of each key. The
+instances are then the ones of the identity map of the storage, which
+the cache does not keep alive, so evicted or unused instances can still
+be freed.
+
+Classes:
+    Ref: The key of a stored instance within a cached result.
+    QueryCache: Least recently used cache of read results.
+
+Functions:
+    dehydrate: Replaces the instances within a result by their keys.
+    hydrate: Rebuilds a result, resolving the keys within it.
+    freeze: Converts a read argument to a hashable value.
+    cached: Decorator caching the results of a storage read method.
+"""
+
+import inspect
+from collections import OrderedDict
+from functools import wraps
+from models.engine.query import Query
+
+
+class Ref(str):
+    """The "ClassName.id" key of a stored instance within a cached
+    result."""
+
+    __slots__ = ()
+
+
+def dehydrate(value):
+    """
+    Replaces the stored instances within a result by Refs to their keys,
+    copying the lists, tuples and dictionaries holding them.
+
+    Args:
+        value: The result.
+
+    Returns:
+        The result without instances.
+    """
+    if isinstance(value, dict):
+        return {k: dehydrate(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(dehydrate(item) for item in value)
+    if hasattr(value, 'to_dict') and hasattr(value, 'id'):
+        return Ref(f"{type(value).__name__}.{value.id}")
+    return value
+
+
+def hydrate(value, resolve):
+    """
+    Rebuilds a result made by dehydrate(), in new lists, tuples and
+    dictionaries, with the instance of each Ref.
+
+    Args:
+        value: The dehydrated result.
+        resolve (callable): Returns the instance of a "ClassName.id" key.
+
+    Returns:
+        The result.
+    """
+    if isinstance(value, dict):
+        return {k: hydrate(v, resolve) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(hydrate(item, resolve) for item in value)
+    if type(value) is Ref:
+        return resolve(value)
+    return value
+
+
+class QueryCache:
+    """
+    Least recently used cache of read results, invalidated by class
+    write versions.
+
+    Attributes:
+        capacity (int): The maximum number of cached results. 0 disables
+                        the cache.
+        resolve (callable): Returns the stored instance of a
+                            "ClassName.id" key.
+        hits (int): The number of reads served from the cache.
+        misses (int): The number of reads that had to be computed.
+        __entries (OrderedDict): (version, result) pairs keyed by read,
+                                 least recently used first.
+        __versions (dict): The write version of each class name.
+        __writes (int): The number of writes to any class.
+    """
+
+    def __init__(self, capacity=256, resolve=None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            capacity (int): The maximum number of cached results.
+            resolve (callable): Returns the stored instance of a
+                                "ClassName.id" key. Without it, the
+                                results must not hold instances.
+        """
+        self.capacity = capacity
+        self.resolve = resolve
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__versions = {}
+        self.__writes = 0
+
+    def __len__(self):
+        """Returns the number of cached results, stale ones included."""
+        return len(self.__entries)
+
+    def bump(self, name):
+        """
+        Records a write to a class, making its cached results stale.
+
+        Args:
+            name (str): The class name.
+        """
+        self.__versions[name] = self.__versions.get(name, 0) + 1
+        self.__writes += 1
+
+    def version(self, name):
+        """
+        Returns the current write version of a class.
+
+        Args:
+            name (str): The class name, or None for every class.
+        """
+        if name is None:
+            return self.__writes
+        return self.__versions.get(name, 0)
+
+    def clear(self):
+        """
+        Drops every cached result, for when the stored objects were
+        replaced as a whole.
+        """
+        self.__entries.clear()
+        self.__writes += 1
+
+    def lookup(self, key, name, compute):
+        """
+        Returns the cached result of a read while it is current, or
+        computes and caches it. The result returned is never the cached
+        one: a hit is rebuilt from the cache, and a computed result is
+        cached as a dehydrated copy.
+
+        Args:
+            key (tuple): The hashable description of the read.
+            name (str): The class name the result depends on, or None
+                        when it depends on every class.
+            compute (callable): Computes the result.
+
+        Returns:
+            The result.
+        """
+        version = self.version(name)
+        entry = self.__entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return hydrate(entry[1], self.resolve)
+        self.misses += 1
+        result = compute()
+        if self.capacity > 0:
+            self.__entries[key] = (version, dehydrate(result))
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.capacity:
+                self.__entries.popitem(last=False)
+        return result
+
+
+def freeze(value):
+    """
+    Converts a read argument to a hashable value: lists and tuples to
+    tuples, sets to frozensets, dictionaries to sorted item tuples,
+    queries to their description, classes to their name, and any other
+    value to a (type, value) pair, so that 1, 1.0 and True, which are
+    equal, make different keys.
+
+    Args:
+        value: The argument.
+
+    Returns:
+        The hashable equivalent.
+
+    Raises:
+        TypeError: If the value cannot be made hashable.
+    """
+    if isinstance(value, Query):
+        return ('query', value.cls, freeze(value.conditions), value.order,
+                value.start, value.size)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, type):
+        return freeze(value.__name__)
+    hash(value)
+    return type(value), value
+
+
+def cached(method):
+    """
+    Caches the results of a read method of a storage engine in the
+    QueryCache held by its `cache` attribute. The `cls` argument of the
+    method, or the Query given as its `query` argument, tells which
+    write version the result depends on; without either, or with `cls`
+    None, the result depends on every class.
+
+    The lists, tuples and dictionaries of a result are new on every
+    call, so callers can change them without changing the cached
+    result. The instances in them are the stored instances themselves,
+    as without the cache: changing one changes the stored object, and
+    must be followed by new() and save() as usual. Reads whose arguments
+    cannot be made hashable are not cached.
+
+    Args:
+        method (callable): The read method.
+
+    Returns:
+        callable: The caching method.
+    """
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    def read(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments['self']
+        cls = arguments.get('cls')
+        if isinstance(arguments.get('query'), Query):
+            cls = arguments['query'].cls
+        name = cls if cls is None or isinstance(cls, str) else cls.__name__
+        try:
+            key = (method.__name__, freeze(arguments))
+        except TypeError:
+            return method(self, *args, **kwargs)
+        return self.cache.lookup(
+            key, name, lambda: method(self, *args, **kwargs))
+    return read
@@ -0,0 +1,357 @@
+#!/usr/bin/python3
+"""
+This module defines the ColumnStore class, a columnar mirror of some
+attributes of the objects of a model class, used by FileStorage to
+compute aggregates without going through one object per row.
+
+A model class lists the mirrored attributes in `_columns`, for example
+`_columns = ('city_id', 'price_by_night')` on Place. Attributes whose
+class default is a number are kept as 8-byte floats in an array.array,
+one contiguous buffer per attribute. The other attributes are
+dictionary-encoded: each distinct value is stored once and the rows
+hold its integer code, so they can be used to group the rows.
+
+The aggregates run on NumPy views of the buffers when NumPy is
+installed, and in a plain loop over the arrays otherwise.
+
+Classes:
+    ColumnStore: Keeps attributes of many objects in typed arrays.
+
+Functions:
+    accumulate: Computes count, sum and bounds by group in one pass.
+    summarize: Builds the statistics of a series of values.
+    aggregate_objects: Computes statistics in one pass over objects.
+"""
+
+from array import array
+from math import isnan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MISSING = float('nan')
+
+
+class ColumnStore:
+    """
+    Columnar copy of some attributes of the objects of one class.
+
+    Each object takes one row, the same position in every column. A
+    numeric column holds NaN for a value that is not a number, and a
+    dictionary-encoded column holds -1 for a value that cannot be hashed.
+    When an object is removed, the last row is moved into its place, so
+    the columns never have holes.
+
+    Attributes:
+        attrs (tuple): The names of the mirrored attributes.
+        __kinds (dict): The type of the class default of each attribute,
+                        known once the first object is added.
+        __columns (dict): The array holding each attribute.
+        __codes (dict): For each dictionary-encoded attribute, the code
+                        of each distinct value.
+        __values (dict): For each dictionary-encoded attribute, the
+                         distinct values in code order.
+        __rows (dict): The row of each "ClassName.id" key.
+        __keys (list): The key of each row.
+    """
+
+    def __init__(self, *attrs):
+        """
+        Initializes an empty store.
+
+        Args:
+            *attrs (str): The names of the attributes to mirror.
+        """
+        self.attrs = attrs
+        self.__kinds = None
+        self.__columns = {}
+        self.__codes = {}
+        self.__values = {}
+        self.__rows = {}
+        self.__keys = []
+
+    def __len__(self):
+        """Returns the number of rows."""
+        return len(self.__keys)
+
+    def __setup(self, cls):
+        """
+        Creates the empty columns from the class defaults: a float array
+        for a number, a code array for anything else.
+
+        Args:
+            cls (type): The model class.
+        """
+        self.__kinds = {}
+        for attr in self.attrs:
+            kind = type(getattr(cls, attr, None))
+            self.__kinds[attr] = kind
+            if kind in (int, float):
+                self.__columns[attr] = array('d')
+            else:
+                self.__columns[attr] = array('q')
+                self.__codes[attr] = {}
+                self.__values[attr] = []
+
+    def __cell(self, attr, value):
+        """
+        Converts a value to what its column stores.
+
+        Args:
+            attr (str): The name of the attribute.
+            value: The value of the attribute.
+
+        Returns:
+            float or int: The float, or the code of the value.
+        """
+        codes = self.__codes.get(attr)
+        if codes is None:
+            return float(value) if type(value) in (int, float) else MISSING
+        try:
+            code = codes.get(value)
+        except TypeError:
+            return -1
+        if code is None:
+            code = codes[value] = len(codes)
+            self.__values[attr].append(value)
+        return code
+
+    def add(self, key, obj):
+        """
+        Stores the attributes of an object, overwriting the row of an
+        older version.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel): The object to store.
+        """
+        if self.__kinds is None:
+            self.__setup(obj.__class__)
+        row = self.__rows.get(key)
+        if row is None:
+            self.__rows[key] = len(self.__keys)
+            self.__keys.append(key)
+            for attr, column in self.__columns.items():
+                column.append(self.__cell(attr, getattr(obj, attr, None)))
+            return
+        for attr, column in self.__columns.items():
+            column[row] = self.__cell(attr, getattr(obj, attr, None))
+
+    def discard(self, key):
+        """
+        Removes the row of a key, if it is stored, by moving the last row
+        into its place.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+        """
+        row = self.__rows.pop(key, None)
+        if row is None:
+            return
+        last = self.__keys.pop()
+        for column in self.__columns.values():
+            value = column.pop()
+            if last != key:
+                column[row] = value
+        if last != key:
+            self.__keys[row] = last
+            self.__rows[last] = row
+
+    def aggregate(self, attr, by=None):
+        """
+        Computes the count, sum, average, minimum and maximum of a numeric
+        attribute over every row, or over the rows of each value of
+        another attribute. Rows whose value is not a number are skipped.
+
+        Args:
+            attr (str): The numeric attribute to summarize.
+            by (str): The attribute to group the rows by, or None.
+
+        Returns:
+            dict: The statistics as returned by summarize(), or, when `by`
+                  is given, the statistics of each value of `by` that has
+                  numeric values. Values of `by` that cannot be hashed are
+                  grouped under None.
+
+        Raises:
+            KeyError: If an attribute is not mirrored, or `attr` is not a
+                      numeric column.
+        """
+        for name in (attr, by):
+            if name is not None and name not in self.attrs:
+                raise KeyError(name)
+        if self.__kinds is None:
+            return {} if by is not None else summarize(0, 0, None, None)
+        if attr in self.__codes:
+            raise KeyError(attr)
+        values = self.__columns[attr]
+        if by is None:
+            stats = {None: self.__summary(values)}
+        elif by in self.__codes:
+            stats = self.__grouped(values, self.__columns[by],
+                                   self.__values[by])
+        else:
+            stats = accumulate(
+                (None if isnan(group) else
+                 int(group) if group.is_integer() else group, value)
+                for group, value in zip(self.__columns[by], values)
+                if not isnan(value))
+        integral = self.__kinds[attr] is int
+        stats = {group: summarize(*entry, integral=integral)
+                 for group, entry in stats.items()}
+        return stats[None] if by is None else stats
+
+    @staticmethod
+    def __summary(values):
+        """
+        Computes the count, sum, minimum and maximum of a float column,
+        skipping NaN.
+
+        Args:
+            values (array): The column.
+
+        Returns:
+            tuple: (count, sum, minimum, maximum), the bounds being None
+                   when there is no value.
+        """
+        if numpy is not None:
+            data = numpy.frombuffer(values, dtype=numpy.float64)
+            data = data[~numpy.isnan(data)]
+            if not len(data):
+                return 0, 0, None, None
+            return (len(data), float(data.sum()), float(data.min()),
+                    float(data.max()))
+        stats = accumulate((None, value) for value in values
+                           if not isnan(value))
+        return stats.get(None, (0, 0, None, None))
+
+    @staticmethod
+    def __grouped(values, codes, names):
+        """
+        Computes the count, sum, minimum and maximum of a float column
+        for each code of a code column, skipping NaN.
+
+        Args:
+            values (array): The float column.
+            codes (array): The code column.
+            names (list): The value of each code.
+
+        Returns:
+            dict: (count, sum, minimum, maximum) for each value of the
+                  code column that has numbers.
+        """
+        if numpy is None:
+            stats = accumulate((code, value)
+                               for code, value in zip(codes, values)
+                               if not isnan(value))
+            return {(names[code] if code >= 0 else None): entry
+                    for code, entry in stats.items()}
+        data = numpy.frombuffer(values, dtype=numpy.float64)
+        slots = numpy.frombuffer(codes, dtype=numpy.int64) + 1
+        present = ~numpy.isnan(data)
+        data = data[present]
+        slots = slots[present]
+        size = len(names) + 1
+        counts = numpy.bincount(slots, minlength=size)
+        sums = numpy.bincount(slots, weights=data, minlength=size)
+        lows = numpy.full(size, numpy.inf)
+        highs = numpy.full(size, -numpy.inf)
+        numpy.minimum.at(lows, slots, data)
+        numpy.maximum.at(highs, slots, data)
+        return {(names[slot - 1] if slot else None):
+                (int(counts[slot]), float(sums[slot]),
+                 float(lows[slot]), float(highs[slot]))
+                for slot in numpy.flatnonzero(counts).tolist()}
+
+
+def accumulate(pairs):
+    """
+    Computes the count, sum, minimum and maximum of numbers by group in a
+    single pass.
+
+    Args:
+        pairs (iterable): (group, number) pairs.
+
+    Returns:
+        dict: [count, sum, minimum, maximum] for each group.
+    """
+    stats = {}
+    for group, value in pairs:
+        entry = stats.get(group)
+        if entry is None:
+            stats[group] = [1, value, value, value]
+            continue
+        entry[0] += 1
+        entry[1] += value
+        if value < entry[2]:
+            entry[2] = value
+        elif value > entry[3]:
+            entry[3] = value
+    return stats
+
+
+def summarize(count, total, low, high, integral=False):
+    """
+    Builds the statistics of a series of numbers.
+
+    Args:
+        count (int): The number of values.
+        total (float): Their sum.
+        low (float): The smallest value, or None when there is none.
+        high (float): The largest value, or None when there is none.
+        integral (bool): If True, the sum and bounds are given as ints
+                         when they are whole numbers.
+
+    Returns:
+        dict: The 'count', 'sum', 'avg', 'min' and 'max' of the values,
+              'avg', 'min' and 'max' being None when there is no value.
+    """
+    def number(value):
+        if integral and type(value) is float and value.is_integer():
+            return int(value)
+        return value
+    return {'count': count, 'sum': number(total),
+            'avg': total / count if count else None,
+            'min': number(low), 'max': number(high)}
+
+
+def aggregate_objects(objects, attr, by=None, kind=None):
+    """
+    Computes the same statistics as ColumnStore.aggregate() in a single
+    pass over objects, for attributes that are not mirrored in columns.
+
+    Args:
+        objects (iterable): The instances to summarize.
+        attr (str): The numeric attribute to summarize.
+        by (str): The attribute to group the objects by, or None.
+        kind (type): The type of the class default of `attr`. When it is
+                     int or float, the values are summarized as floats,
+                     with whole sums and bounds given as ints for int, as
+                     the columns do, so both give the same types.
+
+    Returns:
+        dict: The statistics as returned by summarize(), or the statistics
+              of each value of `by` when it is given.
+    """
+    def pairs():
+        for obj in objects:
+            value = getattr(obj, attr, None)
+            if type(value) not in (int, float):
+                continue
+            if kind in (int, float):
+                value = float(value)
+            group = None if by is None else getattr(obj, by, None)
+            try:
+                hash(group)
+            except TypeError:
+                group = None
+            yield group, value
+    stats = accumulate(pairs())
+    integral = kind is int
+    if by is None:
+        return summarize(*stats.get(None, (0, 0, None, None)),
+                         integral=integral)
+    return {group: summarize(*entry, integral=integral)
+            for group, entry in stats.items()}
@@ -0,0 +1,1156 @@
+#!/usr/bin/python3
+"""
+This module defines the DBStorage class, a storage engine backed by a
+SQLite database through the standard library sqlite3 module.
+
+It offers the same interface as FileStorage, but objects stay in the
+database and are only read when they are asked for, so nothing is
+loaded into memory when the models package is imported.
+
+Classes:
+    DBStorage: Stores model instances in one SQLite table per class.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from heapq import merge, nlargest, nsmallest
+from itertools import islice
+from weakref import WeakValueDictionary
+from models.engine import model_classes
+from models.engine.cache import QueryCache, cached
+from models.engine.columns import aggregate_objects, summarize
+from models.engine.indexes import KM_PER_DEGREE, TextIndex, geo_window, \
+    haversine, in_range, nearest, order_key, tokenize
+from models.engine.query import OPERATORS, Query
+
+SQL_TYPES = {str: 'TEXT', int: 'INTEGER', float: 'REAL', list: 'TEXT'}
+SQL_OPERATORS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>',
+                 'ge': '>='}
+
+
+class DBStorage:
+    """
+    The DBStorage class stores model instances in a SQLite database with
+    one table per model class.
+
+    Each table has an `id` primary key, the `created_at` and `updated_at`
+    timestamps and one column per attribute declared on the class. Values
+    whose type differs from the declared one and attributes that are not
+    declared are kept as JSON in the `_extra` column. Every column whose
+    name ends in `_id` is indexed, and so is every attribute listed in the
+    `_hash_indexes` or `_range_indexes` of the class. The attributes listed
+    in the `_text_index` of a class are copied to an FTS5 full-text table,
+    "<ClassName>_text", whose rows share the rowid of the table rows.
+
+    Statements are built once per class and reused, so sqlite3 serves them
+    from its prepared statement cache. Changes are made inside a
+    transaction that save() commits.
+
+    Rows are returned as model instances. A weak identity map keeps track
+    of the instances in use, so reading a row that is already loaded
+    returns the same instance instead of building a new one.
+
+    The results of the queries are kept in a bounded LRU cache and
+    served again until new() or delete() changes an object of their
+    class, or reload() reopens the database. Changes made to the
+    database by another connection are not seen by cached reads. The
+    cache holds the keys of the instances only, so it does not keep
+    them loaded; all() and get() are not cached.
+
+    Attributes:
+        __db_path (str): The path to the SQLite database file.
+        __conn (sqlite3.Connection): The open database connection.
+        __tables (dict): For each class name, the declared attributes as
+                         (name, type) pairs and the SQL statements used
+                         on its table.
+        __classes (dict): The model classes keyed by name.
+        __live (WeakValueDictionary): The loaded instances in use, keyed
+                                      by "ClassName.id".
+        __touched (dict): The instances written or deleted in the open
+                          transaction keyed by "ClassName.id", or None
+                          when no transaction is open.
+        cache (QueryCache): The cache of read results.
+
+    Methods:
+        all(cls): Returns the stored objects, optionally of one class.
+        new(obj): Inserts or replaces an object in its table.
+        delete(obj): Removes an object from its table.
+        save(): Commits the current transaction, unless one was opened
+                with begin().
+        begin(): Opens a transaction.
+        commit(): Commits the transaction.
+        rollback(): Undoes the changes of the transaction.
+        transaction(): Runs a block of code as a transaction.
+        reload(): Opens the database and creates missing tables.
+        iterate(cls, offset, limit): Yields the stored objects one page
+                                     at a time.
+        get(cls, id): Returns one object by class and id.
+        count(cls): Returns the number of stored objects.
+        find(cls, **eq): Returns the objects whose attributes have the
+                         given values.
+        between(cls, **bounds): Returns the objects whose attributes lie
+                                in the given ranges, optionally ordered.
+        having(cls, attr): Returns the objects whose list attribute holds
+                           the given items.
+        nearby(cls, lat, lon): Returns the objects within a distance of
+                               a point, or the nearest ones.
+        search(query): Returns the objects whose text matches words of
+                       a query, best match first.
+        aggregate(cls, attr): Returns the count, sum, average, minimum
+                              and maximum of an attribute.
+        query(cls): Returns a query on the objects of a class.
+        select(query): Runs a query.
+        explain(query): Describes how a query is run.
+        compact(): Commits and reclaims unused space in the database.
+        fsck(): Checks the integrity of the database file.
+        close(): Commits and closes the database connection.
+    """
+
+    __db_path = './hbnb.db'
+
+    def __init__(self, db_path=None, cache_size=256):
+        """
+        Initializes the storage engine.
+
+        Args:
+            db_path (str): The path to the SQLite database file. Defaults
+                           to './hbnb.db'.
+            cache_size (int): The number of query results kept in the
+                              cache. 0 disables the cache.
+        """
+        if db_path is not None:
+            self.__db_path = db_path
+        self.__conn = None
+        self.__tables = {}
+        self.__classes = {}
+        self.__live = WeakValueDictionary()
+        self.__touched = None
+        self.cache = QueryCache(cache_size, self.__resolve)
+
+    def reload(self):
+        """
+        Opens the database and creates the table and indexes of every
+        model class that does not have them yet. No rows are read, except
+        to fill a full-text table created for rows stored before it.
+        """
+        if self.__conn is not None:
+            self.__conn.close()
+        self.__touched = None
+        self.__conn = sqlite3.connect(self.__db_path,
+                                      check_same_thread=False)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.execute('PRAGMA synchronous=NORMAL')
+        self.__classes = model_classes()
+        self.__live = WeakValueDictionary()
+        self.cache.clear()
+        for name, cls in self.__classes.items():
+            self.__tables[name] = self.__create_table(name, cls)
+            text_attrs = getattr(cls, '_text_index', ())
+            if text_attrs:
+                self.__tables[name].update(
+                    self.__create_text_table(name, text_attrs))
+        self.__conn.commit()
+
+    def __create_table(self, name, cls):
+        """
+        Creates the table of a model class and its indexes.
+
+        Args:
+            name (str): The class name, also used as the table name.
+            cls (type): The model class.
+
+        Returns:
+            dict: The declared attributes and the SQL statements of the
+                  table.
+        """
+        attrs = [(k, type(v)) for k, v in vars(cls).items()
+                 if not k.startswith('_') and type(v) in SQL_TYPES]
+        columns = ['id', 'created_at', 'updated_at'] + \
+            [k for k, t in attrs] + ['_extra']
+        definitions = ['"id" TEXT PRIMARY KEY',
+                       '"created_at" TEXT NOT NULL',
+                       '"updated_at" TEXT NOT NULL'] + \
+            [f'"{k}" {SQL_TYPES[t]}' for k, t in attrs] + ['"_extra" TEXT']
+        self.__conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" '
+                            f'({", ".join(definitions)})')
+        indexed = set(getattr(cls, '_hash_indexes', ())) | \
+            set(getattr(cls, '_range_indexes', ()))
+        for k, t in attrs:
+            if k.endswith('_id') or k in indexed:
+                self.__conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{name}_{k}" '
+                    f'ON "{name}" ("{k}")')
+        names = ', '.join(f'"{c}"' for c in columns)
+        return {
+            'attrs': attrs,
+            'columns': columns,
+            'upsert': f'INSERT OR REPLACE INTO "{name}" ({names}) '
+                      f'VALUES ({", ".join("?" * len(columns))})',
+            'select': f'SELECT {names} FROM "{name}"',
+            'page': f'SELECT {names} FROM "{name}" ORDER BY "id" '
+                    f'LIMIT ? OFFSET ?',
+            'get': f'SELECT {names} FROM "{name}" WHERE "id" = ?',
+            'delete': f'DELETE FROM "{name}" WHERE "id" = ?',
+            'count': f'SELECT COUNT(*) FROM "{name}"',
+        }
+
+    def __create_text_table(self, name, text_attrs):
+        """
+        Creates the full-text table of a model class, filled from the rows
+        already stored when it is new.
+
+        Args:
+            name (str): The class name.
+            text_attrs (tuple): The names of the attributes to index.
+
+        Returns:
+            dict: The full-text attributes and statements, or only the
+                  attributes when this SQLite build lacks FTS5.
+        """
+        text = f'"{name}_text"'
+        names = ', '.join(f'"{k}"' for k in text_attrs)
+        insert = f'INSERT INTO {text} (rowid, {names}) ' \
+            f'VALUES (?{", ?" * len(text_attrs)})'
+        exists = self.__conn.execute(
+            'SELECT 1 FROM sqlite_master WHERE name = ?',
+            (f'{name}_text',)).fetchone()
+        if not exists:
+            try:
+                self.__conn.execute(
+                    f'CREATE VIRTUAL TABLE {text} USING fts5({names})')
+            except sqlite3.OperationalError:
+                return {'text_attrs': text_attrs}
+            select = self.__tables[name]['select'].replace(
+                ' FROM', ', rowid FROM', 1)
+            for row in self.__conn.execute(select).fetchall():
+                data = self.__from_row(name, row[:-1])
+                self.__conn.execute(insert, (row[-1],) + tuple(
+                    data[k] if type(data.get(k)) is str else None
+                    for k in text_attrs))
+        columns = ', '.join(f'"{name}"."{c}"'
+                            for c in self.__tables[name]['columns'])
+        return {
+            'text_attrs': text_attrs,
+            'text_insert': insert,
+            'text_delete': f'DELETE FROM {text} WHERE rowid = '
+                           f'(SELECT rowid FROM "{name}" WHERE "id" = ?)',
+            'search': f'SELECT {columns}, -m.score FROM "{name}" JOIN '
+                      f'(SELECT rowid, bm25({text}) AS score FROM {text} '
+                      f'WHERE {text} MATCH ? ORDER BY score LIMIT ?) AS m '
+                      f'ON "{name}".rowid = m.rowid ORDER BY m.score',
+        }
+
+    @staticmethod
+    def __name(cls):
+        """
+        Returns the class name for a model class or a class name.
+
+        Args:
+            cls (type or str): The model class or its name.
+        """
+        return cls if isinstance(cls, str) else cls.__name__
+
+    def __to_row(self, name, obj):
+        """
+        Converts an object to the row stored in its table.
+
+        Args:
+            name (str): The class name.
+            obj (BaseModel): The object to convert.
+
+        Returns:
+            tuple: The column values, in table order.
+        """
+        data = obj.to_dict()
+        del data['__class__']
+        row = [data.pop('id'), data.pop('created_at'), data.pop('updated_at')]
+        for k, t in self.__tables[name]['attrs']:
+            value = data.get(k)
+            if type(value) is not t:
+                row.append(None)
+                continue
+            del data[k]
+            row.append(json.dumps(value) if t is list else value)
+        row.append(json.dumps(data) if data else None)
+        return tuple(row)
+
+    def __from_row(self, name, row):
+        """
+        Converts a table row back to the dictionary representation of
+        the object, as returned by to_dict().
+
+        Args:
+            name (str): The class name.
+            row (tuple): The column values, in table order.
+
+        Returns:
+            dict: The dictionary representation of the object.
+        """
+        data = {'__class__': name, 'id': row[0],
+                'created_at': row[1], 'updated_at': row[2]}
+        for (k, t), value in zip(self.__tables[name]['attrs'], row[3:-1]):
+            if value is not None:
+                data[k] = json.loads(value) if t is list else value
+        if row[-1] is not None:
+            data.update(json.loads(row[-1]))
+        return data
+
+    def __hydrate(self, name, row):
+        """
+        Returns the instance stored in a table row, reusing the loaded
+        instance when there is one.
+
+        Args:
+            name (str): The class name.
+            row (tuple): The column values, in table order.
+
+        Returns:
+            BaseModel: The instance.
+        """
+        key = f"{name}.{row[0]}"
+        obj = self.__live.get(key)
+        if obj is None:
+            obj = self.__classes[name](**self.__from_row(name, row))
+            self.__live[key] = obj
+        return obj
+
+    def __resolve(self, key):
+        """
+        Returns the instance stored under a key, reusing the loaded
+        instance when there is one.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+
+        Returns:
+            BaseModel: The instance, or None if it is not stored.
+        """
+        obj = self.__live.get(key)
+        if obj is not None:
+            return obj
+        name, id = key.split('.', 1)
+        if name not in self.__tables:
+            return None
+        row = self.__conn.execute(self.__tables[name]['get'],
+                                  (id,)).fetchone()
+        return None if row is None else self.__hydrate(name, row)
+
+    def all(self, cls=None):
+        """
+        Retrieves the stored objects, optionally of a single class.
+
+        Args:
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+
+        Returns:
+            dict: The instances keyed by "ClassName.id".
+        """
+        names = self.__tables if cls is None else [self.__name(cls)]
+        objects = {}
+        for name in names:
+            for row in self.__conn.execute(self.__tables[name]['select']):
+                objects[f"{name}.{row[0]}"] = self.__hydrate(name, row)
+        return objects
+
+    def iterate(self, cls=None, offset=0, limit=None):
+        """
+        Iterates over the stored objects, or over the objects of one
+        class, reading the rows from the database as they are consumed.
+
+        The objects of each class come in the order of their ids. Whole
+        classes that fall within the offset are skipped by counting their
+        rows, and the rest of the offset is skipped in SQL.
+
+        Args:
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+            offset (int): The number of objects to skip.
+            limit (int): The maximum number of objects to yield, or None
+                         for no limit.
+
+        Yields:
+            BaseModel: The instances.
+        """
+        names = self.__tables if cls is None else [self.__name(cls)]
+        for name in names:
+            if limit is not None and limit <= 0:
+                return
+            if offset:
+                size = self.count(name)
+                if offset >= size:
+                    offset -= size
+                    continue
+            rows = self.__conn.execute(
+                self.__tables[name]['page'],
+                (-1 if limit is None else limit, offset))
+            offset = 0
+            for row in rows:
+                if limit is not None:
+                    limit -= 1
+                yield self.__hydrate(name, row)
+
+    def new(self, obj):
+        """
+        Inserts the object into its table, replacing an older version.
+
+        Args:
+            obj (BaseModel): The object to store.
+        """
+        name = type(obj).__name__
+        table = self.__tables[name]
+        if 'text_insert' in table:
+            self.__conn.execute(table['text_delete'], (obj.id,))
+        rowid = self.__conn.execute(table['upsert'],
+                                    self.__to_row(name, obj)).lastrowid
+        if 'text_insert' in table:
+            self.__conn.execute(table['text_insert'], (rowid,) + tuple(
+                value if type(value) is str else None
+                for value in (getattr(obj, k, None)
+                              for k in table['text_attrs'])))
+        self.__live[f"{name}.{obj.id}"] = obj
+        if self.__touched is not None:
+            self.__touched[f"{name}.{obj.id}"] = obj
+        self.cache.bump(name)
+
+    def delete(self, obj=None):
+        """
+        Removes an object from its table.
+
+        Args:
+            obj (BaseModel): The object to remove. Nothing happens if it is
+                             None.
+        """
+        if obj is None:
+            return
+        name = type(obj).__name__
+        table = self.__tables[name]
+        if 'text_delete' in table:
+            self.__conn.execute(table['text_delete'], (obj.id,))
+        self.__conn.execute(table['delete'], (obj.id,))
+        self.__live.pop(f"{name}.{obj.id}", None)
+        if self.__touched is not None:
+            self.__touched[f"{name}.{obj.id}"] = obj
+        self.cache.bump(name)
+
+    def save(self):
+        """
+        Commits the changes made since the last save. While a transaction
+        is open nothing is committed until commit().
+        """
+        if self.__touched is None:
+            self.__conn.commit()
+
+    def begin(self):
+        """
+        Opens a transaction. The changes made before it are committed
+        first.
+
+        Raises:
+            RuntimeError: If a transaction is already open.
+        """
+        if self.__touched is not None:
+            raise RuntimeError("a transaction is already open")
+        self.__conn.commit()
+        self.__touched = {}
+
+    def commit(self):
+        """
+        Closes the transaction and commits every change made in it.
+
+        Raises:
+            RuntimeError: If no transaction is open.
+        """
+        if self.__touched is None:
+            raise RuntimeError("no transaction is open")
+        self.__touched = None
+        self.__conn.commit()
+
+    def rollback(self):
+        """
+        Closes the transaction and rolls back every change made in it.
+        The instances written or deleted in it are read back from the
+        database in place, so references to them stay valid.
+
+        Raises:
+            RuntimeError: If no transaction is open.
+        """
+        if self.__touched is None:
+            raise RuntimeError("no transaction is open")
+        touched, self.__touched = self.__touched, None
+        self.__conn.rollback()
+        for key, obj in touched.items():
+            name = key.split('.', 1)[0]
+            row = self.__conn.execute(self.__tables[name]['get'],
+                                      (obj.id,)).fetchone()
+            if row is None:
+                self.__live.pop(key, None)
+            else:
+                restored = self.__classes[name](**self.__from_row(name, row))
+                obj.__dict__.clear()
+                obj.__dict__.update(restored.__dict__)
+                self.__live[key] = obj
+            self.cache.bump(name)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block of a with statement as a transaction: it is
+        committed when the block ends, and rolled back if the block
+        raises.
+
+        Yields:
+            DBStorage: The storage.
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def get(self, cls, id):
+        """
+        Retrieves one object by class and id.
+
+        Args:
+            cls (type or str): The model class or its name.
+            id (str): The id of the object.
+
+        Returns:
+            BaseModel: The instance, or None if it is not stored.
+        """
+        return self.__resolve(f"{self.__name(cls)}.{id}")
+
+    @cached
+    def count(self, cls=None):
+        """
+        Counts the stored objects, optionally of a single class.
+
+        Args:
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+
+        Returns:
+            int: The number of objects.
+        """
+        names = self.__tables if cls is None else [self.__name(cls)]
+        return sum(self.__conn.execute(self.__tables[name]['count'])
+                   .fetchone()[0] for name in names)
+
+    @cached
+    def find(self, cls, **eq):
+        """
+        Retrieves the objects of a class whose attributes equal the given
+        values. Values of declared attributes are matched in SQL, through
+        the column indexes where there are any, and the others are compared
+        on the loaded instances.
+
+        Args:
+            cls (type or str): The model class or its name.
+            **eq: The attribute values to match.
+
+        Returns:
+            dict: The matching instances keyed by "ClassName.id".
+        """
+        name = self.__name(cls)
+        table = self.__tables[name]
+        declared = dict(table['attrs'], id=str)
+        where = []
+        params = []
+        for attr, value in eq.items():
+            t = declared.get(attr)
+            if t is not None and t is not list and type(value) is t and \
+                    value != getattr(self.__classes[name], attr, None):
+                where.append(f'"{attr}" = ?')
+                params.append(value)
+        sql = table['select']
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        found = {}
+        for row in self.__conn.execute(sql, params):
+            obj = self.__hydrate(name, row)
+            if all(getattr(obj, attr, None) == value
+                   for attr, value in eq.items()):
+                found[f"{name}.{obj.id}"] = obj
+        return found
+
+    @staticmethod
+    def __range_condition(model, attr, low, high, params):
+        """
+        Builds the SQL condition for a column value between two bounds,
+        both included. A NULL column stands for the class default value,
+        or for a value of another type kept in the `_extra` column, so it
+        matches when the default lies between the bounds or when the
+        value is in `_extra`, to be checked on the instance.
+
+        Args:
+            model (type): The model class.
+            attr (str): The column name.
+            low: The lower bound, or None for no bound.
+            high: The upper bound, or None for no bound.
+            params (list): The statement parameters, to which the bounds
+                           are appended.
+
+        Returns:
+            str: The SQL condition.
+        """
+        conditions = []
+        for op, bound in (('>=', low), ('<=', high)):
+            if bound is not None:
+                conditions.append(f'"{attr}" {op} ?')
+                params.append(bound)
+        condition = ' AND '.join(conditions)
+        if in_range(getattr(model, attr, None), low, high):
+            return f'({condition} OR "{attr}" IS NULL)'
+        params.append(f'$."{attr}"')
+        return f'({condition} OR "{attr}" IS NULL AND ' \
+            'json_type("_extra", ?) IS NOT NULL)'
+
+    @cached
+    def between(self, cls, order_by=None, reverse=False, limit=None,
+                **bounds):
+        """
+        Retrieves the objects of a class whose attributes lie in the given
+        ranges, both bounds included, optionally ordered and limited.
+
+        Bounds on declared numeric attributes and the ordering on a
+        declared numeric attribute are done in SQL; the other bounds are
+        checked and the other orderings done on the loaded instances.
+        Values that are not numbers come after the numbers, as in
+        select().
+
+        Args:
+            cls (type or str): The model class or its name.
+            order_by (str): The attribute to order the results by.
+            reverse (bool): If True, the largest values come first.
+            limit (int): The maximum number of objects to return.
+            **bounds: (low, high) pairs keyed by attribute name, where
+                      None stands for no bound.
+
+        Returns:
+            dict: The matching instances keyed by "ClassName.id", in order
+                  when order_by is given.
+        """
+        name = self.__name(cls)
+        table = self.__tables[name]
+        model = self.__classes[name]
+        numeric = {k for k, t in table['attrs'] if t in (int, float)}
+        where = []
+        params = []
+        for attr, (low, high) in bounds.items():
+            if attr in numeric and (low is not None or high is not None):
+                where.append(self.__range_condition(model, attr, low, high,
+                                                    params))
+        sql = table['select']
+        width = len(table['columns'])
+        ordered = order_by is None or order_by in numeric
+        sorting = order_by is not None and ordered
+        if sorting:
+            order_params = []
+            value = self.__value_sql(name, order_by, True, order_params)
+            sql = sql.replace(' FROM', f', {value} AS _order FROM', 1)
+            params = order_params + params
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if sorting:
+            direction = ' DESC' if reverse else ''
+            sql += f' ORDER BY _order IS NULL{direction}, _order{direction}'
+
+        def sort_key(obj):
+            return order_key(getattr(obj, order_by, None))
+
+        def matching():
+            others = []
+            for row in self.__conn.execute(sql, params):
+                obj = self.__hydrate(name, row[:width])
+                if not all(in_range(getattr(obj, attr, None), *bound)
+                           for attr, bound in bounds.items()):
+                    continue
+                if sorting and row[-1] is None:
+                    others.append(obj)
+                    continue
+                if others:
+                    yield from sorted(others, key=sort_key, reverse=reverse)
+                    others = []
+                yield obj
+            yield from sorted(others, key=sort_key, reverse=reverse)
+        if ordered:
+            matches = list(islice(matching(), limit))
+        elif limit is None:
+            matches = sorted(matching(), key=sort_key, reverse=reverse)
+        else:
+            pick = nlargest if reverse else nsmallest
+            matches = pick(limit, matching(), key=sort_key)
+        return {f"{name}.{obj.id}": obj for obj in matches}
+
+    @cached
+    def having(self, cls, attr, all_of=None, any_of=None):
+        """
+        Retrieves the objects of a class whose list attribute holds every
+        item of `all_of` and at least one item of `any_of`, for example
+        the places with both of two amenities.
+
+        The items of a declared list column are matched in SQL with
+        json_each(); the lists of other attributes are checked on the
+        loaded instances.
+
+        Args:
+            cls (type or str): The model class or its name.
+            attr (str): The name of the list attribute.
+            all_of (iterable): The items required together, or None.
+            any_of (iterable): The items of which one is required, or None.
+
+        Returns:
+            dict: The matching instances keyed by "ClassName.id".
+        """
+        name = self.__name(cls)
+        table = self.__tables[name]
+        all_of = list(all_of or ())
+        any_of = None if any_of is None else list(any_of)
+        where = []
+        params = []
+        if dict(table['attrs']).get(attr) is list and \
+                getattr(self.__classes[name], attr, None) == []:
+            member = f'EXISTS (SELECT 1 FROM json_each("{attr}") WHERE '
+            for item in all_of:
+                where.append(member + 'value = ?)')
+                params.append(item)
+            if any_of is not None:
+                where.append(member + 'value IN (' +
+                             ', '.join('?' * len(any_of)) + '))')
+                params.extend(any_of)
+        sql = table['select']
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        found = {}
+        for row in self.__conn.execute(sql, params):
+            obj = self.__hydrate(name, row)
+            items = getattr(obj, attr, None)
+            if type(items) is list and \
+                    all(item in items for item in all_of) and \
+                    (any_of is None or any(item in items for item in any_of)):
+                found[f"{name}.{obj.id}"] = obj
+        return found
+
+    @cached
+    def nearby(self, cls, lat, lon, radius_km=None, k=None):
+        """
+        Retrieves the objects of a class positioned within a distance of
+        a point, or the k nearest ones, or the k nearest within the
+        distance, nearest first.
+
+        The rows are narrowed in SQL to the bounding box of the circle on
+        the attributes named by the `_geo_index` of the class, then
+        measured. Nearest neighbours are found by doubling the radius of
+        the search until it holds k objects.
+
+        Args:
+            cls (type or str): The model class or its name.
+            lat (float): The latitude of the point in degrees.
+            lon (float): The longitude of the point in degrees.
+            radius_km (float): The maximum distance in kilometers.
+            k (int): The maximum number of objects to return.
+
+        Returns:
+            list: (distance in km, instance) pairs, nearest first.
+
+        Raises:
+            ValueError: If neither radius_km nor k is given.
+        """
+        if radius_km is None and k is None:
+            raise ValueError("radius_km or k is required")
+        name = self.__name(cls)
+        table = self.__tables[name]
+        model = self.__classes[name]
+        lat_attr, lon_attr = getattr(model, '_geo_index',
+                                     ('latitude', 'longitude'))
+        numeric = {attr for attr, t in table['attrs'] if t in (int, float)}
+
+        def within(radius):
+            lat_low, lat_high, lon_ranges = geo_window(lat, lon, radius)
+            where = []
+            params = []
+            if lat_attr in numeric:
+                where.append(self.__range_condition(
+                    model, lat_attr, lat_low, lat_high, params))
+            if lon_attr in numeric and lon_ranges != [(-180.0, 180.0)]:
+                where.append('(' + ' OR '.join(
+                    self.__range_condition(model, lon_attr, low, high,
+                                           params)
+                    for low, high in lon_ranges) + ')')
+            sql = table['select']
+            if where:
+                sql += ' WHERE ' + ' AND '.join(where)
+            found = []
+            for row in self.__conn.execute(sql, params):
+                obj = self.__hydrate(name, row)
+                p_lat = getattr(obj, lat_attr, None)
+                p_lon = getattr(obj, lon_attr, None)
+                if type(p_lat) in (int, float) and \
+                        type(p_lon) in (int, float):
+                    distance = haversine(lat, lon, p_lat, p_lon)
+                    if distance <= radius:
+                        found.append((distance, obj.id, obj))
+            found.sort(key=lambda item: item[:2])
+            return found
+        if radius_km is None:
+            found = nearest(within, k, KM_PER_DEGREE, self.count(name))
+        else:
+            found = within(radius_km)[:k]
+        return [(distance, obj) for distance, _, obj in found]
+
+    @cached
+    def search(self, query, cls=None, limit=None):
+        """
+        Retrieves the objects whose indexed text uses words of a query,
+        ranked by relevance with BM25. Only the classes that declare a
+        `_text_index` are searched, through their full-text table, or
+        through an inverted index built from their rows when this SQLite
+        build lacks FTS5.
+
+        Args:
+            query (str): The words to look for. An object matches when
+                         its text uses any of them.
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+            limit (int): The maximum number of objects to return.
+
+        Returns:
+            list: (score, instance) pairs, best match first.
+        """
+        names = self.__tables if cls is None else [self.__name(cls)]
+        words = ' OR '.join(f'"{word}"' for word in set(tokenize(query)))
+        results = []
+        for name in names:
+            table = self.__tables[name]
+            if 'text_attrs' not in table or not words:
+                continue
+            if 'search' in table:
+                rows = self.__conn.execute(
+                    table['search'], (words, -1 if limit is None else limit))
+                results.append([(row[-1], row[0],
+                                 self.__hydrate(name, row[:-1]))
+                                for row in rows])
+                continue
+            index = TextIndex(*table['text_attrs'])
+            objects = self.all(name)
+            for key, obj in objects.items():
+                index.add(key, obj)
+            results.append([(score, objects[key].id, objects[key])
+                            for score, key in index.search(query, limit)])
+        found = merge(*results, key=lambda item: (-item[0], item[1]))
+        return [(score, obj) for score, _, obj in islice(found, limit)]
+
+    def __value_sql(self, name, attr, numeric, params):
+        """
+        Builds the SQL expression of the value of an attribute for each
+        row, looking in its column, then in the `_extra` column, then at
+        the class default. With `numeric`, values that are not numbers
+        are NULL.
+
+        Args:
+            name (str): The class name.
+            attr (str): The name of the attribute.
+            numeric (bool): If True, only numbers are kept.
+            params (list): The statement parameters, to which those of the
+                           expression are appended.
+
+        Returns:
+            str: The SQL expression.
+        """
+        path = f'$."{attr}"'
+        declared = dict(self.__tables[name]['attrs']).get(attr)
+        default = getattr(self.__classes[name], attr, None)
+        if numeric:
+            sql = 'CASE WHEN json_type("_extra", ?) IN (\'integer\', ' \
+                '\'real\') THEN json_extract("_extra", ?) ' \
+                'WHEN json_type("_extra", ?) IS NOT NULL THEN NULL '
+            params.extend((path, path, path))
+        else:
+            sql = 'CASE WHEN json_type("_extra", ?) IN (\'object\', ' \
+                '\'array\') THEN NULL WHEN json_type("_extra", ?) IS NOT ' \
+                'NULL THEN json_extract("_extra", ?) '
+            params.extend((path, path, path))
+        if declared is not None:
+            value = 'NULL' if numeric and declared not in (int, float) \
+                else f'"{attr}"'
+            sql += f'WHEN "{attr}" IS NOT NULL THEN {value} '
+        if type(default) in (int, float) or \
+                not numeric and type(default) is str:
+            sql += 'ELSE ? '
+            params.append(default)
+        return sql + 'END'
+
+    @cached
+    def aggregate(self, cls, attr, by=None):
+        """
+        Computes the count, sum, average, minimum and maximum of a numeric
+        attribute over the objects of a class, optionally for each value
+        of another attribute, skipping the values that are not numbers.
+
+        The statistics are computed in SQL without loading any object,
+        except when grouping by a list attribute, where the objects are
+        read in a single pass.
+
+        Args:
+            cls (type or str): The model class or its name.
+            attr (str): The numeric attribute to summarize.
+            by (str): The attribute to group the objects by, or None.
+
+        Returns:
+            dict: The 'count', 'sum', 'avg', 'min' and 'max' of the values,
+                  or, when `by` is given, those statistics for each value
+                  of `by`.
+        """
+        name = self.__name(cls)
+        table = self.__tables[name]
+        if by is not None and (
+                dict(table['attrs']).get(by) is list or
+                type(getattr(self.__classes[name], by, None)) is list):
+            return aggregate_objects(
+                self.all(name).values(), attr, by,
+                type(getattr(self.__classes[name], attr, None)))
+        params = []
+        value = self.__value_sql(name, attr, True, params)
+        group = 'NULL' if by is None else \
+            self.__value_sql(name, by, False, params)
+        sql = f'SELECT g, COUNT(v), SUM(v), MIN(v), MAX(v) FROM ' \
+            f'(SELECT {value} AS v, {group} AS g FROM "{name}") ' \
+            f'WHERE v IS NOT NULL GROUP BY g'
+        stats = {row[0]: summarize(*row[1:])
+                 for row in self.__conn.execute(sql, params)}
+        if by is None:
+            return stats.get(None, summarize(0, 0, None, None))
+        return stats
+
+    def query(self, cls):
+        """
+        Starts a query on the objects of a class, to be refined with
+        where(), order_by(), offset() and limit().
+
+        Args:
+            cls (type or str): The model class or its name.
+
+        Returns:
+            Query: The query for every object of the class.
+        """
+        return Query(self, cls)
+
+    def __condition_sql(self, name, attr, op, operand, params):
+        """
+        Builds the SQL condition for a query condition on a declared
+        column, when the operand has the type of the column. A NULL column
+        stands for the class default value, or for a value of another
+        type kept in the `_extra` column, so it matches when the default
+        satisfies the condition or when the value is in `_extra`, to be
+        checked on the row.
+
+        Args:
+            name (str): The class name.
+            attr (str): The attribute name.
+            op (str): The operator name.
+            operand: The operand.
+            params (list): The statement parameters, to which those of the
+                           condition are appended.
+
+        Returns:
+            str: The SQL condition, or None when it cannot be checked in
+                 SQL.
+        """
+        t = dict(self.__tables[name]['attrs'], id=str).get(attr)
+        if t is None:
+            return None
+        types = (int, float) if t in (int, float) else (t,)
+        if op == 'contains' and t is list and \
+                type(operand) in (str, int, float):
+            condition = f'EXISTS (SELECT 1 FROM json_each("{attr}") ' \
+                'WHERE value = ?)'
+            params.append(operand)
+        elif op == 'in' and t is not list and \
+                type(operand) in (list, tuple, set) and \
+                all(type(item) in types for item in operand):
+            condition = f'"{attr}" IN ({", ".join("?" * len(operand))})'
+            params.extend(operand)
+        elif op in SQL_OPERATORS and t is not list and \
+                type(operand) in types:
+            condition = f'"{attr}" {SQL_OPERATORS[op]} ?'
+            params.append(operand)
+        else:
+            return None
+        default = getattr(self.__classes[name], attr, None)
+        if OPERATORS[op](default, operand):
+            return f'({condition} OR "{attr}" IS NULL)'
+        params.append(f'$."{attr}"')
+        return f'({condition} OR "{attr}" IS NULL AND ' \
+            'json_type("_extra", ?) IS NOT NULL)'
+
+    def __plan(self, query):
+        """
+        Builds the SQL statement of a query: the conditions that can be
+        checked in SQL, and the order when it is on a numeric attribute.
+
+        Args:
+            query (Query): The query to plan.
+
+        Returns:
+            tuple: The statement, its parameters and whether its rows come
+                   in the requested order. When they do, each row ends
+                   with the numeric value of the order attribute, or NULL
+                   for a value that is not a number; those rows come last,
+                   or first in decreasing order.
+        """
+        name = query.cls
+        table = self.__tables[name]
+        params = []
+        where = [condition for condition in (
+                 self.__condition_sql(name, attr, op, operand, params)
+                 for attr, op, operand in query.conditions)
+                 if condition is not None]
+        sql = table['select']
+        attr, descending = query.order or (None, False)
+        ordered = query.order is None or \
+            type(getattr(self.__classes[name], attr, None)) in (int, float)
+        if query.order is not None and ordered:
+            order_params = []
+            value = self.__value_sql(name, attr, True, order_params)
+            sql = sql.replace(' FROM', f', {value} AS _order FROM', 1)
+            params = order_params + params
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if query.order is not None and ordered:
+            direction = ' DESC' if descending else ''
+            sql += f' ORDER BY _order IS NULL{direction}, _order{direction}'
+        return sql, params, ordered
+
+    @cached
+    def select(self, query):
+        """
+        Runs a query. The conditions on declared columns and the order
+        on a numeric attribute are handled in SQL. Each row is then
+        checked against every condition before it becomes an instance,
+        so rejected rows are never hydrated; when the rows come in order
+        the scan stops once the page is full.
+
+        Args:
+            query (Query): The query to run.
+
+        Returns:
+            list: The matching instances.
+        """
+        name = query.cls
+        model = self.__classes[name]
+        sql, params, ordered = self.__plan(query)
+        attr, descending = query.order or (None, False)
+        width = len(self.__tables[name]['columns'])
+
+        def value_of(data):
+            def get(attr):
+                if attr not in data:
+                    return getattr(model, attr, None)
+                if attr in ('created_at', 'updated_at'):
+                    return datetime.fromisoformat(data[attr])
+                return data[attr]
+            return get
+
+        def matching():
+            others = []
+            for row in self.__conn.execute(sql, params):
+                get = value_of(self.__from_row(name, row[:width]))
+                if not query.accepts(get):
+                    continue
+                if attr is None or not ordered:
+                    yield row[:width], get
+                elif row[-1] is None:
+                    others.append((row[:width], get))
+                else:
+                    if others:
+                        yield from sorted(
+                            others, reverse=descending,
+                            key=lambda item: order_key(item[1](attr)))
+                        others = []
+                    yield row[:width], get
+            yield from sorted(others, reverse=descending,
+                              key=lambda item: order_key(item[1](attr)))
+        stop = None if query.size is None else query.start + query.size
+        if ordered:
+            page = list(islice(matching(), query.start, stop))
+        else:
+            def sort_key(item):
+                return order_key(item[1](attr))
+            if stop is None:
+                page = sorted(matching(), key=sort_key, reverse=descending)
+            else:
+                pick = nlargest if descending else nsmallest
+                page = pick(stop, matching(), key=sort_key)
+            page = page[query.start:]
+        return [self.__hydrate(name, row) for row, _ in page]
+
+    def explain(self, query):
+        """
+        Describes how select() runs a query.
+
+        Args:
+            query (Query): The query to describe.
+
+        Returns:
+            str: The SQL statement and the plan SQLite chose for it.
+        """
+        sql, params, _ = self.__plan(query)
+        steps = [row[-1] for row in self.__conn.execute(
+            'EXPLAIN QUERY PLAN ' + sql, params)]
+        return f'{query.cls}: {sql} [{"; ".join(steps)}]'
+
+    def compact(self):
+        """
+        Commits the current transaction and rebuilds the database file to
+        reclaim the space left by deleted rows.
+
+        Raises:
+            RuntimeError: If a transaction was opened with begin().
+        """
+        if self.__touched is not None:
+            raise RuntimeError("cannot compact inside a transaction")
+        self.__conn.commit()
+        self.__conn.execute('VACUUM')
+
+    def fsck(self):
+        """
+        Checks the integrity of the database file with SQLite's own
+        check and reports it in the form of FileStorage.fsck().
+
+        Returns:
+            list: One report, with the 'path' and 'size' of the database,
+                  its number of 'records', the 'seconds' taken and the
+                  problems found as 'error', or None.
+        """
+        start = time.perf_counter()
+        problems = [row[0] for row in
+                    self.__conn.execute('PRAGMA integrity_check')]
+        try:
+            size = os.path.getsize(self.__db_path)
+        except OSError:
+            size = 0
+        return [{'path': self.__db_path, 'format': 'sqlite',
+                 'compression': None, 'size': size,
+                 'records': self.count(), 'damaged': [], 'lost': 0,
+                 'seconds': time.perf_counter() - start,
+                 'error': None if problems == ['ok'] else
+                 '; '.join(problems)}]
+
+    def close(self):
+        """
+        Commits the current transaction and closes the connection. A
+        transaction opened with begin() is rolled back instead.
+        """
+        if self.__conn is not None:
+            if self.__touched is not None:
+                self.rollback()
+            self.__conn.commit()
+            self.__conn.close()
+            self.__conn = None
@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+"""
+This module defines the Durability class, which writes the files of
+FileStorage atomically and flushes them to disk according to a policy.
+
+A file is never rewritten in place: the new content goes to a temporary
+file in the same directory, which then replaces the file with
+os.replace(). A reader, or a crash, sees either the old file or the new
+one, never a mix of both. The new file keeps the permissions of the
+file it replaces, or gets those of a file created with open(). When the
+data reaches the disk is chosen by the policy:
+
+    always: Every write is flushed with fsync() before it is renamed,
+            and the directory after it, so save() returns once the data
+            is on disk. The safest and slowest.
+    batched: Writes are renamed at once and flushed together at most
+             every `interval_ms` milliseconds by a timer, so many saves
+             share one flush. A crash loses at most the writes of the
+             last interval.
+    never: Nothing is flushed; the operating system writes the data
+           back when it sees fit.
+
+Classes:
+    Durability: Writes files atomically and applies an fsync policy.
+
+Functions:
+    flush_at_exit: Flushes the pending writes of a policy at exit.
+    fsync_path: Flushes a file or directory to disk.
+"""
+
+import atexit
+import os
+import stat
+import tempfile
+import threading
+import weakref
+
+POLICIES = ('always', 'batched', 'never')
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def flush_at_exit(flush):
+    """
+    Runs the flush of a policy that is still alive when the interpreter
+    exits.
+
+    Args:
+        flush (weakref.WeakMethod): The flush method.
+    """
+    method = flush()
+    if method is not None:
+        method()
+
+
+def fsync_path(path):
+    """
+    Flushes a file, or the entries of a directory, to disk. Platforms
+    that cannot open a directory skip it.
+
+    Args:
+        path (str): The path of the file or directory.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except (FileNotFoundError, IsADirectoryError, PermissionError):
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Durability:
+    """
+    Writes files atomically and flushes them to disk according to a
+    policy.
+
+    Attributes:
+        policy (str): 'always', 'batched' or 'never'.
+        interval (float): The delay between two flushes in batched mode,
+                          in seconds.
+        syncs (int): The number of fsync() calls made.
+        __pending (set): The paths written and not flushed yet in
+                         batched mode.
+        __timer (threading.Timer): The timer of the next flush, or None.
+        __lock (threading.Lock): Guards __pending and __timer.
+    """
+
+    def __init__(self, policy='always', interval_ms=100):
+        """
+        Initializes a policy.
+
+        Args:
+            policy (str): 'always', 'batched' or 'never'.
+            interval_ms (int): The delay between two flushes in batched
+                               mode, in milliseconds.
+
+        Raises:
+            ValueError: If the policy is unknown.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown durability policy: {policy}")
+        self.policy = policy
+        self.interval = interval_ms / 1000
+        self.syncs = 0
+        self.__pending = set()
+        self.__timer = None
+        self.__lock = threading.Lock()
+        if policy == 'batched':
+            atexit.register(flush_at_exit, weakref.WeakMethod(self.flush))
+
+    def write(self, path, data):
+        """
+        Replaces the content of a file atomically, keeping its
+        permissions.
+
+        Args:
+            path (str): The path of the file.
+            data (bytes): The new content.
+        """
+        self.replace(path, lambda f: f.write(data))
+
+    def replace(self, path, write):
+        """
+        Replaces the content of a file atomically with what a function
+        writes, keeping its permissions. The file is left untouched if
+        the function raises.
+
+        Args:
+            path (str): The path of the file.
+            write (callable): Writes the new content to the binary file
+                              it is given.
+        """
+        directory = os.path.dirname(path) or '.'
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~UMASK
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=os.path.basename(path) + '.',
+            suffix='.tmp')
+        try:
+            os.chmod(tmp_path, mode)
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                if self.policy == 'always':
+                    f.flush()
+                    self.__fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.written(directory)
+        if self.policy == 'batched':
+            self.written(path)
+
+    def append(self, path, text):
+        """
+        Appends text to a file, creating it if needed.
+
+        Args:
+            path (str): The path of the file.
+            text (str): The text to append.
+        """
+        created = not os.path.exists(path)
+        with open(path, 'a', encoding="UTF-8") as f:
+            f.write(text)
+            if self.policy == 'always':
+                f.flush()
+                self.__fsync(f.fileno())
+            else:
+                self.written(path)
+        if created:
+            self.written(os.path.dirname(path) or '.')
+
+    def written(self, path):
+        """
+        Records that a file or directory changed: flushes it now in
+        always mode, or with the next batch in batched mode.
+
+        Args:
+            path (str): The path of the file or directory.
+        """
+        if self.policy == 'always':
+            self.syncs += 1
+            fsync_path(path)
+        elif self.policy == 'batched':
+            with self.__lock:
+                self.__pending.add(path)
+                if self.__timer is None:
+                    self.__timer = threading.Timer(self.interval, self.flush)
+                    self.__timer.daemon = True
+                    self.__timer.start()
+
+    def flush(self):
+        """
+        Flushes every pending path at once, ending the current batch.
+        """
+        with self.__lock:
+            pending, self.__pending = self.__pending, set()
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+        for path in sorted(pending, key=len, reverse=True):
+            self.syncs += 1
+            fsync_path(path)
+
+    def __fsync(self, fd):
+        """
+        Flushes an open file to disk and counts it.
+
+        Args:
+            fd (int): The file descriptor.
+        """
+        self.syncs += 1
+        os.fsync(fd)
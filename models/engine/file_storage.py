@@ -1,5 +1,28 @@
 #!/usr/bin/python3
-import json
+import atexit
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from models.engine import model_classes
+from models.engine.cache import QueryCache, cached
+from models.engine.columns import aggregate_objects
+from models.engine.durability import Durability, flush_at_exit
+from heapq import merge, nlargest, nsmallest
+from itertools import islice
+from models.engine.indexes import build_indexes, haversine, in_range, \
+    order_key
+from models.engine.instances import InstanceCache, LazyObjects, RecordView
+from models.engine.journal import Journal
+from models.engine.mapped import MappedRecord, index_path, map_file, \
+    write_index
+from models.engine.serializers import check_file, get_serializer, \
+    load_items
+from models.engine.query import Query
+
+RECORD_TYPES = (dict, MappedRecord)
 
 
 class FileStorage:
@@ -9,32 +32,353 @@ class FileStorage:
     storing all instances in a dictionary and allowing for the persistence
     of data across sessions by saving to and reloading from a file.
 
+    The dictionary holds the live instances themselves, so reads return the
+    same object every time and instances are only converted to dictionaries
+    when they are written. A second dictionary indexes the same instances
+    by class name, so listing or counting one class only touches the
+    objects of that class. The attributes a model class lists in
+    `_hash_indexes` get a hash index, and those listed in `_range_indexes`
+    a sorted index, kept up to date by new(), delete() and reload(). find()
+    uses the hash indexes for equality lookups and between() the sorted
+    indexes for range queries. The list attributes listed in `_set_indexes`
+    get a bitmap index that having() uses for membership queries. The
+    latitude and longitude attributes listed
+    in `_geo_index` get a grid index that nearby() uses for distance
+    queries, and the text attributes listed in `_text_index` an inverted
+    index that search() uses for ranked keyword queries. The attributes
+    listed in `_columns` are mirrored in typed arrays that aggregate() uses
+    for statistics without touching the objects.
+
+    new() and delete() only mark the key as dirty; save() then re-serializes
+    the dirty entries alone and reuses the cached JSON text of the others.
+    Only the serialization is incremental: the whole file is still written
+    on every save, and the cached text of every object is kept in memory,
+    except in bounded mode, where it is not cached so that the memory
+    stays bounded. In journaled mode the dirty entries are appended as one
+    batch of records to a log file next to the JSON file instead of
+    rewriting the whole file, and reload() replays the log on top of the
+    JSON file. compact() folds
+    the log back into a fresh JSON snapshot, on demand or in a background
+    thread once the log outgrows both the compaction threshold and the
+    number of objects.
+
+    In sharded mode each class is kept in its own file, "<ClassName>.json"
+    inside the directory "<file_path>.d", so a save rewrites only the files
+    of the classes with dirty keys and the files are written and read in
+    parallel.
+
+    The results of find(), between(), having(), nearby(), search(),
+    aggregate() and select() are kept in a bounded LRU cache and served
+    again until new() or delete() changes an object of their class, or
+    reload() replaces the objects. The cache holds the keys of the
+    instances only, and hands out the stored instances on a hit.
+
+    In bounded mode, set by max_live or max_live_bytes, only the instances
+    read or written most recently are kept; the other objects are kept as
+    the dictionaries stored in the file and turned back into instances
+    when they are read. The indexes and the scans of the queries read
+    those dictionaries directly, so only the results are hydrated. An
+    evicted instance still referenced elsewhere is handed out again
+    instead of a copy. The query cache does not hold instances, so it
+    does not keep evicted ones alive.
+
+    The files are written by a serializer: indented JSON by default,
+    compact JSON or binary marshal records, optionally compressed with
+    gzip or lzma, or checksummed records, of which reload() skips the
+    damaged ones and recovers the rest. reload() reads files in any of
+    those formats.
+
+    Between begin() and commit(), or inside a `with transaction():`
+    block, save() writes nothing: new() and delete() only mark their keys
+    dirty, and commit() writes them all with one save. rollback() puts
+    every key touched since begin() back as it was last saved, updating
+    in place the instances still in use.
+
+    In write-behind mode save() only wakes a background writer thread and
+    returns at once, so a command does not wait for the file to be
+    written, however large it is. The writer waits until no save came for
+    debounce_ms milliseconds, or until max_pending keys are dirty, and
+    then writes every change at once. flush() writes the pending changes
+    right away, and close() drains the writer before the program exits.
+
+    Every file is written to a temporary file that then replaces it, so
+    a crash leaves either the old file or the new one. The durability
+    policy chooses when the writes are flushed to disk: before save()
+    returns ('always', the default), together every sync_interval_ms
+    milliseconds ('batched'), or when the operating system sees fit
+    ('never'). reload() raises CorruptFileError on a file it cannot read
+    instead of starting empty, so a damaged file is never saved over.
+
+    In lazy mode each JSON file is written with an offset index next to
+    it, and reload() maps the file in memory and reads the index only. An
+    object is parsed the first time it is read, and the indexes of a
+    class are built the first time a query needs them. Objects that were
+    never read are written back from the mapped text without parsing.
+
     Attributes:
         __file_path (str): The path to the JSON file used for data storage.
         __objects (dict): A dictionary containing all instances by their unique
-                          identifiers, in the format "ClassName.id".
+                          identifiers, in the format "ClassName.id". In
+                          bounded or lazy mode an entry is either an
+                          instance, its dictionary representation or a
+                          MappedRecord not parsed yet.
+        __journal (Journal): The write-ahead log used in journaled mode,
+                             or None when the JSON file is rewritten on save.
+        __compact_threshold (int): The number of log records that triggers
+                                   a background compaction.
+        __buckets (dict): For each class name, a dictionary of the instances
+                          of that class keyed by "ClassName.id".
+        __indexes (dict): For each class name, the secondary indexes of
+                          that class keyed by (declaration, attribute).
+        __deferred (set): The names of the classes whose indexes are not
+                          built yet.
+        __dirty (set): The keys created, updated or deleted since the
+                       last save.
+        __fragments (dict): The cached fragment of each clean entry, with
+                            the length of its encoded object. Empty in
+                            bounded mode.
+        __serializer (Serializer): Writes the files.
+        __shard_dir (str): The directory holding one JSON file per class
+                           in sharded mode, or None.
+        __live (InstanceCache): The instances kept hydrated in bounded
+                                mode, or None.
+        __evicted (WeakValueDictionary): The evicted instances still
+                                         referenced elsewhere.
+        __classes (dict): The model classes keyed by name, once needed.
+        __lazy (bool): Whether the files are mapped and parsed on demand.
+        __durability (Durability): Writes the files and the log and
+                                   flushes them to disk.
+        __in_transaction (bool): Whether a transaction is open.
+        __deleted (dict): The instances deleted in the open transaction,
+                          keyed by "ClassName.id", so rollback() can put
+                          the same instances back.
+        __write_behind (bool): Whether save() leaves the writing to the
+                               writer thread.
+        __debounce (float): The time without a save the writer waits
+                            for, in seconds.
+        __max_pending (int): The number of dirty keys that makes the
+                             writer write at once.
+        __wake (threading.Condition): Wakes the writer thread and guards
+                                      __requested and __closing.
+        __requested (float): The time of the last save not written yet,
+                             or None.
+        __closing (bool): Whether close() asked the writer to stop.
+        __writer (threading.Thread): The writer thread, once started.
+        __writing (threading.Lock): Held while the files are written, so
+                                    one write happens at a time.
+        __error (Exception): The error of the last background write,
+                             raised by the next save(), flush() or
+                             close().
+        cache (QueryCache): The cache of query results.
 
     Methods:
-        all(): Returns the dictionary of stored objects.
+        all(cls): Returns the dictionary of stored objects, optionally
+                  of one class.
         new(obj): Adds a new object to the storage dictionary.
+        delete(obj): Removes an object from the storage dictionary.
+        iterate(cls, offset, limit): Yields the stored objects one page
+                                     at a time.
+        get(cls, id): Returns one object by class and id.
+        count(cls): Returns the number of stored objects.
+        find(cls, **eq): Returns the objects whose attributes have the
+                         given values.
+        between(cls, **bounds): Returns the objects whose attributes lie
+                                in the given ranges, optionally ordered.
+        having(cls, attr): Returns the objects whose list attribute holds
+                           the given items.
+        nearby(cls, lat, lon): Returns the objects within a distance of
+                               a point, or the nearest ones.
+        search(query): Returns the objects whose text matches words of
+                       a query, best match first.
+        aggregate(cls, attr): Returns the count, sum, average, minimum
+                              and maximum of an attribute.
+        query(cls): Returns a query on the objects of a class.
+        select(query): Runs a query.
+        explain(query): Describes how a query is run.
         save(): Serializes and writes the storage dictionary to a JSON file.
         reload(): Loads objects from the JSON file
         back into the storage dictionary.
+        compact(): Folds the log into a fresh snapshot of the JSON file.
+        sync(): Flushes the writes of the current batch to disk.
+        flush(): Writes the changes the writer thread has not written.
+        close(): Drains and stops the writer thread.
+        begin(): Opens a transaction.
+        commit(): Saves the changes of the transaction at once.
+        rollback(): Undoes the changes of the transaction.
+        transaction(): Runs a block of code as a transaction.
+        fsck(): Checks the files and reports what they hold intact.
     """
 
     __file_path = './file.json'
     __objects = {}
+    __journal = None
+    __compact_threshold = 10000
+    __shard_dir = None
 
-    def all(self):
+    def __init__(self, file_path=None, journal=False, compact_threshold=None,
+                 sharded=False, cache_size=256, max_live=None,
+                 max_live_bytes=None, lazy=False, serializer=None,
+                 compression=None, durability='always',
+                 sync_interval_ms=100, write_behind=False, debounce_ms=50,
+                 max_pending=1000):
         """
-        Retrieves the dictionary of all stored objects.
+        Initializes the storage engine.
+
+        Args:
+            file_path (str): The path to the JSON file. Defaults to
+                             './file.json'.
+            journal (bool): If True, changes are appended to the log file
+                            "<file_path>.log" instead of rewriting the
+                            JSON file on every save.
+            compact_threshold (int): The number of log records after which
+                                     save() starts a background compaction.
+                                     Defaults to 10000.
+            sharded (bool): If True, each class is stored in its own file
+                            under the directory "<file_path>.d".
+            cache_size (int): The number of query results kept in the
+                              cache. 0 disables the cache.
+            max_live (int): The maximum number of instances kept
+                            hydrated. Defaults to every object.
+            max_live_bytes (int): The maximum estimated memory of the
+                                  instances kept hydrated, in bytes.
+                                  Defaults to no limit.
+            lazy (bool): If True, an offset index is written next to each
+                         JSON file and reload() parses the objects only
+                         when they are read.
+            serializer (str): The format of the files: 'pretty' (the
+                              default), 'compact', 'marshal' or
+                              'records'.
+            compression (str): 'gzip' or 'lzma' to compress the files,
+                               or None.
+            durability (str): When the writes are flushed to disk:
+                              'always' (the default), 'batched' or
+                              'never'.
+            sync_interval_ms (int): The delay between two flushes of the
+                                    'batched' policy, in milliseconds.
+            write_behind (bool): If True, save() returns at once and a
+                                 background thread writes the changes.
+            debounce_ms (int): The time without a save after which the
+                               writer thread writes, in milliseconds.
+            max_pending (int): The number of dirty keys after which the
+                               writer thread writes without waiting.
+
+        Raises:
+            ValueError: If the format, the compression or the durability
+                        policy is unknown.
+        """
+        if file_path is not None:
+            self.__file_path = file_path
+        if compact_threshold is not None:
+            self.__compact_threshold = compact_threshold
+        self.__objects = {}
+        self.__buckets = {}
+        self.__indexes = {}
+        self.__deferred = set()
+        self.__dirty = set()
+        self.__fragments = {}
+        self.__lock = threading.Lock()
+        self.__compaction = None
+        self.__in_transaction = False
+        self.__deleted = {}
+        self.__write_behind = write_behind
+        self.__debounce = debounce_ms / 1000
+        self.__max_pending = max_pending
+        self.__wake = threading.Condition()
+        self.__requested = None
+        self.__closing = False
+        self.__writer = None
+        self.__writing = threading.Lock()
+        self.__error = None
+        if write_behind:
+            atexit.register(flush_at_exit, weakref.WeakMethod(self.flush))
+        self.__classes = None
+        self.__lazy = lazy
+        self.__serializer = get_serializer(serializer, compression)
+        self.__durability = Durability(durability, sync_interval_ms)
+        self.__live = None
+        self.__evicted = None
+        if max_live is not None or max_live_bytes is not None:
+            self.__live = InstanceCache(max_live, max_live_bytes)
+            self.__evicted = weakref.WeakValueDictionary()
+        self.cache = QueryCache(cache_size, self.__materialize)
+        if journal:
+            self.__journal = Journal(self.__file_path + '.log',
+                                     self.__durability)
+        if sharded:
+            self.__shard_dir = self.__file_path + '.d'
+
+    def all(self, cls=None):
+        """
+        Retrieves the dictionary of all stored objects, or of the objects
+        of one class.
+
+        Args:
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
 
         Returns:
-            dict: The dictionary containing all objects currently stored.
+            dict: The dictionary containing the objects currently stored.
                   The keys are in the format "ClassName.id", and the values
-                  are the corresponding instance data in dictionary format.
+                  are the corresponding instances. It must not be modified.
+                  In bounded or lazy mode it is a read-only mapping that
+                  hydrates the instances as they are read.
+        """
+        if cls is None:
+            entries = self.__objects
+        else:
+            name = cls if isinstance(cls, str) else cls.__name__
+            entries = self.__buckets.get(name, {})
+        if self.__live is None and not self.__lazy:
+            return entries
+        return LazyObjects(entries, self.__materialize)
+
+    def iterate(self, cls=None, offset=0, limit=None):
         """
-        return self.__objects
+        Iterates over the stored objects, or over the objects of one
+        class, without building a list of them.
+
+        Args:
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+            offset (int): The number of objects to skip.
+            limit (int): The maximum number of objects to yield, or None
+                         for no limit.
+
+        Returns:
+            iterator: The instances, in the order of all().
+        """
+        stop = None if limit is None else offset + limit
+        return islice(self.all(cls).values(), offset, stop)
+
+    def get(self, cls, id):
+        """
+        Retrieves one object by class and id.
+
+        Args:
+            cls (type or str): The model class or its name.
+            id (str): The id of the object.
+
+        Returns:
+            BaseModel: The stored instance, or None if it is not stored.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        return self.__materialize(f"{name}.{id}")
+
+    def count(self, cls=None):
+        """
+        Counts the stored objects, optionally of a single class.
+
+        Args:
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+
+        Returns:
+            int: The number of objects.
+        """
+        if cls is None:
+            return len(self.__objects)
+        name = cls if isinstance(cls, str) else cls.__name__
+        return len(self.__buckets.get(name, {}))
 
     def new(self, obj):
         """
@@ -47,44 +391,1233 @@ class FileStorage:
 
         Side Effects:
             Updates the __objects dictionary by adding a new entry with the
-            key formatted as "ClassName.id" and value as the dictionary
-            representation of the object.
+            key formatted as "ClassName.id" and the object as value, and
+            marks the key as dirty.
+        """
+        key = f"{type(obj).__name__}.{obj.id}"
+        with self.__lock:
+            self.__insert(key, obj)
+            self.__dirty.add(key)
+            self.cache.bump(type(obj).__name__)
+
+    def delete(self, obj=None):
         """
-        self.__objects[f"{type(obj).__name__}.{obj.id}"] = obj.to_dict()
+        Removes an object from the storage dictionary.
+
+        Args:
+            obj (BaseModel): The object to remove. Nothing happens if it is
+                             None or not in storage.
+
+        Side Effects:
+            Removes the "ClassName.id" entry from __objects and marks the
+            key as dirty.
+        """
+        if obj is None:
+            return
+        key = f"{type(obj).__name__}.{obj.id}"
+        with self.__lock:
+            if self.__remove(key):
+                self.__dirty.add(key)
+                self.cache.bump(type(obj).__name__)
+                if self.__in_transaction:
+                    self.__deleted.setdefault(key, obj)
+
+    def __insert(self, key, obj):
+        """
+        Stores an object under its key in __objects, in the bucket of its
+        class and in the indexes of its class. The first record of a class
+        without indexes defers them until a query needs them. In bounded
+        mode an instance becomes the most recently used one.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel, dict or MappedRecord): The object to store, or
+                                                   its record in bounded or
+                                                   lazy mode.
+        """
+        name = key.split('.', 1)[0]
+        if type(obj) in RECORD_TYPES and name not in self.__indexes:
+            self.__deferred.add(name)
+        elif type(obj) is MappedRecord:
+            obj = obj.load()
+        self.__objects[key] = obj
+        self.__buckets.setdefault(name, {})[key] = obj
+        if name not in self.__deferred:
+            view = self.__view(obj)
+            indexes = self.__indexes.get(name)
+            if indexes is None:
+                indexes = self.__indexes[name] = \
+                    build_indexes(view.__class__)
+            for index in indexes.values():
+                index.add(key, view)
+        if self.__live is not None:
+            self.__live.discard(key)
+            self.__evicted.pop(key, None)
+            if type(obj) not in RECORD_TYPES:
+                self.__touch(key, obj)
+
+    def __remove(self, key):
+        """
+        Removes the object stored under a key from __objects, from the
+        bucket of its class and from the indexes of its class.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+
+        Returns:
+            bool: True if an object was stored under the key.
+        """
+        if self.__objects.pop(key, None) is None:
+            return False
+        if self.__live is not None:
+            self.__live.discard(key)
+            self.__evicted.pop(key, None)
+        name = key.split('.', 1)[0]
+        del self.__buckets[name][key]
+        for index in self.__indexes.get(name, {}).values():
+            index.discard(key)
+        return True
+
+    def __indexes_of(self, name):
+        """
+        Returns the indexes of a class, building them from its stored
+        objects first if they were deferred.
+
+        Args:
+            name (str): The class name.
+
+        Returns:
+            dict: The indexes keyed by (declaration, attribute).
+        """
+        if name in self.__deferred:
+            with self.__lock:
+                if name in self.__deferred:
+                    indexes = build_indexes(self.__model_class(name))
+                    for key in self.__buckets[name]:
+                        view = self.__view(self.__parse(key))
+                        for index in indexes.values():
+                            index.add(key, view)
+                    self.__indexes[name] = indexes
+                    self.__deferred.discard(name)
+        return self.__indexes.get(name, {})
+
+    def __model_class(self, name):
+        """
+        Returns the model class of a name.
+
+        Args:
+            name (str): The class name.
+        """
+        if self.__classes is None:
+            self.__classes = model_classes()
+        return self.__classes[name]
+
+    def __view(self, entry):
+        """
+        Gives attribute access to a stored entry: the instance itself, or
+        a view of its dictionary representation in bounded or lazy mode.
+
+        Args:
+            entry (BaseModel or dict): The stored entry, parsed.
+
+        Returns:
+            BaseModel or RecordView: The object to read attributes from.
+        """
+        if type(entry) is not dict:
+            return entry
+        return RecordView(self.__model_class(entry['__class__']), entry)
+
+    def __parse(self, key):
+        """
+        Parses the mapped record stored under a key, if it is not parsed
+        yet, and stores its dictionary representation in its place. Must
+        be called with the lock held.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+
+        Returns:
+            BaseModel or dict: The stored entry, parsed.
+        """
+        entry = self.__objects[key]
+        if type(entry) is MappedRecord:
+            entry = entry.load()
+            self.__objects[key] = entry
+            self.__buckets[key.split('.', 1)[0]][key] = entry
+        return entry
+
+    def __read(self, key):
+        """
+        Gives attribute access to the object stored under a key without
+        building its instance.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+
+        Returns:
+            BaseModel or RecordView: The object to read attributes from.
+        """
+        entry = self.__objects[key]
+        if type(entry) is MappedRecord:
+            with self.__lock:
+                entry = self.__parse(key)
+        return self.__view(entry)
+
+    def __fragment(self, key, entry):
+        """
+        Builds the fragment of one entry of a file with the serializer. A
+        mapped record is copied from its file without being parsed.
+
+        Args:
+            key (str): The "ClassName.id" key of the entry.
+            entry (BaseModel, dict or MappedRecord): The stored entry.
+
+        Returns:
+            tuple: The fragment and the length of the encoded object at
+                   its end, as returned by Serializer.fragment().
+        """
+        if type(entry) is MappedRecord:
+            encoded = entry.raw()
+            return self.__serializer.frame(key, encoded), len(encoded)
+        if type(entry) is not dict:
+            entry = entry.to_dict()
+        return self.__serializer.fragment(key, entry)
+
+    def __materialize(self, key):
+        """
+        Returns the instance stored under a key, building it from its
+        record in bounded or lazy mode, or handing out again the evicted
+        instance if it is still referenced elsewhere.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+
+        Returns:
+            BaseModel: The instance, or None if the key is not stored.
+        """
+        obj = self.__objects.get(key)
+        if type(obj) not in RECORD_TYPES and \
+                (obj is None or self.__live is None):
+            return obj
+        with self.__lock:
+            obj = self.__objects.get(key)
+            if type(obj) in RECORD_TYPES:
+                record = self.__parse(key)
+                obj = None
+                if self.__evicted is not None:
+                    obj = self.__evicted.pop(key, None)
+                if obj is None:
+                    obj = self.__model_class(record['__class__'])(**record)
+                self.__objects[key] = obj
+                self.__buckets[record['__class__']][key] = obj
+            if obj is not None and self.__live is not None:
+                self.__touch(key, obj)
+            return obj
+
+    def __touch(self, key, obj):
+        """
+        Marks an instance as the most recently used one and replaces the
+        instances evicted in turn by their dictionary representation.
+        Must be called with the lock held in bounded mode.
+
+        Args:
+            key (str): The "ClassName.id" key of the instance.
+            obj (BaseModel): The instance.
+        """
+        for old in self.__live.touch(key, obj):
+            evicted = self.__objects[old]
+            record = evicted.to_dict()
+            self.__objects[old] = record
+            self.__buckets[record['__class__']][old] = record
+            self.__evicted[old] = evicted
+
+    @cached
+    def find(self, cls, **eq):
+        """
+        Retrieves the objects of a class whose attributes equal the given
+        values. Indexed attributes are looked up in their hash index, the
+        others are compared on the objects left.
+
+        Args:
+            cls (type or str): The model class or its name.
+            **eq: The attribute values to match.
+
+        Returns:
+            dict: The matching instances keyed by "ClassName.id".
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        bucket = self.__buckets.get(name, {})
+        indexes = self.__indexes_of(name)
+        matches = []
+        rest = {}
+        for attr, value in eq.items():
+            try:
+                matches.append(
+                    indexes['_hash_indexes', attr].lookup(value))
+            except (KeyError, TypeError):
+                rest[attr] = value
+        if matches:
+            matches.sort(key=len)
+            keys = matches[0].intersection(*matches[1:])
+        else:
+            keys = bucket
+        found = {}
+        for key in keys:
+            obj = self.__read(key)
+            if all(getattr(obj, attr, None) == value
+                   for attr, value in rest.items()):
+                found[key] = self.__materialize(key)
+        return found
+
+    @cached
+    def between(self, cls, order_by=None, reverse=False, limit=None,
+                **bounds):
+        """
+        Retrieves the objects of a class whose attributes lie in the given
+        ranges, both bounds included, optionally ordered and limited.
+
+        The scan is driven by the sorted index of the order_by attribute
+        when it has one, otherwise by the sorted index whose range holds
+        the fewest keys, and only the keys it yields are checked against
+        the other ranges. When the driving index gives the requested order,
+        the scan stops after `limit` matches without sorting anything.
+
+        Args:
+            cls (type or str): The model class or its name.
+            order_by (str): The attribute to order the results by.
+            reverse (bool): If True, the largest values come first.
+            limit (int): The maximum number of objects to return.
+            **bounds: (low, high) pairs keyed by attribute name, where
+                      None stands for no bound.
+
+        Returns:
+            dict: The matching instances keyed by "ClassName.id", in order
+                  when order_by is given.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        bucket = self.__buckets.get(name, {})
+        indexes = self.__indexes_of(name)
+        driver = indexes.get(('_range_indexes', order_by))
+        if driver is None and order_by is None:
+            counts = [(indexes['_range_indexes', attr].count(*bounds[attr]),
+                       attr) for attr in bounds
+                      if ('_range_indexes', attr) in indexes]
+            if counts:
+                driver = indexes['_range_indexes', min(counts)[1]]
+        if driver is not None:
+            keys = driver.range(*bounds.get(driver.attr, (None, None)),
+                                reverse=reverse)
+        else:
+            keys = iter(bucket)
+        read = self.__read
+        matches = ((key, read(key)) for key in keys
+                   if all(in_range(getattr(read(key), attr, None), *bound)
+                          for attr, bound in bounds.items()))
+        if order_by is None or driver is not None:
+            found = islice(matches, limit)
+        else:
+            def sort_key(item):
+                return order_key(getattr(item[1], order_by, None))
+            if limit is None:
+                found = sorted(matches, key=sort_key, reverse=reverse)
+            else:
+                pick = nlargest if reverse else nsmallest
+                found = pick(limit, matches, key=sort_key)
+        return {key: self.__materialize(key) for key, obj in found}
+
+    @cached
+    def having(self, cls, attr, all_of=None, any_of=None):
+        """
+        Retrieves the objects of a class whose list attribute holds every
+        item of `all_of` and at least one item of `any_of`, for example
+        the places with both of two amenities. The bitmap index of the
+        attribute answers the query when it has one, otherwise every
+        object of the class is checked.
+
+        Args:
+            cls (type or str): The model class or its name.
+            attr (str): The name of the list attribute.
+            all_of (iterable): The items required together, or None.
+            any_of (iterable): The items of which one is required, or None.
+
+        Returns:
+            dict: The matching instances keyed by "ClassName.id".
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        bucket = self.__buckets.get(name, {})
+        index = self.__indexes_of(name).get(('_set_indexes', attr))
+        if index is not None:
+            return {key: self.__materialize(key)
+                    for key in index.lookup(all_of, any_of)}
+        all_of = list(all_of or ())
+        any_of = None if any_of is None else list(any_of)
+        found = {}
+        for key in bucket:
+            items = getattr(self.__read(key), attr, None)
+            if type(items) is list and \
+                    all(item in items for item in all_of) and \
+                    (any_of is None or any(item in items for item in any_of)):
+                found[key] = self.__materialize(key)
+        return found
+
+    def query(self, cls):
+        """
+        Starts a query on the objects of a class, to be refined with
+        where(), order_by(), offset() and limit().
+
+        Args:
+            cls (type or str): The model class or its name.
+
+        Returns:
+            Query: The query for every object of the class.
+        """
+        return Query(self, cls)
+
+    @cached
+    def select(self, query):
+        """
+        Runs a query, driving it from the index that yields the fewest
+        candidates and checking the other conditions on those only. When
+        the driving index gives the requested order, the scan stops once
+        the page is full.
+
+        Args:
+            query (Query): The query to run.
+
+        Returns:
+            list: The matching instances.
+        """
+        keys, ordered = self.__plan(query)[1:]
+
+        def matching():
+            for key in keys:
+                obj = self.__read(key)
+                if query.accepts(lambda attr: getattr(obj, attr, None)):
+                    yield key, obj
+        matches = matching()
+        stop = None if query.size is None else query.start + query.size
+        if query.order is None or ordered:
+            found = list(islice(matches, query.start, stop))
+        else:
+            attr, descending = query.order
+
+            def sort_key(item):
+                return order_key(getattr(item[1], attr, None))
+            if stop is None:
+                found = sorted(matches, key=sort_key, reverse=descending)
+            else:
+                pick = nlargest if descending else nsmallest
+                found = pick(stop, matches, key=sort_key)
+            found = found[query.start:]
+        return [self.__materialize(key) for key, obj in found]
+
+    def explain(self, query):
+        """
+        Describes how select() runs a query.
+
+        Args:
+            query (Query): The query to describe.
+
+        Returns:
+            str: The driving index or scan, and its number of candidates.
+        """
+        return self.__plan(query)[0]
+
+    def __plan(self, query):
+        """
+        Chooses how to find the candidates of a query: from a hash index
+        for an equality or "in" condition, from a bitmap index for a
+        "contains" condition, from a sorted index for range conditions or
+        the order, or by scanning the class. The source with the fewest
+        candidates wins, a source giving the requested order winning ties.
+
+        Args:
+            query (Query): The query to plan.
+
+        Returns:
+            tuple: The description of the plan, an iterable of candidate
+                   keys and whether they come in the requested order.
+        """
+        bucket = self.__buckets.get(query.cls, {})
+        indexes = self.__indexes_of(query.cls)
+        order, descending = query.order or (None, False)
+        options = [(len(bucket), True, 'scan', bucket, query.order is None)]
+        bounds = {}
+        for attr, op, operand in query.conditions:
+            hashed = indexes.get(('_hash_indexes', attr))
+            members = indexes.get(('_set_indexes', attr))
+            try:
+                if op == 'eq' and hashed is not None:
+                    keys = hashed.lookup(operand)
+                elif op == 'in' and hashed is not None:
+                    keys = set().union(*map(hashed.lookup, operand))
+                elif op == 'contains' and members is not None:
+                    keys = list(members.lookup(all_of=[operand]))
+                else:
+                    keys = None
+            except TypeError:
+                keys = None
+            if keys is not None:
+                options.append((len(keys), False, f'{op} on {attr}', keys,
+                                query.order is None))
+            if type(operand) in (int, float) and \
+                    op in ('eq', 'lt', 'le', 'gt', 'ge'):
+                low, high = bounds.get(attr, (None, None))
+                if op in ('eq', 'gt', 'ge'):
+                    low = operand if low is None else max(low, operand)
+                if op in ('eq', 'lt', 'le'):
+                    high = operand if high is None else min(high, operand)
+                bounds[attr] = (low, high)
+        for attr, (low, high) in bounds.items():
+            ranged = indexes.get(('_range_indexes', attr))
+            if ranged is not None:
+                options.append((ranged.count(low, high), False,
+                                f'range on {attr}',
+                                ranged.range(low, high, descending),
+                                query.order is None or attr == order))
+        ranged = indexes.get(('_range_indexes', order))
+        if order not in bounds and ranged is not None and \
+                len(ranged) == len(bucket):
+            options.append((len(bucket), False, f'order on {order}',
+                            ranged.range(reverse=descending), True))
+        size, _, how, keys, ordered = min(
+            options, key=lambda option: (option[0], not option[4],
+                                         option[1]))
+        return f'{query.cls}: {how} ({size} candidates)', keys, ordered
 
     def save(self):
         """
         Serializes the __objects dictionary and writes it to the JSON file.
 
+        Only the entries marked dirty since the last save are serialized
+        again, but the whole file is rewritten. In sharded mode only the
+        files of the classes with dirty keys are rewritten. In journaled
+        mode the dirty entries are appended to the log as one batch and
+        nothing is rewritten unless the log has grown past the compaction
+        threshold. While a transaction is open nothing is written until
+        commit(). In write-behind mode the writer thread is woken to write
+        later, and save() returns at once.
+
+        Raises:
+            Exception: The error of a background write that failed since
+                       the last save(), flush() or close().
+
         Side Effects:
             Writes the current state of the __objects dictionary to the file
-            specified in __file_path in JSON format.
+            specified in __file_path in JSON format, and clears the dirty
+            keys.
         """
-        with open(self.__file_path, 'w', encoding="UTF-8") as f:
-            json.dump(self.__objects, f, indent=2)
+        if self.__in_transaction:
+            return
+        self.__raise_error()
+        if self.__write_behind:
+            self.__request()
+            return
+        with self.__writing:
+            self.__write()
+
+    def __write(self):
+        """
+        Writes the dirty entries as save() describes. Must be called with
+        __writing held.
+        """
+        if self.__journal is None:
+            with self.__lock:
+                for key in self.__dirty:
+                    self.__fragments.pop(key, None)
+                if self.__shard_dir is None:
+                    writes = {self.__file_path: self.__render(self.__objects)}
+                else:
+                    names = {key.split('.', 1)[0] for key in self.__dirty}
+                    writes = {self.__shard_path(name):
+                              self.__render(self.__buckets.get(name, ()))
+                              for name in names}
+                self.__dirty.clear()
+            self.__write_files(writes)
+            return
+        with self.__lock:
+            self.__flush_journal()
+        if self.__journal.records > max(self.__compact_threshold,
+                                        len(self.__objects)):
+            self.compact(background=True)
+
+    def __request(self):
+        """
+        Records a save for the writer thread, starting the thread on the
+        first one. The writer is only woken when it is idle or enough
+        keys are dirty, since it keeps waiting while saves keep coming.
+        """
+        with self.__wake:
+            idle = self.__requested is None
+            self.__requested = time.monotonic()
+            if self.__writer is None:
+                self.__writer = threading.Thread(target=self.__run_writer,
+                                                 daemon=True)
+                self.__writer.start()
+            if idle or len(self.__dirty) >= self.__max_pending:
+                self.__wake.notify()
+
+    def __run_writer(self):
+        """
+        Runs the writer thread: waits for a save, then for the debounce
+        interval to pass without another save or for max_pending keys to
+        be dirty, and writes every change at once, until close(). The
+        error of a write is kept for __raise_error(); should the thread
+        stop on any other error, the next save starts a new one.
+        """
+        try:
+            while self.__wait_for_request():
+                with self.__writing:
+                    with self.__wake:
+                        pending, self.__requested = self.__requested, None
+                    if pending is None:
+                        continue
+                    try:
+                        self.__write()
+                    except Exception as e:
+                        self.__error = e
+        except Exception as e:
+            self.__error = e
+        finally:
+            with self.__wake:
+                if self.__writer is threading.current_thread():
+                    self.__writer = None
+
+    def __wait_for_request(self):
+        """
+        Waits until a save is due to be written: the debounce interval
+        passed since the last save, or max_pending keys are dirty. A save
+        taken by flush() in the meantime sends the writer back to waiting
+        for the next one.
+
+        Returns:
+            bool: True when a save is due, False when close() was called.
+        """
+        with self.__wake:
+            while not self.__closing:
+                if self.__requested is None:
+                    self.__wake.wait()
+                    continue
+                if len(self.__dirty) >= self.__max_pending:
+                    return True
+                remaining = self.__requested + self.__debounce - \
+                    time.monotonic()
+                if remaining <= 0:
+                    return True
+                self.__wake.wait(remaining)
+            return False
+
+    def __raise_error(self):
+        """
+        Raises the error of the last failed background write, once.
+        """
+        error, self.__error = self.__error, None
+        if error is not None:
+            raise error
+
+    def flush(self):
+        """
+        Writes at once the changes saved in write-behind mode that the
+        writer thread has not written yet, after waiting for a write in
+        progress. Outside write-behind mode nothing is ever pending.
+
+        Raises:
+            Exception: The error of a background write that failed since
+                       the last save(), flush() or close().
+        """
+        with self.__writing:
+            with self.__wake:
+                pending, self.__requested = self.__requested, None
+            if pending is not None:
+                self.__write()
+        self.__raise_error()
+
+    def close(self):
+        """
+        Stops the writer thread after writing every pending change, and
+        flushes the writes of the current durability batch to disk. The
+        storage stays usable, saving synchronously.
+
+        Raises:
+            Exception: The error of a background write that failed since
+                       the last save(), flush() or close().
+        """
+        self.__write_behind = False
+        with self.__wake:
+            self.__closing = True
+            self.__wake.notify()
+            writer = self.__writer
+        if writer is not None:
+            writer.join()
+        self.flush()
+        self.sync()
+
+    def __render(self, keys):
+        """
+        Builds the document of a file holding the given entries from the
+        cached fragment of each entry, serializing the uncached ones, which
+        are then cached unless the storage is bounded. With
+        the default serializer the result is the same as json.dump() with
+        indent=2 of those entries.
+
+        Args:
+            keys (iterable): The "ClassName.id" keys of the entries to write.
+
+        Returns:
+            tuple: The document holding the entries and the byte range of
+                   each entry, as returned by Serializer.join(), or None
+                   when there are no entries in sharded mode.
+        """
+        fragments = self.__fragments
+        keys = list(keys)
+        parts = []
+        for key in keys:
+            fragment = fragments.get(key)
+            if fragment is None:
+                fragment = self.__fragment(key, self.__objects[key])
+                if self.__live is None:
+                    fragments[key] = fragment
+            parts.append(fragment)
+        if not parts and self.__shard_dir is not None:
+            return None
+        return self.__serializer.join(keys, parts)
+
+    @staticmethod
+    def __group(objects):
+        """
+        Groups entries by class name.
+
+        Args:
+            objects (dict): The entries to group, keyed by "ClassName.id".
+
+        Returns:
+            dict: For each class name, the entries of that class.
+        """
+        groups = {}
+        for key, obj in objects.items():
+            groups.setdefault(key.split('.', 1)[0], {})[key] = obj
+        return groups
+
+    def __shard_path(self, name):
+        """
+        Returns the path of the file holding the objects of a class.
+
+        Args:
+            name (str): The class name.
+        """
+        return os.path.join(self.__shard_dir, name + '.json')
+
+    def __write_files(self, writes):
+        """
+        Writes several files, in parallel when there is more than one.
+
+        Args:
+            writes (dict): The document to write for each path, as
+                           returned by Serializer.join(). None removes
+                           the file.
+        """
+        if self.__shard_dir is not None:
+            os.makedirs(self.__shard_dir, exist_ok=True)
+        if len(writes) > 1:
+            with ThreadPoolExecutor() as pool:
+                list(pool.map(self.__write_file, *zip(*writes.items())))
+        else:
+            for path, document in writes.items():
+                self.__write_file(path, document)
+
+    def __write_file(self, path, document):
+        """
+        Writes a document to a file, or removes the file when the document
+        is None. The document, compressed if the serializer compresses,
+        goes to a temporary file that then replaces the file, so a mapped
+        copy of the old file stays readable and a crash never leaves half
+        a file, and is flushed to disk as the durability policy says. In
+        lazy mode the offset index of an uncompressed file is written
+        after it.
+
+        Args:
+            path (str): The path of the file.
+            document (tuple): The document and the byte range of each
+                              entry, as returned by Serializer.join().
+        """
+        if document is None:
+            for stale in (path, index_path(path)):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            self.__durability.written(os.path.dirname(path) or '.')
+            return
+        data, offsets = document
+        self.__durability.write(path, self.__serializer.pack(data))
+        if self.__lazy and self.__serializer.mappable:
+            write_index(path, offsets, self.__serializer.name)
+
+    def __flush_journal(self):
+        """
+        Appends one record per dirty key to the log and clears the dirty
+        keys. Must be called with the lock held.
+        """
+        records = []
+        for key in self.__dirty:
+            if key not in self.__objects:
+                records.append(('delete', key, None))
+                continue
+            obj = self.__parse(key)
+            if type(obj) is not dict:
+                obj = obj.to_dict()
+            records.append(('new', key, obj))
+        self.__journal.extend(records)
+        self.__dirty.clear()
+
+    @cached
+    def nearby(self, cls, lat, lon, radius_km=None, k=None):
+        """
+        Retrieves the objects of a class positioned within a distance of
+        a point, or the k nearest ones, or the k nearest within the
+        distance, nearest first. The grid index of the class is used when
+        it declares one, otherwise every object of the class is measured.
+
+        Args:
+            cls (type or str): The model class or its name.
+            lat (float): The latitude of the point in degrees.
+            lon (float): The longitude of the point in degrees.
+            radius_km (float): The maximum distance in kilometers.
+            k (int): The maximum number of objects to return.
+
+        Returns:
+            list: (distance in km, instance) pairs, nearest first.
+
+        Raises:
+            ValueError: If neither radius_km nor k is given.
+        """
+        if radius_km is None and k is None:
+            raise ValueError("radius_km or k is required")
+        name = cls if isinstance(cls, str) else cls.__name__
+        bucket = self.__buckets.get(name, {})
+        index = self.__indexes_of(name).get(('_geo_index', None))
+        if index is None:
+            found = []
+            for key in bucket:
+                obj = self.__read(key)
+                p_lat = getattr(obj, 'latitude', None)
+                p_lon = getattr(obj, 'longitude', None)
+                if type(p_lat) in (int, float) and \
+                        type(p_lon) in (int, float):
+                    distance = haversine(lat, lon, p_lat, p_lon)
+                    if radius_km is None or distance <= radius_km:
+                        found.append((distance, key))
+            found.sort()
+        elif radius_km is None:
+            found = index.nearest(lat, lon, k)
+        else:
+            found = index.within(lat, lon, radius_km)
+        return [(distance, self.__materialize(key))
+                for distance, key in found[:k]]
+
+    @cached
+    def search(self, query, cls=None, limit=None):
+        """
+        Retrieves the objects whose indexed text uses words of a query,
+        ranked by relevance with BM25. Only the classes that declare a
+        `_text_index` are searched, each through its own inverted index.
+
+        Args:
+            query (str): The words to look for. An object matches when
+                         its text uses any of them.
+            cls (type or str): The model class or its name. Defaults to
+                               every class.
+            limit (int): The maximum number of objects to return.
+
+        Returns:
+            list: (score, instance) pairs, best match first.
+        """
+        if cls is None:
+            names = list(self.__buckets)
+        else:
+            names = [cls if isinstance(cls, str) else cls.__name__]
+        results = []
+        for name in names:
+            index = self.__indexes_of(name).get(('_text_index', None))
+            if index is not None:
+                results.append(index.search(query, limit))
+        found = merge(*results, key=lambda item: (-item[0], item[1]))
+        return [(score, self.__materialize(key))
+                for score, key in islice(found, limit)]
+
+    @cached
+    def aggregate(self, cls, attr, by=None):
+        """
+        Computes the count, sum, average, minimum and maximum of a numeric
+        attribute over the objects of a class, optionally for each value
+        of another attribute, skipping the values that are not numbers.
+
+        When the class mirrors both attributes in its `_columns`, the
+        statistics are computed on the column arrays; otherwise they are
+        computed in a single pass over the objects.
+
+        Args:
+            cls (type or str): The model class or its name.
+            attr (str): The numeric attribute to summarize.
+            by (str): The attribute to group the objects by, or None.
+
+        Returns:
+            dict: The 'count', 'sum', 'avg', 'min' and 'max' of the values,
+                  or, when `by` is given, those statistics for each value
+                  of `by`.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        columns = self.__indexes_of(name).get(('_columns', None))
+        if columns is not None:
+            try:
+                return columns.aggregate(attr, by)
+            except KeyError:
+                pass
+        bucket = self.__buckets.get(name, {})
+        if not bucket:
+            return aggregate_objects((), attr, by)
+        model = cls if isinstance(cls, type) else self.__model_class(name)
+        return aggregate_objects(map(self.__read, bucket), attr, by,
+                                 type(getattr(model, attr, None)))
+
+    def compact(self, background=False):
+        """
+        Folds the log into a fresh snapshot of the JSON file.
+
+        The log is rotated aside and the current objects are written to a
+        temporary file that then replaces the JSON file, after which the
+        rotated log is removed. Changes made while the snapshot is written
+        go to the new log, so reload() only replays what happened since.
+
+        Args:
+            background (bool): If True, the snapshot is written by a
+                               daemon thread and the method returns
+                               immediately.
+
+        Returns:
+            threading.Thread: The compaction thread when running in the
+                              background, otherwise None.
+
+        Raises:
+            RuntimeError: If a transaction is open.
+        """
+        if self.__in_transaction:
+            raise RuntimeError("cannot compact inside a transaction")
+        if self.__journal is None:
+            self.save()
+            return None
+        with self.__lock:
+            running = self.__compaction
+            if running is not None and running.is_alive():
+                if background:
+                    return running
+                running.join()
+            self.__flush_journal()
+            snapshot = dict(self.__objects)
+            self.__journal.rotate()
+            if not background:
+                self.__write_snapshot(snapshot)
+                return None
+            self.__compaction = threading.Thread(
+                target=self.__write_snapshot, args=(snapshot,), daemon=True)
+            self.__compaction.start()
+            return self.__compaction
+
+    def __write_snapshot(self, snapshot):
+        """
+        Writes a snapshot of the objects over the JSON file, or over every
+        class file in sharded mode, and drops the rotated log it supersedes.
+
+        Args:
+            snapshot (dict): The objects to write, keyed by "ClassName.id".
+        """
+        if self.__shard_dir is None:
+            parts = {self.__file_path: snapshot}
+        else:
+            os.makedirs(self.__shard_dir, exist_ok=True)
+            parts = {path: None for path in self.__shard_paths()}
+            for name, objects in self.__group(snapshot).items():
+                parts[self.__shard_path(name)] = objects
+        for path, objects in parts.items():
+            if objects is not None:
+                keys = list(objects)
+                objects = self.__serializer.join(keys, [
+                    self.__fragment(key, objects[key]) for key in keys])
+            self.__write_file(path, objects)
+        self.__journal.discard_rotated()
+
+    def begin(self):
+        """
+        Opens a transaction. The changes made before it are saved first,
+        so the files hold the state rollback() returns to.
+
+        Raises:
+            RuntimeError: If a transaction is already open.
+        """
+        if self.__in_transaction:
+            raise RuntimeError("a transaction is already open")
+        self.save()
+        self.flush()
+        self.__in_transaction = True
+
+    def commit(self):
+        """
+        Closes the transaction and saves every change made in it at once.
+
+        Raises:
+            RuntimeError: If no transaction is open.
+        """
+        if not self.__in_transaction:
+            raise RuntimeError("no transaction is open")
+        self.__in_transaction = False
+        self.__deleted = {}
+        self.save()
+        self.flush()
+
+    def rollback(self):
+        """
+        Closes the transaction and puts every object created, updated or
+        deleted in it back as it was last saved, read from the files. An
+        instance still in use is updated in place, and a deleted instance
+        is stored again, so references to them stay valid.
+
+        Raises:
+            RuntimeError: If no transaction is open.
+        """
+        if not self.__in_transaction:
+            raise RuntimeError("no transaction is open")
+        with self.__lock:
+            saved = self.__saved(self.__dirty)
+            for key, record in saved.items():
+                self.__restore(key, record)
+                self.cache.bump(key.split('.', 1)[0])
+            self.__dirty.clear()
+            self.__deleted = {}
+            self.__in_transaction = False
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block of a with statement as a transaction: it is
+        committed when the block ends, and rolled back if the block
+        raises.
+
+        Yields:
+            FileStorage: The storage.
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def __saved(self, keys):
+        """
+        Reads the last saved record of some keys from the files and the
+        log.
+
+        Args:
+            keys (iterable): The "ClassName.id" keys.
+
+        Returns:
+            dict: The dictionary or MappedRecord of each key, or None for
+                  the keys that are not saved.
+        """
+        saved = dict.fromkeys(keys)
+        if self.__shard_dir is None:
+            paths = [self.__file_path]
+        else:
+            paths = [self.__shard_path(name) for name in
+                     {key.split('.', 1)[0] for key in saved}]
+        load = self.__map_file if self.__lazy else self.__load_file
+        for path in paths:
+            for key, v in load(path):
+                if key in saved:
+                    saved[key] = v
+        if self.__journal is not None:
+            for op, key, value in self.__journal.replay():
+                if key in saved:
+                    saved[key] = value if op == 'new' else None
+        return saved
+
+    def __restore(self, key, record):
+        """
+        Puts an object back as it was saved. Must be called with the lock
+        held.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            record (dict or MappedRecord): The saved object, or None if
+                                           it was not saved.
+        """
+        entry = self.__objects.get(key)
+        if type(entry) in RECORD_TYPES:
+            entry = None
+        if entry is None and self.__evicted is not None:
+            entry = self.__evicted.get(key)
+        if entry is None:
+            entry = self.__deleted.get(key)
+        self.__remove(key)
+        self.__fragments.pop(key, None)
+        if record is None:
+            return
+        if entry is not None or (self.__live is None and not self.__lazy):
+            if type(record) is MappedRecord:
+                record = record.load()
+            restored = self.__model_class(key.split('.', 1)[0])(**record)
+            if entry is not None:
+                entry.__dict__.clear()
+                entry.__dict__.update(restored.__dict__)
+                restored = entry
+            record = restored
+        self.__insert(key, record)
+
+    def sync(self):
+        """
+        Flushes to disk the files and log records written since the last
+        flush of the 'batched' policy, without waiting for its timer. The
+        other policies have nothing pending.
+        """
+        self.__durability.flush()
+
+    def fsck(self):
+        """
+        Reads the JSON file, or every class file in sharded mode, as
+        reload() would, without storing anything, and reports what each
+        one holds intact.
+
+        Returns:
+            list: The report of each file, as returned by check_file().
+        """
+        if self.__shard_dir is None:
+            paths = [self.__file_path]
+        else:
+            paths = self.__shard_paths()
+        return [check_file(path) for path in paths if os.path.exists(path)]
+
+    def __shard_paths(self):
+        """
+        Lists the class files present in the shard directory.
+
+        Returns:
+            list: The paths of the "<ClassName>.json" files.
+        """
+        try:
+            names = os.listdir(self.__shard_dir)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.__shard_dir, name)
+                for name in sorted(names) if name.endswith('.json')]
 
     def reload(self):
         """
         Loads objects from the JSON file into the __objects dictionary.
 
         This method deserializes data from the JSON file if it exists and
-        populates the __objects dictionary with stored instance data.
-        Each instance is represented in dictionary format with a key formatted
-        as "ClassName.id".
+        populates the __objects dictionary with instances rebuilt from the
+        stored data, with keys formatted as "ClassName.id". The file is
+        streamed: each object is stored as soon as it is decoded, so the
+        whole document is never held in memory.
+
+        In sharded mode the class files are read in parallel instead.
+        In journaled mode the records of the log are then replayed in
+        order on top of the JSON file, the objects they replace being
+        skipped while the file is read. In lazy mode a file with a valid
+        offset index is mapped instead of read, and its objects are left
+        unparsed.
+
+        Raises:
+            CorruptFileError: If a file is empty or cannot be read. The
+                              objects read before the error stay loaded,
+                              but the log is not replayed.
 
         Side Effects:
             Updates the __objects dictionary by adding entries from the file.
-            If the file does not exist or is empty, __objects
-            remains unchanged.
+            If the file does not exist, __objects remains unchanged.
+        """
+        self.__in_transaction = False
+        self.__deleted = {}
+        replayed = {}
+        if self.__journal is not None:
+            for op, key, value in self.__journal.replay():
+                replayed[key] = value if op == 'new' else None
+        self.cache.clear()
+        load = self.__map_file if self.__lazy else self.__load_file
+
+        def store(path):
+            for key, v in load(path):
+                if key not in replayed:
+                    self.__store(key, v)
+        if self.__shard_dir is None:
+            store(self.__file_path)
+        else:
+            if self.__classes is None:
+                # reload() runs while `import models` holds the import
+                # lock, so the workers must not import the model modules.
+                self.__classes = model_classes()
+            with ThreadPoolExecutor() as pool:
+                list(pool.map(store, self.__shard_paths()))
+        for key, v in replayed.items():
+            if v is not None:
+                self.__store(key, v)
+                continue
+            with self.__lock:
+                self.__remove(key)
+                self.__fragments.pop(key, None)
+
+    def __store(self, key, v):
+        """
+        Stores one object read from a file or the log, as an instance, or
+        as its record in bounded or lazy mode.
+
+        Args:
+            key (str): The "ClassName.id" key of the object in the file.
+            v (dict or MappedRecord): The object.
+        """
+        if type(v) is dict:
+            key = f"{v['__class__']}.{v['id']}"
+            if self.__live is None and not self.__lazy:
+                v = self.__model_class(v['__class__'])(**v)
+        with self.__lock:
+            self.__insert(key, v)
+            self.__fragments.pop(key, None)
+
+    @staticmethod
+    def __load_file(path):
+        """
+        Reads the objects stored in one file, one at a time, whatever its
+        format.
+
+        Args:
+            path (str): The path of the file.
+
+        Yields:
+            tuple: The "ClassName.id" key and the dictionary of each
+                   object. Nothing is yielded if the file does not exist.
+
+        Raises:
+            CorruptFileError: If the file is empty or not valid.
         """
         try:
-            with open(self.__file_path, 'r', encoding="UTF-8") as f:
-                try:
-                    data = json.load(f)
-                except json.decoder.JSONDecodeError as e:
-                    pass
-                else:
-                    for v in data.values():
-                        self.__objects[f"{v['__class__']}.{v['id']}"] = v
+            yield from load_items(path)
         except FileNotFoundError:
-            pass
+            return
+
+    def __map_file(self, path):
+        """
+        Maps the objects stored in one JSON file through its offset index,
+        or reads them all when the file has no valid index.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            iterable: The "ClassName.id" key and the MappedRecord of each
+                      object, or the objects as read by __load_file().
+        """
+        mapped = map_file(path, self.__serializer)
+        if mapped is None:
+            return self.__load_file(path)
+        return mapped.items()
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""
+This module is the command line tool converting the files of
+FileStorage between formats and comparing the formats on a file.
+
+Usage:
+    python3 -m models.engine.formats convert SOURCE TARGET
+        [--format pretty|compact|marshal|records]
+        [--compression gzip|lzma]
+    python3 -m models.engine.formats benchmark FILE [--repeat N]
+
+The benchmark prints, for every format and compression, the size of
+the file and the time taken to encode and decode its objects.
+
+Functions:
+    main: Runs the converter or the benchmark.
+"""
+
+import argparse
+import sys
+from models.engine.serializers import COMPRESSIONS, SERIALIZERS, \
+    benchmark, convert, load_items
+
+
+def main(argv=None):
+    """
+    Runs the converter or the benchmark from the command line.
+
+    Args:
+        argv (list): The arguments, without the program name. Defaults to
+                     sys.argv[1:].
+    """
+    parser = argparse.ArgumentParser(
+        prog='python3 -m models.engine.formats',
+        description="Convert or benchmark FileStorage file formats.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    converter = commands.add_parser('convert', help="rewrite a file")
+    converter.add_argument('source')
+    converter.add_argument('target')
+    converter.add_argument('--format', choices=list(SERIALIZERS),
+                           default='pretty')
+    converter.add_argument('--compression', choices=list(COMPRESSIONS))
+    bench = commands.add_parser('benchmark', help="compare the formats")
+    bench.add_argument('file')
+    bench.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    if args.command == 'convert':
+        count = convert(args.source, args.target, args.format,
+                        args.compression)
+        print(f"{count} objects written to {args.target}")
+        return
+    records = dict(load_items(args.file))
+    print(f"{'format':<10}{'compression':<13}{'size':>12}"
+          f"{'encode ms':>12}{'decode ms':>12}")
+    for row in benchmark(records, args.repeat):
+        print(f"{row['format']:<10}{row['compression'] or '-':<13}"
+              f"{row['size']:>12}{row['encode'] * 1000:>12.1f}"
+              f"{row['decode'] * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
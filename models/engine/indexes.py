@@ -0,0 +1,783 @@
+#!/usr/bin/python3
+"""
+This module defines the secondary indexes FileStorage keeps on model
+attributes.
+
+A model class declares the attributes to index with class attributes,
+for example `_hash_indexes = ('state_id',)` on City or
+`_set_indexes = ('amenity_ids',)` on Place, or
+`_geo_index = ('latitude', 'longitude')` on Place for an index over
+several attributes, or `_text_index = ('name', 'description')` for a
+full-text index over the words of several attributes. The columnar
+mirror of `_columns` (see models.engine.columns) is kept the same way.
+FileStorage
+builds the declared indexes with build_indexes() and keeps them up to
+date as objects are created, updated and deleted.
+
+Classes:
+    HashIndex: Maps each value of an attribute to the keys holding it.
+    SortedIndex: Keeps the keys sorted by the value of a numeric attribute.
+    BitmapIndex: Maps each item of a list attribute to a bitmap of keys.
+    GridIndex: Buckets the keys by latitude/longitude grid cell.
+    TextIndex: Maps each word of some text attributes to the keys using it.
+
+Functions:
+    build_indexes: Creates the indexes declared by a model class.
+    in_range: Tells whether a value lies between two bounds.
+    order_key: Sort key that puts numbers first, then other values.
+    haversine: Great-circle distance between two points in kilometers.
+    geo_window: Latitude and longitude ranges around a point.
+    nearest: k nearest neighbours from a radius search.
+    tokenize: Splits a text into lowercase words.
+"""
+
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from heapq import nsmallest
+from math import asin, cos, floor, log, radians, sin, sqrt
+from models.engine.columns import ColumnStore
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * 3.141592653589793 / 180
+# Half the circumference: no two points on Earth are further apart.
+MAX_DISTANCE_KM = KM_PER_DEGREE * 180
+
+# The BM25 term frequency saturation and document length normalization.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Compares greater than any "ClassName.id" key, as the upper bound of a
+# value in (value, key) pairs.
+_LAST_KEY = chr(0x10FFFF)
+
+
+class HashIndex:
+    """
+    Equality index on one attribute.
+
+    Attributes:
+        attr (str): The name of the indexed attribute.
+        __keys (dict): The set of "ClassName.id" keys for each value.
+        __values (dict): The indexed value of each key.
+    """
+
+    def __init__(self, attr):
+        """
+        Initializes an empty index.
+
+        Args:
+            attr (str): The name of the attribute to index.
+        """
+        self.attr = attr
+        self.__keys = {}
+        self.__values = {}
+
+    def add(self, key, obj):
+        """
+        Indexes an object, replacing the entry of an older version.
+
+        Values that cannot be hashed, such as lists, are not indexed.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel): The object to index.
+        """
+        self.discard(key)
+        value = getattr(obj, self.attr, None)
+        try:
+            self.__keys.setdefault(value, set()).add(key)
+        except TypeError:
+            return
+        self.__values[key] = value
+
+    def discard(self, key):
+        """
+        Removes the entry of a key, if it is indexed.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+        """
+        if key not in self.__values:
+            return
+        value = self.__values.pop(key)
+        keys = self.__keys[value]
+        keys.discard(key)
+        if not keys:
+            del self.__keys[value]
+
+    def lookup(self, value):
+        """
+        Returns the keys of the objects whose attribute equals a value.
+
+        Args:
+            value: The value to look up. It must be hashable.
+
+        Returns:
+            set: The matching "ClassName.id" keys. It must not be modified.
+        """
+        return self.__keys.get(value, frozenset())
+
+
+class SortedIndex:
+    """
+    Ordered index on one numeric attribute, for range queries.
+
+    Entries are (value, key) pairs kept in a sorted list, so the keys with
+    a value between two bounds are found by bisection and come out in
+    value order without sorting. Values that are not int or float are not
+    indexed.
+
+    Attributes:
+        attr (str): The name of the indexed attribute.
+        __entries (list): The sorted (value, key) pairs.
+        __values (dict): The indexed value of each key.
+    """
+
+    def __init__(self, attr):
+        """
+        Initializes an empty index.
+
+        Args:
+            attr (str): The name of the attribute to index.
+        """
+        self.attr = attr
+        self.__entries = []
+        self.__values = {}
+
+    def __len__(self):
+        """Returns the number of indexed keys."""
+        return len(self.__values)
+
+    def add(self, key, obj):
+        """
+        Indexes an object, replacing the entry of an older version.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel): The object to index.
+        """
+        self.discard(key)
+        value = getattr(obj, self.attr, None)
+        if type(value) not in (int, float) or value != value:
+            return
+        insort(self.__entries, (value, key))
+        self.__values[key] = value
+
+    def discard(self, key):
+        """
+        Removes the entry of a key, if it is indexed.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+        """
+        if key not in self.__values:
+            return
+        entry = (self.__values.pop(key), key)
+        del self.__entries[bisect_left(self.__entries, entry)]
+
+    def __bounds(self, low, high):
+        """
+        Returns the positions of the first entry and past the last entry
+        with a value between low and high, both included.
+
+        Args:
+            low (int or float): The lower bound, or None for no bound.
+            high (int or float): The upper bound, or None for no bound.
+        """
+        start = 0 if low is None else bisect_left(self.__entries, (low, ''))
+        end = len(self.__entries) if high is None else \
+            bisect_right(self.__entries, (high, _LAST_KEY))
+        return start, max(start, end)
+
+    def count(self, low=None, high=None):
+        """
+        Counts the keys with a value between low and high, both included.
+
+        Args:
+            low (int or float): The lower bound, or None for no bound.
+            high (int or float): The upper bound, or None for no bound.
+
+        Returns:
+            int: The number of keys in the range.
+        """
+        start, end = self.__bounds(low, high)
+        return end - start
+
+    def range(self, low=None, high=None, reverse=False):
+        """
+        Yields the keys with a value between low and high, both included,
+        in increasing value order or decreasing when reverse is True.
+
+        Args:
+            low (int or float): The lower bound, or None for no bound.
+            high (int or float): The upper bound, or None for no bound.
+            reverse (bool): If True, the largest values come first.
+
+        Yields:
+            str: The "ClassName.id" keys in the range.
+        """
+        start, end = self.__bounds(low, high)
+        positions = range(end - 1, start - 1, -1) if reverse else \
+            range(start, end)
+        entries = self.__entries
+        for i in positions:
+            yield entries[i][1]
+
+
+class BitmapIndex:
+    """
+    Membership index on a list attribute, such as a list of ids.
+
+    Each indexed key gets an ordinal, a bit position, and each item found
+    in the lists gets a bitmap, a Python int whose bit at the ordinal of
+    a key is set when the list of that key holds the item. Filters on
+    several items are then bitwise AND and OR operations on whole
+    bitmaps. The ordinals of removed keys are given to new keys, so the
+    bitmaps stay as short as the number of indexed keys. Values that are
+    not lists and items that cannot be hashed are not indexed.
+
+    Attributes:
+        attr (str): The name of the indexed attribute.
+        __bitmaps (dict): The bitmap of each item.
+        __ordinals (dict): The ordinal of each "ClassName.id" key.
+        __keys (list): The key at each ordinal, None for a free one.
+        __free (list): The free ordinals.
+        __items (dict): The indexed items of each key.
+        __all (int): The bitmap of every indexed key.
+    """
+
+    def __init__(self, attr):
+        """
+        Initializes an empty index.
+
+        Args:
+            attr (str): The name of the attribute to index.
+        """
+        self.attr = attr
+        self.__bitmaps = {}
+        self.__ordinals = {}
+        self.__keys = []
+        self.__free = []
+        self.__items = {}
+        self.__all = 0
+
+    def __len__(self):
+        """Returns the number of indexed keys."""
+        return len(self.__ordinals)
+
+    def add(self, key, obj):
+        """
+        Indexes an object, replacing the entry of an older version.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel): The object to index.
+        """
+        self.discard(key)
+        value = getattr(obj, self.attr, None)
+        if type(value) is not list:
+            return
+        try:
+            items = frozenset(value)
+        except TypeError:
+            return
+        if self.__free:
+            ordinal = self.__free.pop()
+            self.__keys[ordinal] = key
+        else:
+            ordinal = len(self.__keys)
+            self.__keys.append(key)
+        bit = 1 << ordinal
+        for item in items:
+            self.__bitmaps[item] = self.__bitmaps.get(item, 0) | bit
+        self.__ordinals[key] = ordinal
+        self.__items[key] = items
+        self.__all |= bit
+
+    def discard(self, key):
+        """
+        Removes the entry of a key, if it is indexed.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+        """
+        ordinal = self.__ordinals.pop(key, None)
+        if ordinal is None:
+            return
+        mask = ~(1 << ordinal)
+        for item in self.__items.pop(key):
+            bitmap = self.__bitmaps[item] & mask
+            if bitmap:
+                self.__bitmaps[item] = bitmap
+            else:
+                del self.__bitmaps[item]
+        self.__all &= mask
+        self.__keys[ordinal] = None
+        self.__free.append(ordinal)
+
+    def bitmap(self, all_of=None, any_of=None):
+        """
+        Computes the bitmap of the keys whose list holds every item of
+        `all_of` and at least one item of `any_of`.
+
+        Args:
+            all_of (iterable): The items required together, or None.
+            any_of (iterable): The items of which one is required, or None.
+
+        Returns:
+            int: The bitmap of the matching keys.
+        """
+        bitmaps = self.__bitmaps
+        bits = self.__all
+        for item in all_of or ():
+            bits &= bitmaps.get(item, 0)
+            if not bits:
+                return 0
+        if any_of is not None:
+            either = 0
+            for item in any_of:
+                either |= bitmaps.get(item, 0)
+            bits &= either
+        return bits
+
+    def lookup(self, all_of=None, any_of=None):
+        """
+        Finds the keys whose list holds every item of `all_of` and at
+        least one item of `any_of`.
+
+        Args:
+            all_of (iterable): The items required together, or None.
+            any_of (iterable): The items of which one is required, or None.
+
+        Yields:
+            str: The matching "ClassName.id" keys, in ordinal order.
+        """
+        digits = bin(self.bitmap(all_of, any_of))[:1:-1]
+        keys = self.__keys
+        ordinal = digits.find('1')
+        while ordinal != -1:
+            yield keys[ordinal]
+            ordinal = digits.find('1', ordinal + 1)
+
+    def count(self, all_of=None, any_of=None):
+        """
+        Counts the keys matching the same filters as lookup().
+
+        Args:
+            all_of (iterable): The items required together, or None.
+            any_of (iterable): The items of which one is required, or None.
+
+        Returns:
+            int: The number of matching keys.
+        """
+        return bin(self.bitmap(all_of, any_of)).count('1')
+
+
+class GridIndex:
+    """
+    Spatial index on a latitude and a longitude attribute.
+
+    Keys are bucketed by the grid cell, of `cell` degrees on each side,
+    holding their position. A radius search only looks at the cells that
+    overlap the bounding box of the circle, and a nearest neighbours
+    search widens a radius search until it holds enough keys. Positions
+    that are not numbers within the valid ranges are not indexed.
+
+    Attributes:
+        lat_attr (str): The name of the latitude attribute.
+        lon_attr (str): The name of the longitude attribute.
+        cell (float): The size of a cell in degrees. It divides 360.
+        __cells (dict): The set of keys in each (row, column) cell.
+        __positions (dict): The (latitude, longitude, cell) of each key.
+    """
+
+    def __init__(self, lat_attr, lon_attr, cell=1.0):
+        """
+        Initializes an empty index.
+
+        Args:
+            lat_attr (str): The name of the latitude attribute.
+            lon_attr (str): The name of the longitude attribute.
+            cell (float): The size of a cell in degrees. Defaults to 1,
+                          about 111 km along a meridian.
+        """
+        self.lat_attr = lat_attr
+        self.lon_attr = lon_attr
+        self.cell = cell
+        self.__columns = round(360 / cell)
+        self.__cells = {}
+        self.__positions = {}
+
+    def __len__(self):
+        """Returns the number of indexed keys."""
+        return len(self.__positions)
+
+    def __cell_of(self, lat, lon):
+        """
+        Returns the (row, column) cell holding a position.
+
+        Args:
+            lat (float): The latitude in degrees.
+            lon (float): The longitude in degrees.
+        """
+        return (floor((lat + 90) / self.cell),
+                floor((lon + 180) / self.cell) % self.__columns)
+
+    def add(self, key, obj):
+        """
+        Indexes an object, replacing the entry of an older version.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel): The object to index.
+        """
+        self.discard(key)
+        lat = getattr(obj, self.lat_attr, None)
+        lon = getattr(obj, self.lon_attr, None)
+        if type(lat) not in (int, float) or type(lon) not in (int, float) \
+                or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return
+        cell = self.__cell_of(lat, lon)
+        self.__cells.setdefault(cell, set()).add(key)
+        self.__positions[key] = (lat, lon, cell)
+
+    def discard(self, key):
+        """
+        Removes the entry of a key, if it is indexed.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+        """
+        if key not in self.__positions:
+            return
+        cell = self.__positions.pop(key)[2]
+        keys = self.__cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self.__cells[cell]
+
+    def within(self, lat, lon, radius_km):
+        """
+        Finds the keys positioned within a distance of a point.
+
+        Args:
+            lat (float): The latitude of the point in degrees.
+            lon (float): The longitude of the point in degrees.
+            radius_km (float): The distance in kilometers.
+
+        Returns:
+            list: (distance in km, key) pairs, nearest first.
+        """
+        lat_low, lat_high, lon_ranges = geo_window(lat, lon, radius_km)
+        rows = range(self.__cell_of(lat_low, 0)[0],
+                     self.__cell_of(lat_high, 0)[0] + 1)
+        columns = set()
+        for low, high in lon_ranges:
+            first = floor((low + 180) / self.cell)
+            last = floor((high + 180) / self.cell)
+            columns.update(c % self.__columns for c in range(first, last + 1))
+        if len(rows) * len(columns) > len(self.__cells):
+            cells = [c for c in self.__cells
+                     if c[0] in rows and c[1] in columns]
+        else:
+            cells = [(r, c) for r in rows for c in columns
+                     if (r, c) in self.__cells]
+        found = []
+        for cell in cells:
+            for key in self.__cells[cell]:
+                position = self.__positions[key]
+                distance = haversine(lat, lon, position[0], position[1])
+                if distance <= radius_km:
+                    found.append((distance, key))
+        found.sort()
+        return found
+
+    def nearest(self, lat, lon, k):
+        """
+        Finds the k keys positioned nearest to a point.
+
+        Args:
+            lat (float): The latitude of the point in degrees.
+            lon (float): The longitude of the point in degrees.
+            k (int): The number of keys to find.
+
+        Returns:
+            list: At most k (distance in km, key) pairs, nearest first.
+        """
+        return nearest(lambda radius: self.within(lat, lon, radius), k,
+                       self.cell * KM_PER_DEGREE, len(self))
+
+
+class TextIndex:
+    """
+    Inverted full-text index on one or more text attributes.
+
+    The words of the attributes of each key are counted into posting
+    lists, so a query only looks at the keys that use one of its words.
+    Matches are ranked with Okapi BM25: keys using rare query words, and
+    using them often relative to the length of their text, come first.
+    Values that are not strings are not indexed.
+
+    Attributes:
+        attrs (tuple): The names of the indexed attributes.
+        __postings (dict): For each word, the number of times each key
+                           uses it, keyed by "ClassName.id".
+        __words (dict): The distinct words of each key.
+        __lengths (dict): The number of words of each key.
+        __total (int): The number of words of all the keys.
+    """
+
+    def __init__(self, *attrs):
+        """
+        Initializes an empty index.
+
+        Args:
+            *attrs (str): The names of the attributes to index.
+        """
+        self.attrs = attrs
+        self.__postings = {}
+        self.__words = {}
+        self.__lengths = {}
+        self.__total = 0
+
+    def __len__(self):
+        """Returns the number of indexed keys."""
+        return len(self.__lengths)
+
+    def add(self, key, obj):
+        """
+        Indexes an object, replacing the entry of an older version.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            obj (BaseModel): The object to index.
+        """
+        self.discard(key)
+        words = []
+        for attr in self.attrs:
+            value = getattr(obj, attr, None)
+            if type(value) is str:
+                words.extend(tokenize(value))
+        if not words:
+            return
+        counts = Counter(words)
+        for word, count in counts.items():
+            self.__postings.setdefault(word, {})[key] = count
+        self.__words[key] = tuple(counts)
+        self.__lengths[key] = len(words)
+        self.__total += len(words)
+
+    def discard(self, key):
+        """
+        Removes the entry of a key, if it is indexed.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+        """
+        words = self.__words.pop(key, None)
+        if words is None:
+            return
+        self.__total -= self.__lengths.pop(key)
+        for word in words:
+            postings = self.__postings[word]
+            del postings[key]
+            if not postings:
+                del self.__postings[word]
+
+    def search(self, query, limit=None):
+        """
+        Finds the keys using any word of a query, best match first.
+
+        Args:
+            query (str): The words to look for.
+            limit (int): The maximum number of keys to return.
+
+        Returns:
+            list: (score, key) pairs, highest score first. Keys with equal
+                  scores are ordered by key.
+        """
+        total_keys = len(self.__lengths)
+        if not total_keys:
+            return []
+        average = self.__total / total_keys
+        scores = {}
+        for word in set(tokenize(query)):
+            postings = self.__postings.get(word)
+            if not postings:
+                continue
+            idf = log(1 + (total_keys - len(postings) + 0.5) /
+                      (len(postings) + 0.5))
+            for key, count in postings.items():
+                norm = 1 - BM25_B + BM25_B * self.__lengths[key] / average
+                scores[key] = scores.get(key, 0) + idf * count * \
+                    (BM25_K1 + 1) / (count + BM25_K1 * norm)
+        ranked = ((score, key) for key, score in scores.items())
+
+        def rank_key(item):
+            return (-item[0], item[1])
+        if limit is None:
+            return sorted(ranked, key=rank_key)
+        return nsmallest(limit, ranked, key=rank_key)
+
+
+INDEX_TYPES = {
+    '_hash_indexes': HashIndex,
+    '_range_indexes': SortedIndex,
+    '_set_indexes': BitmapIndex,
+}
+
+COMPOSITE_INDEX_TYPES = {
+    '_geo_index': GridIndex,
+    '_text_index': TextIndex,
+    '_columns': ColumnStore,
+}
+
+
+def build_indexes(cls):
+    """
+    Creates the empty indexes declared by a model class.
+
+    Args:
+        cls (type): The model class.
+
+    Returns:
+        dict: The indexes keyed by (declaration, attribute name), for
+              example ('_hash_indexes', 'state_id'), or by
+              (declaration, None) for an index over several attributes.
+    """
+    indexes = {(declaration, attr): index_type(attr)
+               for declaration, index_type in INDEX_TYPES.items()
+               for attr in getattr(cls, declaration, ())}
+    for declaration, index_type in COMPOSITE_INDEX_TYPES.items():
+        attrs = getattr(cls, declaration, None)
+        if attrs:
+            indexes[declaration, None] = index_type(*attrs)
+    return indexes
+
+
+def in_range(value, low, high):
+    """
+    Tells whether a value lies between two bounds, both included.
+
+    Args:
+        value: The value to test.
+        low: The lower bound, or None for no bound.
+        high: The upper bound, or None for no bound.
+
+    Returns:
+        bool: False as well when the value cannot be compared to the
+              bounds.
+    """
+    try:
+        return (low is None or value >= low) and \
+            (high is None or value <= high)
+    except TypeError:
+        return False
+
+
+def order_key(value):
+    """
+    Sort key for attribute values of mixed types: numbers in increasing
+    order first, then the other values ordered by their text.
+
+    Args:
+        value: The attribute value.
+
+    Returns:
+        tuple: A key that compares with the key of any other value.
+    """
+    if type(value) in (int, float):
+        return (False, value)
+    return (True, str(value))
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Computes the great-circle distance between two points.
+
+    Args:
+        lat1 (float): The latitude of the first point in degrees.
+        lon1 (float): The longitude of the first point in degrees.
+        lat2 (float): The latitude of the second point in degrees.
+        lon2 (float): The longitude of the second point in degrees.
+
+    Returns:
+        float: The distance in kilometers.
+    """
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + \
+        cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def geo_window(lat, lon, radius_km):
+    """
+    Computes the latitude and longitude ranges that hold every point
+    within a distance of a point.
+
+    Args:
+        lat (float): The latitude of the point in degrees.
+        lon (float): The longitude of the point in degrees.
+        radius_km (float): The distance in kilometers.
+
+    Returns:
+        tuple: The lowest and highest latitude, and a list of one or two
+               (lowest, highest) longitude ranges within [-180, 180],
+               two when the window crosses the antimeridian.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    lat_low = max(-90.0, lat - dlat)
+    lat_high = min(90.0, lat + dlat)
+    widest = max(abs(lat_low), abs(lat_high))
+    if widest >= 90 or dlat >= 90:
+        return lat_low, lat_high, [(-180.0, 180.0)]
+    dlon = dlat / cos(radians(widest))
+    if dlon >= 180:
+        return lat_low, lat_high, [(-180.0, 180.0)]
+    low, high = lon - dlon, lon + dlon
+    if low < -180:
+        return lat_low, lat_high, [(low + 360, 180.0), (-180.0, high)]
+    if high > 180:
+        return lat_low, lat_high, [(low, 180.0), (-180.0, high - 360)]
+    return lat_low, lat_high, [(low, high)]
+
+
+def nearest(within, k, radius_km, total):
+    """
+    Finds the k nearest neighbours with radius searches, doubling the
+    radius until the search holds k results or covers the whole Earth.
+
+    Args:
+        within (callable): Takes a radius in km and returns the
+                           (distance, item) pairs within it, nearest first.
+        k (int): The number of neighbours to find.
+        radius_km (float): The radius of the first search.
+        total (int): The number of items that can be found, or None if
+                     unknown.
+
+    Returns:
+        list: At most k (distance, item) pairs, nearest first.
+    """
+    k = min(k, total) if total is not None else k
+    if k <= 0:
+        return []
+    while True:
+        found = within(radius_km)
+        if len(found) >= k or radius_km >= MAX_DISTANCE_KM:
+            return found[:k]
+        radius_km *= 2
+
+
+def tokenize(text):
+    """
+    Splits a text into words, lowercased, dropping punctuation.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The words in order, repeated as often as they appear.
+    """
+    return re.findall(r'\w+', text.lower())
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+"""
+This module defines the helpers FileStorage uses to keep only part of
+the stored objects as model instances: a bounded cache of the instances
+in use, a read-only view of the raw records of the others, and a lazy
+mapping that turns records into instances when they are read.
+
+A record is the dictionary representation of an object, as returned by
+to_dict(). It costs a fraction of an instance to keep, and building the
+instance back from it is only done for the objects actually read.
+
+Classes:
+    InstanceCache: Least recently used instances, by count and size.
+    RecordView: Attribute access to a record without building an instance.
+    LazyObjects: Read-only mapping of keys to instances built on demand.
+
+Functions:
+    sizeof: Estimates the memory held by an instance.
+"""
+
+import sys
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+
+
+def sizeof(obj):
+    """
+    Estimates the memory held by an instance: the object, its attribute
+    dictionary and the attribute values, lists counted with their items.
+
+    Args:
+        obj (BaseModel): The instance.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    attributes = vars(obj)
+    size = sys.getsizeof(obj) + sys.getsizeof(attributes)
+    for value in attributes.values():
+        size += sys.getsizeof(value)
+        if type(value) is list:
+            size += sum(map(sys.getsizeof, value))
+    return size
+
+
+class InstanceCache:
+    """
+    Least recently used set of the instances kept hydrated, bounded by
+    their number and by their estimated memory.
+
+    Attributes:
+        max_count (int): The maximum number of instances, or None.
+        max_bytes (int): The maximum estimated size of the instances in
+                         bytes, or None.
+        size (int): The estimated size of the cached instances.
+        __sizes (OrderedDict): The estimated size of each cached key,
+                               least recently used first.
+    """
+
+    def __init__(self, max_count=None, max_bytes=None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_count (int): The maximum number of instances, or None.
+            max_bytes (int): The maximum estimated size in bytes, or None.
+        """
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.__sizes = OrderedDict()
+
+    def __len__(self):
+        """Returns the number of cached instances."""
+        return len(self.__sizes)
+
+    def __contains__(self, key):
+        """Tells whether the instance of a key is cached."""
+        return key in self.__sizes
+
+    def touch(self, key, obj):
+        """
+        Marks the instance of a key as the most recently used, adding it
+        when it is not cached, and evicts the least recently used ones
+        while a bound is exceeded. The instance just touched is never
+        evicted.
+
+        Args:
+            key (str): The "ClassName.id" key of the instance.
+            obj (BaseModel): The instance.
+
+        Returns:
+            list: The evicted keys.
+        """
+        if key in self.__sizes:
+            self.__sizes.move_to_end(key)
+            return []
+        size = sizeof(obj)
+        self.__sizes[key] = size
+        self.size += size
+        evicted = []
+        while len(self.__sizes) > 1 and (
+                self.max_count is not None and
+                len(self.__sizes) > self.max_count or
+                self.max_bytes is not None and self.size > self.max_bytes):
+            old, old_size = self.__sizes.popitem(last=False)
+            self.size -= old_size
+            evicted.append(old)
+        return evicted
+
+    def discard(self, key):
+        """
+        Forgets the instance of a key, if it is cached.
+
+        Args:
+            key (str): The "ClassName.id" key of the instance.
+        """
+        size = self.__sizes.pop(key, None)
+        if size is not None:
+            self.size -= size
+
+    def clear(self):
+        """Forgets every instance."""
+        self.__sizes.clear()
+        self.size = 0
+
+
+class RecordView:
+    """
+    Read-only attribute access to a record, answering like the instance
+    it describes would, without building it: missing attributes fall
+    back to the class defaults and the timestamps are parsed on access.
+
+    Attributes:
+        __cls (type): The model class of the record.
+        __record (dict): The record.
+    """
+
+    __slots__ = ('_RecordView__cls', '_RecordView__record')
+
+    def __init__(self, cls, record):
+        """
+        Initializes a view of a record.
+
+        Args:
+            cls (type): The model class of the record.
+            record (dict): The record.
+        """
+        self.__cls = cls
+        self.__record = record
+
+    @property
+    def __class__(self):
+        """The model class of the record, as for the instance."""
+        return self.__cls
+
+    def __getattr__(self, name):
+        """
+        Returns the value of an attribute of the record.
+
+        Args:
+            name (str): The attribute name.
+
+        Raises:
+            AttributeError: If neither the record nor the class has it.
+        """
+        try:
+            value = self.__record[name]
+        except KeyError:
+            return getattr(self.__cls, name)
+        if name in ('created_at', 'updated_at'):
+            return datetime.fromisoformat(value)
+        return value
+
+
+class LazyObjects(Mapping):
+    """
+    Read-only mapping of "ClassName.id" keys to instances, over a
+    dictionary whose values may be instances or records. Records are
+    turned into instances, by a callback of the storage, only when
+    their value is read.
+
+    Attributes:
+        __entries (dict): The instances or records keyed by
+                          "ClassName.id".
+        __hydrate (callable): Returns the instance of a key.
+    """
+
+    def __init__(self, entries, hydrate):
+        """
+        Initializes the mapping.
+
+        Args:
+            entries (dict): The instances or records keyed by
+                            "ClassName.id".
+            hydrate (callable): Returns the instance of a key.
+        """
+        self.__entries = entries
+        self.__hydrate = hydrate
+
+    def __getitem__(self, key):
+        """Returns the instance of a key."""
+        if key not in self.__entries:
+            raise KeyError(key)
+        return self.__hydrate(key)
+
+    def __contains__(self, key):
+        """Tells whether a key is stored, without building its instance."""
+        return key in self.__entries
+
+    def __iter__(self):
+        """Iterates over the keys."""
+        return iter(self.__entries)
+
+    def __len__(self):
+        """Returns the number of keys."""
+        return len(self.__entries)
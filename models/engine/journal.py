@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+"""
+This module defines the Journal class, an append-only write-ahead log
+used by FileStorage in journaled mode.
+
+Each change to the storage is recorded as a single JSON line of the form
+{"op": "new", "key": "ClassName.id", "value": {...}} or
+{"op": "delete", "key": "ClassName.id"}, so a write costs one appended
+line instead of a rewrite of the whole JSON file.
+
+While the storage is being compacted the current log is rotated to
+"<path>.1" and new records go to a fresh log, so replay() reads the
+rotated log first when it is still present.
+
+A write interrupted by a crash can leave a torn last line. Before the
+first write to a log, and after replaying it, the torn line is cut off,
+so that the records appended after recovery start on a line of their
+own.
+
+Classes:
+    Journal: Appends change records to a log file and replays them.
+"""
+
+import json
+import os
+from models.engine.durability import Durability
+
+
+class Journal:
+    """
+    Append-only log of storage changes.
+
+    Attributes:
+        path (str): The path to the log file.
+        records (int): The number of records currently in the log.
+        durability (Durability): The fsync policy of the appends.
+        __checked (set): The log paths already cleared of a torn tail.
+    """
+
+    def __init__(self, path, durability=None):
+        """
+        Initializes a journal backed by the file at `path`.
+
+        Args:
+            path (str): The path to the log file. The file is created
+                        on the first append.
+            durability (Durability): The fsync policy of the appends.
+                                     Defaults to never flushing.
+        """
+        self.path = path
+        self.durability = durability or Durability('never')
+        self.rotated_path = path + '.1'
+        self.records = 0
+        self.__checked = set()
+
+    def __cut_torn_tail(self, path):
+        """
+        Truncates a log after its last complete line, once per path.
+
+        Args:
+            path (str): The path of the log file.
+        """
+        if path in self.__checked:
+            return
+        self.__checked.add(path)
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            return
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(pos - 4096, 0)
+                f.seek(start)
+                newline = f.read(pos - start).rfind(b'\n')
+                if newline != -1:
+                    pos = start + newline + 1
+                    break
+                pos = start
+            if pos == end:
+                return
+            f.truncate(pos)
+        self.durability.written(path)
+
+    def append(self, op, key, value=None):
+        """
+        Appends one change record to the log.
+
+        Args:
+            op (str): Either "new" (object created or updated)
+                      or "delete" (object removed).
+            key (str): The storage key in the format "ClassName.id".
+            value (dict): The dictionary representation of the object,
+                          required when op is "new".
+        """
+        self.extend([(op, key, value)])
+
+    def extend(self, records):
+        """
+        Appends a batch of change records to the log with a single write.
+
+        Args:
+            records (list): (op, key, value) tuples as taken by append().
+        """
+        if not records:
+            return
+        self.__cut_torn_tail(self.path)
+        lines = []
+        for op, key, value in records:
+            record = {'op': op, 'key': key}
+            if op == 'new':
+                record['value'] = value
+            lines.append(json.dumps(record) + '\n')
+        self.durability.append(self.path, ''.join(lines))
+        self.records += len(lines)
+
+    def rotate(self):
+        """
+        Moves the current log aside to the rotated path and starts an
+        empty log. Records of an earlier rotated log that was never
+        discarded are kept in front of the moved ones.
+        """
+        if os.path.exists(self.rotated_path):
+            self.__cut_torn_tail(self.rotated_path)
+            self.__cut_torn_tail(self.path)
+            with open(self.rotated_path, 'a', encoding="UTF-8") as dst:
+                try:
+                    with open(self.path, 'r', encoding="UTF-8") as src:
+                        for line in src:
+                            dst.write(line)
+                except FileNotFoundError:
+                    pass
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        elif os.path.exists(self.path):
+            self.__cut_torn_tail(self.path)
+            os.replace(self.path, self.rotated_path)
+            self.__checked.add(self.rotated_path)
+        self.durability.written(os.path.dirname(self.path) or '.')
+        self.__checked.discard(self.path)
+        self.records = 0
+
+    def discard_rotated(self):
+        """
+        Removes the rotated log once its records are part of a snapshot.
+        """
+        try:
+            os.remove(self.rotated_path)
+        except FileNotFoundError:
+            pass
+        self.__checked.discard(self.rotated_path)
+
+    def replay(self):
+        """
+        Reads the rotated log, if any, then the current log from the
+        beginning and yields their records in order.
+
+        A truncated or unreadable line, such as the last line of a write
+        interrupted by a crash, is skipped, and a torn last line is cut
+        off once the log is read.
+
+        Yields:
+            tuple: (op, key, value) for each record, where value is None
+                   for "delete" records.
+        """
+        self.records = 0
+        for path in (self.rotated_path, self.path):
+            try:
+                with open(path, 'r', encoding="UTF-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.decoder.JSONDecodeError:
+                            continue
+                        self.records += 1
+                        yield record['op'], record['key'], record.get('value')
+            except FileNotFoundError:
+                continue
+            self.__cut_torn_tail(path)
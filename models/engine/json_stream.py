@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+"""
+This module reads the members of a JSON object one at a time from a
+file, so that FileStorage can load a file far larger than the memory it
+would take as a whole.
+
+The file is read in chunks, and each value is decoded with
+json.JSONDecoder.raw_decode() as soon as the chunks read hold all of
+it. Only the unread part of the last chunk and the value being decoded
+are kept, so the memory used is about the size of the largest value
+plus one chunk.
+
+    with open('file.json', 'r', encoding="UTF-8") as f:
+        for key, value in iter_items(f):
+            ...
+
+Classes:
+    Reader: Chunked reader decoding JSON tokens from a file.
+
+Functions:
+    iter_items: Yields the members of the JSON object of a file.
+"""
+
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_TAIL = re.compile(r'[-+.0-9eE]*')
+DECODER = json.JSONDecoder()
+
+
+class Reader:
+    """
+    Chunked reader decoding JSON tokens from a text file.
+
+    Attributes:
+        __file: The text file.
+        __chunk_size (int): The number of characters read at least at a
+                            time.
+        __buffer (str): The text read and not consumed yet, from __pos.
+        __pos (int): The position of the next character in __buffer.
+        __eof (bool): Whether the end of the file was reached.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        """
+        Initializes a reader at the start of a file.
+
+        Args:
+            f: The text file.
+            chunk_size (int): The number of characters read at least at
+                              a time.
+        """
+        self.__file = f
+        self.__chunk_size = chunk_size
+        self.__buffer = ''
+        self.__pos = 0
+        self.__eof = False
+
+    def __more(self):
+        """
+        Reads another chunk, dropping the consumed text. A chunk is at
+        least as long as the unconsumed text, so a value spanning many
+        chunks is decoded a logarithmic number of times.
+
+        Returns:
+            bool: False if the end of the file was reached.
+        """
+        if self.__eof:
+            return False
+        rest = self.__buffer[self.__pos:]
+        chunk = self.__file.read(max(self.__chunk_size, len(rest)))
+        if not chunk:
+            self.__eof = True
+            return False
+        self.__buffer = rest + chunk
+        self.__pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character without
+        consuming it.
+
+        Returns:
+            str: The next character, or None at the end of the file.
+        """
+        while True:
+            self.__pos = WHITESPACE.match(self.__buffer, self.__pos).end()
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+            if not self.__more():
+                return None
+
+    def expect(self, char):
+        """
+        Skips whitespace and consumes a character.
+
+        Args:
+            char (str): The expected character.
+
+        Raises:
+            json.JSONDecodeError: If the next character is another one.
+        """
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.__buffer,
+                                       self.__pos)
+        self.__pos += 1
+
+    def decode(self):
+        """
+        Skips whitespace and decodes the next JSON value, reading more
+        chunks until they hold all of it. A value followed by nothing but
+        characters of a number is only accepted at the end of the file,
+        since "1" may be the start of "1e-07" cut by the chunk.
+
+        Returns:
+            The decoded value.
+
+        Raises:
+            json.JSONDecodeError: If the value is not valid JSON.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.__buffer, self.__pos)
+            except json.JSONDecodeError:
+                if self.__more():
+                    continue
+                raise
+            tail = NUMBER_TAIL.match(self.__buffer, end).end()
+            if tail < len(self.__buffer) or not self.__more():
+                self.__pos = end
+                return value
+
+
+def iter_items(f, chunk_size=CHUNK_SIZE):
+    """
+    Yields the members of the JSON object a text file holds, decoding
+    each value once it has been read. An empty file holds no member.
+
+    Args:
+        f: The text file.
+        chunk_size (int): The number of characters read at least at a
+                          time.
+
+    Yields:
+        tuple: The key and the decoded value of each member, in order.
+
+    Raises:
+        json.JSONDecodeError: If the file is not a valid JSON object. The
+                              members before the error are yielded first.
+    """
+    reader = Reader(f, chunk_size)
+    if reader.peek() is None:
+        return
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            key = reader.decode()
+            if type(key) is not str:
+                raise json.JSONDecodeError("Expecting property name",
+                                           str(key), 0)
+            reader.expect(':')
+            yield key, reader.decode()
+            if reader.peek() != ',':
+                reader.expect('}')
+                break
+            reader.expect(',')
+    if reader.peek() is not None:
+        raise json.JSONDecodeError("Extra data", reader.peek(), 0)
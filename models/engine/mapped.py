@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+"""
+This module defines the offset index FileStorage writes next to a JSON
+file in lazy mode, and the MappedRecord class that reads one object of
+the file through a memory map.
+
+The index of "file.json" is "file.json.idx", a JSON document holding
+the size, modification time and format of the file it describes and,
+for each "ClassName.id" key, the byte range of the object in the file.
+Opening a store then costs reading the index; an object is only parsed
+when it is first read. An index whose size or modification time no
+longer matches its file, or whose format is not the one expected, is
+ignored, and the file is read as a whole instead.
+
+Classes:
+    MappedRecord: One object of a memory-mapped JSON file.
+
+Functions:
+    index_path: Returns the path of the index of a file.
+    write_index: Writes the index of a file.
+    remove_index: Removes the index of a file.
+    map_file: Maps a file and returns the objects listed in its index.
+"""
+
+import json
+import mmap
+import os
+
+
+class MappedRecord:
+    """
+    One object of a memory-mapped JSON file, not parsed yet.
+
+    Attributes:
+        source (mmap): The mapped file.
+        start (int): The offset of the first byte of the object.
+        end (int): The offset after the last byte of the object.
+        decode (callable): Decodes the bytes of the object.
+    """
+
+    __slots__ = ('source', 'start', 'end', 'decode')
+
+    def __init__(self, source, start, end, decode=json.loads):
+        """
+        Initializes a record.
+
+        Args:
+            source (mmap): The mapped file.
+            start (int): The offset of the first byte of the object.
+            end (int): The offset after the last byte of the object.
+            decode (callable): Decodes the bytes of the object.
+        """
+        self.source = source
+        self.start = start
+        self.end = end
+        self.decode = decode
+
+    def raw(self):
+        """
+        Returns the encoded object, as written in the file.
+
+        Returns:
+            bytes: The bytes of the object.
+        """
+        return self.source[self.start:self.end]
+
+    def load(self):
+        """
+        Parses the object.
+
+        Returns:
+            dict: The dictionary representation of the object.
+        """
+        return self.decode(self.source[self.start:self.end])
+
+
+def index_path(path):
+    """
+    Returns the path of the index of a file.
+
+    Args:
+        path (str): The path of the JSON file.
+    """
+    return path + '.idx'
+
+
+def write_index(path, offsets, format='pretty'):
+    """
+    Writes the index of a file that was just written.
+
+    Args:
+        path (str): The path of the JSON file.
+        offsets (dict): The (start, end) byte range of each object,
+                        keyed by "ClassName.id".
+        format (str): The name of the serializer of the file.
+    """
+    stat = os.stat(path)
+    tmp_path = index_path(path) + '.tmp'
+    with open(tmp_path, 'w', encoding="UTF-8") as f:
+        json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                   'format': format, 'offsets': offsets},
+                  f, separators=(',', ':'))
+    os.replace(tmp_path, index_path(path))
+
+
+def remove_index(path):
+    """
+    Removes the index of a file, if there is one.
+
+    Args:
+        path (str): The path of the JSON file.
+    """
+    try:
+        os.remove(index_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def map_file(path, serializer=None):
+    """
+    Maps a JSON file in memory and returns its objects as listed in its
+    index, without parsing them.
+
+    Args:
+        path (str): The path of the JSON file.
+        serializer (Serializer): The serializer the file must have been
+                                 written with. Defaults to indented JSON.
+
+    Returns:
+        dict: The MappedRecord of each "ClassName.id" key, or None when
+              the file has no index matching its size, modification time
+              and format.
+    """
+    name = 'pretty' if serializer is None else serializer.name
+    decode = json.loads if serializer is None else serializer.decode
+    try:
+        with open(index_path(path), 'r', encoding="UTF-8") as f:
+            index = json.load(f)
+        f = open(path, 'rb')
+    except (FileNotFoundError, ValueError):
+        return None
+    with f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size != index.get('size') or \
+                stat.st_mtime_ns != index.get('mtime_ns') or \
+                index.get('format', 'pretty') != name:
+            return None
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return {key: MappedRecord(source, start, end, decode)
+            for key, (start, end) in index['offsets'].items()}
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+This module defines the Query class, a chainable description of a query
+on the objects of one class that a storage engine runs.
+
+A query is built with storage.query(cls) and refined with where(),
+order_by(), offset() and limit(), each returning a new query:
+
+    storage.query(Place).where(city_id=city.id,
+                               price_by_night__lt=100) \\
+        .order_by('-max_guest').limit(10).all()
+
+Conditions are given as keyword arguments named after an attribute,
+optionally followed by two underscores and one of the OPERATORS, for
+example `price_by_night__lt`. Without an operator the attribute must
+equal the value. The storage engine decides how to run the query: it
+drives it from the most selective index, or a SQL condition, and checks
+the remaining conditions on the candidates.
+
+Classes:
+    Query: A query on the objects of one class.
+"""
+
+
+def _compare(test):
+    """
+    Wraps a comparison so that values that cannot be compared make it
+    false instead of raising TypeError.
+
+    Args:
+        test (callable): Takes the attribute value and the operand.
+
+    Returns:
+        callable: The wrapped comparison.
+    """
+    def compare(value, operand):
+        try:
+            return bool(test(value, operand))
+        except TypeError:
+            return False
+    return compare
+
+
+OPERATORS = {
+    'eq': _compare(lambda value, operand: value == operand),
+    'ne': _compare(lambda value, operand: value != operand),
+    'lt': _compare(lambda value, operand: value < operand),
+    'le': _compare(lambda value, operand: value <= operand),
+    'gt': _compare(lambda value, operand: value > operand),
+    'ge': _compare(lambda value, operand: value >= operand),
+    'in': _compare(lambda value, operand: value in operand),
+    'contains': _compare(lambda value, operand:
+                         type(value) is list and operand in value),
+}
+
+
+class Query:
+    """
+    A query on the objects of one class: conditions, an order and a
+    page. Queries are immutable; each refining method returns a copy.
+
+    Attributes:
+        cls (str): The name of the queried class.
+        conditions (tuple): (attribute, operator, operand) triples that
+                            every result satisfies.
+        order (tuple): (attribute, descending) to sort the results by,
+                       or None for the order chosen by the storage.
+        start (int): The number of results to skip.
+        size (int): The maximum number of results, or None.
+        __storage: The storage engine that runs the query.
+    """
+
+    def __init__(self, storage, cls):
+        """
+        Initializes a query for every object of a class.
+
+        Args:
+            storage: The storage engine that runs the query.
+            cls (type or str): The model class or its name.
+        """
+        self.__storage = storage
+        self.cls = cls if isinstance(cls, str) else cls.__name__
+        self.conditions = ()
+        self.order = None
+        self.start = 0
+        self.size = None
+
+    def __copy(self, **changes):
+        """
+        Returns a copy of the query with some attributes changed.
+
+        Args:
+            **changes: The new values of the attributes.
+        """
+        query = Query(self.__storage, self.cls)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        return query
+
+    def where(self, **conditions):
+        """
+        Adds conditions that every result must satisfy.
+
+        Args:
+            **conditions: The operands, keyed by attribute name optionally
+                          followed by "__" and an operator name.
+
+        Returns:
+            Query: The refined query.
+
+        Raises:
+            ValueError: If an operator is not one of the OPERATORS.
+        """
+        added = []
+        for name, operand in conditions.items():
+            attr, _, op = name.rpartition('__')
+            if not attr:
+                attr, op = name, 'eq'
+            if op not in OPERATORS:
+                raise ValueError(f"unknown operator: {op}")
+            added.append((attr, op, operand))
+        return self.__copy(conditions=self.conditions + tuple(added))
+
+    def order_by(self, attr):
+        """
+        Sorts the results by an attribute: numbers first in increasing
+        order, then the other values ordered by their text.
+
+        Args:
+            attr (str): The attribute name, prefixed by "-" for the
+                        decreasing order.
+
+        Returns:
+            Query: The refined query.
+        """
+        if attr.startswith('-'):
+            return self.__copy(order=(attr[1:], True))
+        return self.__copy(order=(attr, False))
+
+    def offset(self, n):
+        """
+        Skips the first results.
+
+        Args:
+            n (int): The number of results to skip.
+
+        Returns:
+            Query: The refined query.
+        """
+        return self.__copy(start=n)
+
+    def limit(self, n):
+        """
+        Keeps at most a number of results.
+
+        Args:
+            n (int): The maximum number of results.
+
+        Returns:
+            Query: The refined query.
+        """
+        return self.__copy(size=n)
+
+    def accepts(self, value_of):
+        """
+        Tells whether an object satisfies every condition.
+
+        Args:
+            value_of (callable): Returns the value of an attribute of the
+                                 object, given the attribute name.
+
+        Returns:
+            bool: True if every condition holds.
+        """
+        return all(OPERATORS[op](value_of(attr), operand)
+                   for attr, op, operand in self.conditions)
+
+    def all(self):
+        """
+        Runs the query.
+
+        Returns:
+            list: The matching instances.
+        """
+        return self.__storage.select(self)
+
+    def __iter__(self):
+        """Runs the query and iterates over the matching instances."""
+        return iter(self.all())
+
+    def first(self):
+        """
+        Runs the query for its first result.
+
+        Returns:
+            BaseModel: The first matching instance, or None.
+        """
+        found = self.limit(1).all()
+        return found[0] if found else None
+
+    def count(self):
+        """
+        Counts the matching objects, ignoring the order and the page.
+
+        Returns:
+            int: The number of matching objects.
+        """
+        return len(self.__copy(order=None, start=0, size=None).all())
+
+    def explain(self):
+        """
+        Describes how the storage runs the query.
+
+        Returns:
+            str: The plan chosen by the storage engine.
+        """
+        return self.__storage.explain(self)
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+"""
+This module defines the framing of the 'records' file format, in which
+each object is a self-checking record, and the Scanner reading such a
+file back while skipping over damaged records.
+
+A file starts with MAGIC, followed by one record per object:
+
+    marker      4 bytes, MARKER
+    key size    4 bytes, unsigned little-endian
+    value size  4 bytes, unsigned little-endian
+    checksum    4 bytes, CRC-32 of the two sizes, the key and the value
+    key         the "ClassName.id" key in ASCII
+    value       the object encoded as compact ASCII JSON
+
+The marker holds bytes that never appear in ASCII, so it can only be
+found inside a record within its sizes or checksum. When a record does
+not start with the marker, claims an impossible size or fails its
+checksum, the scanner searches the next marker from the byte after its
+start and carries on from there, so one pass over the file recovers
+every intact record and reports the byte ranges it had to skip.
+
+Classes:
+    Scanner: Reads the intact records of a file and notes the damage.
+
+Functions:
+    frame: Builds the record of an object.
+"""
+
+import struct
+import zlib
+
+MAGIC = b'HBNB\x02'
+MARKER = b'\xffHBR'
+HEADER = struct.Struct('<4sIII')
+SIZES = struct.Struct('<II')
+MAX_KEY_SIZE = 1 << 10
+MAX_VALUE_SIZE = 1 << 26
+CHUNK_SIZE = 1 << 16
+
+
+def frame(key, encoded):
+    """
+    Builds the record of an object.
+
+    Args:
+        key (bytes): The "ClassName.id" key of the object.
+        encoded (bytes): The encoded object.
+
+    Returns:
+        bytes: The record, ending with the encoded object.
+    """
+    sizes = SIZES.pack(len(key), len(encoded))
+    checksum = zlib.crc32(encoded, zlib.crc32(key, zlib.crc32(sizes)))
+    return MARKER + sizes + struct.pack('<I', checksum) + key + encoded
+
+
+class Scanner:
+    """
+    Reads the intact records of a file in one pass, resuming past the
+    damaged ones.
+
+    Attributes:
+        records (int): The number of intact records read so far.
+        damaged (list): The [start, end) byte ranges skipped so far.
+        size (int): The number of bytes read so far.
+        __file: The binary file, at the start of the document.
+        __chunk_size (int): The number of bytes read at least at a time.
+        __buffer (bytes): The bytes read and not consumed yet, from
+                          __pos.
+        __base (int): The offset in the file of the start of __buffer.
+        __pos (int): The position of the next byte in __buffer.
+        __eof (bool): Whether the end of the file was reached.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        """
+        Initializes a scanner at the start of a file.
+
+        Args:
+            f: The binary file.
+            chunk_size (int): The number of bytes read at least at a time.
+        """
+        self.records = 0
+        self.damaged = []
+        self.size = 0
+        self.__file = f
+        self.__chunk_size = chunk_size
+        self.__buffer = b''
+        self.__base = 0
+        self.__pos = 0
+        self.__eof = False
+
+    @property
+    def lost(self):
+        """The number of bytes skipped so far."""
+        return sum(end - start for start, end in self.damaged)
+
+    def __fill(self, size):
+        """
+        Reads chunks until `size` bytes are available from __pos or the
+        end of the file is reached, dropping the consumed bytes.
+
+        Args:
+            size (int): The number of bytes needed.
+
+        Returns:
+            int: The number of bytes available from __pos.
+        """
+        while len(self.__buffer) - self.__pos < size and not self.__eof:
+            chunk = self.__file.read(max(self.__chunk_size, size))
+            if not chunk:
+                self.__eof = True
+                break
+            self.size += len(chunk)
+            self.__base += self.__pos
+            self.__buffer = self.__buffer[self.__pos:] + chunk
+            self.__pos = 0
+        return len(self.__buffer) - self.__pos
+
+    def __damage(self, start, end):
+        """
+        Records a skipped byte range, merging it with the previous one
+        when they touch.
+
+        Args:
+            start (int): The offset of the first byte skipped.
+            end (int): The offset after the last byte skipped.
+        """
+        if self.damaged and self.damaged[-1][1] == start:
+            self.damaged[-1][1] = end
+        else:
+            self.damaged.append([start, end])
+
+    def __resync(self):
+        """
+        Skips to the next marker after the current position, or to the
+        end of the file when there is none, and records the bytes
+        skipped.
+        """
+        start = self.__base + self.__pos
+        while True:
+            found = self.__buffer.find(MARKER, self.__pos + 1)
+            if found != -1:
+                self.__pos = found
+                break
+            self.__pos = max(self.__pos + 1,
+                             len(self.__buffer) - len(MARKER) + 1)
+            if self.__fill(len(MARKER)) < len(MARKER):
+                self.__pos = len(self.__buffer)
+                break
+            self.__pos -= 1
+        self.__damage(start, self.__base + self.__pos)
+
+    def __iter__(self):
+        """
+        Yields the intact records in order.
+
+        Yields:
+            tuple: The key as a str and the encoded value as bytes of
+                   each intact record.
+        """
+        if self.__fill(len(MAGIC)) and \
+                self.__buffer[:len(MAGIC)] == MAGIC:
+            self.__pos = len(MAGIC)
+        elif self.__buffer:
+            self.__resync()
+        while True:
+            available = self.__fill(HEADER.size)
+            if not available:
+                return
+            if available < HEADER.size:
+                self.__resync()
+                continue
+            marker, key_size, value_size, checksum = HEADER.unpack_from(
+                self.__buffer, self.__pos)
+            end = HEADER.size + key_size + value_size
+            if marker != MARKER or key_size > MAX_KEY_SIZE or \
+                    value_size > MAX_VALUE_SIZE or self.__fill(end) < end:
+                self.__resync()
+                continue
+            start = self.__pos + HEADER.size
+            key = self.__buffer[start:start + key_size]
+            value = self.__buffer[start + key_size:self.__pos + end]
+            crc = zlib.crc32(self.__buffer[self.__pos + 4:self.__pos + 12])
+            if zlib.crc32(value, zlib.crc32(key, crc)) != checksum:
+                self.__resync()
+                continue
+            try:
+                key = key.decode('ascii')
+            except UnicodeDecodeError:
+                self.__resync()
+                continue
+            self.__pos += end
+            self.records += 1
+            yield key, value
@@ -0,0 +1,629 @@
+#!/usr/bin/python3
+"""
+This module defines the file formats FileStorage can write its objects
+in, the optional compression of the files, a converter between formats
+and a benchmark of their trade-offs.
+
+Every format writes a document made of a header, one fragment per
+object and a footer, the fragments being separated by a separator. A
+fragment ends with the encoded object, so FileStorage can cache the
+fragment of each clean object between saves and record the byte range
+of each object for the offset index of lazy mode.
+
+Formats:
+    pretty: JSON indented by two spaces, as json.dump(indent=2) writes
+            it. The default, and the format of older files.
+    compact: JSON without whitespace.
+    marshal: A binary header followed by one record per object: the
+             lengths of the key and of the value packed with struct,
+             the key in UTF-8 and the value encoded with marshal. marshal
+             is only meant for files written by the same Python version,
+             and must not read files from untrusted sources.
+    records: A binary header followed by one record per object, framed
+             by a marker, the lengths and a CRC-32 checksum, holding the
+             key and the object in compact JSON. A damaged record is
+             skipped and reading resumes at the next intact one, as
+             described in models.engine.records.
+
+Any format can be compressed with gzip or lzma. A compressed file cannot
+be mapped, so lazy mode reads it whole. Reading a file detects its
+format and compression from its first bytes, so a storage reads the
+files written in any format and writes them back in its own. A damaged
+JSON or marshal file cannot be read past the damage, and neither can a
+compressed one; a damaged records file loses the damaged records only.
+
+The converter and the benchmark are run from the command line with
+models.engine.formats.
+
+Classes:
+    CorruptFileError: Raised when a file cannot be read.
+    DamagedRecordsWarning: Warns that damaged records were skipped.
+    Serializer: The framing common to every format.
+    PrettyJSON: Indented JSON.
+    CompactJSON: JSON without whitespace.
+    MarshalRecords: Length-prefixed marshal records.
+    ChecksummedRecords: Checksummed records that survive damage.
+
+Functions:
+    get_serializer: Returns the serializer of a format and compression.
+    open_document: Opens a file and detects its format and compression.
+    load_items: Yields the objects of a file, whatever its format.
+    check_file: Reads a whole file and reports what could be recovered.
+    convert: Rewrites a file in another format.
+    benchmark: Measures the size and speed of every format.
+"""
+
+import gzip
+import io
+import json
+import lzma
+import marshal
+import os
+import struct
+import time
+import warnings
+import zlib
+from contextlib import contextmanager
+from models.engine import records
+from models.engine.durability import Durability
+from models.engine.json_stream import iter_items
+
+MAGIC = b'HBNB\x01'
+LENGTHS = struct.Struct('<II')
+COMPRESSIONS = {'gzip': gzip, 'lzma': lzma}
+COMPRESSED_MAGICS = {b'\x1f\x8b': gzip, b'\xfd7zXZ': lzma}
+JSON_STARTS = b'{ \t\r\n'
+READ_ERRORS = (ValueError, EOFError, OSError, lzma.LZMAError, zlib.error)
+
+
+class CorruptFileError(ValueError):
+    """
+    Raised when a storage file is not a valid document of any format,
+    for example when it was truncated by a crash.
+
+    Attributes:
+        path (str): The path of the file.
+    """
+
+    def __init__(self, path, reason):
+        """
+        Initializes the error.
+
+        Args:
+            path (str): The path of the file.
+            reason: What is wrong with the file.
+        """
+        super().__init__(f"{path}: corrupt storage file: {reason}")
+        self.path = path
+
+
+class DamagedRecordsWarning(UserWarning):
+    """
+    Warns that a records file was read past damaged records, which were
+    skipped.
+    """
+
+
+class Serializer:
+    """
+    The framing common to every format: a document is the header, the
+    fragments joined by the separator, and the footer, or the empty
+    document when there is no object.
+
+    Attributes:
+        name (str): The name of the format.
+        header (bytes): The bytes before the first fragment.
+        separator (bytes): The bytes between two fragments.
+        footer (bytes): The bytes after the last fragment.
+        empty (bytes): The document holding no object.
+        compression (str): 'gzip', 'lzma' or None.
+    """
+
+    name = None
+    header = b''
+    separator = b''
+    footer = b''
+    empty = b''
+
+    def __init__(self, compression=None):
+        """
+        Initializes a serializer.
+
+        Args:
+            compression (str): 'gzip', 'lzma' or None.
+
+        Raises:
+            ValueError: If the compression is unknown.
+        """
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression: {compression}")
+        self.compression = compression
+
+    @property
+    def mappable(self):
+        """Whether the byte ranges of the objects hold in the file."""
+        return self.compression is None
+
+    def encode(self, record):
+        """
+        Encodes the dictionary representation of an object.
+
+        Args:
+            record (dict): The dictionary representation.
+
+        Returns:
+            bytes: The encoded object.
+        """
+        raise NotImplementedError
+
+    def decode(self, data):
+        """
+        Decodes an object encoded by encode().
+
+        Args:
+            data (bytes): The encoded object.
+
+        Returns:
+            dict: The dictionary representation.
+        """
+        raise NotImplementedError
+
+    def frame(self, key, encoded):
+        """
+        Builds the fragment of an object, ending with the encoded object.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            encoded (bytes): The encoded object.
+
+        Returns:
+            bytes: The fragment.
+        """
+        raise NotImplementedError
+
+    def read(self, f):
+        """
+        Yields the objects of an uncompressed document.
+
+        Args:
+            f: The binary file, at the start of the document.
+
+        Yields:
+            tuple: The key and the dictionary of each object.
+
+        Returns:
+            Scanner: The scanner that read a records document, holding
+                     the damage it skipped, or None for other formats.
+
+        Raises:
+            ValueError: If the document is not valid.
+        """
+        raise NotImplementedError
+
+    def fragment(self, key, record):
+        """
+        Encodes an object into its fragment.
+
+        Args:
+            key (str): The "ClassName.id" key of the object.
+            record (dict): The dictionary representation of the object.
+
+        Returns:
+            tuple: The fragment and the length of the encoded object at
+                   its end.
+        """
+        encoded = self.encode(record)
+        return self.frame(key, encoded), len(encoded)
+
+    def join(self, keys, fragments):
+        """
+        Joins fragments into a document and computes the byte range of
+        each encoded object in it.
+
+        Args:
+            keys (list): The "ClassName.id" keys of the objects.
+            fragments (list): The fragment of each object, as returned by
+                              fragment().
+
+        Returns:
+            tuple: The uncompressed document and the [start, end] range
+                   of each encoded object, keyed by "ClassName.id".
+        """
+        if not fragments:
+            return self.empty, {}
+        offsets = {}
+        position = len(self.header)
+        for key, (fragment, size) in zip(keys, fragments):
+            end = position + len(fragment)
+            offsets[key] = [end - size, end]
+            position = end + len(self.separator)
+        body = self.separator.join(fragment for fragment, size in fragments)
+        return self.header + body + self.footer, offsets
+
+    def pack(self, document):
+        """
+        Compresses a document, if the serializer compresses.
+
+        Args:
+            document (bytes): The uncompressed document.
+
+        Returns:
+            bytes: The bytes to write to the file.
+        """
+        if self.compression is None:
+            return document
+        return COMPRESSIONS[self.compression].compress(document)
+
+    def dump(self, items, path):
+        """
+        Writes objects to a file one at a time, without building the
+        document in memory.
+
+        Args:
+            items (iterable): (key, dictionary) pairs of the objects.
+            path (str): The path of the file.
+        """
+        with open(path, 'wb') as f:
+            self.write(items, f)
+
+    def write(self, items, f):
+        """
+        Writes objects to an open binary file one at a time, compressing
+        them if needed.
+
+        Args:
+            items (iterable): (key, dictionary) pairs of the objects.
+            f: The binary file.
+        """
+        out = f if self.compression is None else \
+            COMPRESSIONS[self.compression].open(f, 'wb')
+        first = True
+        for key, record in items:
+            out.write(self.header if first else self.separator)
+            out.write(self.fragment(key, record)[0])
+            first = False
+        out.write(self.empty if first else self.footer)
+        if out is not f:
+            out.close()
+
+
+class PrettyJSON(Serializer):
+    """JSON indented by two spaces, as json.dump(indent=2) writes it."""
+
+    name = 'pretty'
+    header = b'{\n'
+    separator = b',\n'
+    footer = b'\n}'
+    empty = b'{}'
+
+    def encode(self, record):
+        """Encodes an object as indented JSON, nested one level."""
+        return json.dumps(record, indent=2).replace('\n', '\n  ').encode()
+
+    def decode(self, data):
+        """Decodes an object encoded as JSON."""
+        return json.loads(data)
+
+    def frame(self, key, encoded):
+        """Prefixes the object with its indented key."""
+        return b'  ' + json.dumps(key).encode() + b': ' + encoded
+
+    def read(self, f):
+        """Yields the members of the JSON object of the document."""
+        text = io.TextIOWrapper(f, encoding="UTF-8")
+        try:
+            yield from iter_items(text)
+        finally:
+            text.detach()
+
+
+class CompactJSON(PrettyJSON):
+    """JSON without whitespace."""
+
+    name = 'compact'
+    header = b'{'
+    separator = b','
+    footer = b'}'
+
+    def encode(self, record):
+        """Encodes an object as JSON without whitespace."""
+        return json.dumps(record, separators=(',', ':')).encode()
+
+    def frame(self, key, encoded):
+        """Prefixes the object with its key."""
+        return json.dumps(key).encode() + b':' + encoded
+
+
+class MarshalRecords(Serializer):
+    """
+    Length-prefixed records holding the objects encoded with marshal,
+    after a header identifying the format.
+    """
+
+    name = 'marshal'
+    header = MAGIC
+    empty = MAGIC
+
+    def encode(self, record):
+        """Encodes an object with marshal."""
+        return marshal.dumps(record)
+
+    def decode(self, data):
+        """Decodes an object encoded with marshal."""
+        return marshal.loads(data)
+
+    def frame(self, key, encoded):
+        """Prefixes the object with the lengths and the key."""
+        key = key.encode()
+        return LENGTHS.pack(len(key), len(encoded)) + key + encoded
+
+    def read(self, f):
+        """Yields the records of the document, checking their lengths."""
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a marshal document")
+        while True:
+            lengths = f.read(LENGTHS.size)
+            if not lengths:
+                return
+            if len(lengths) < LENGTHS.size:
+                raise ValueError("truncated record")
+            key_size, value_size = LENGTHS.unpack(lengths)
+            key = f.read(key_size)
+            value = f.read(value_size)
+            if len(key) < key_size or len(value) < value_size:
+                raise ValueError("truncated record")
+            try:
+                yield key.decode(), marshal.loads(value)
+            except (EOFError, TypeError) as e:
+                raise ValueError(f"invalid record: {e}") from e
+
+
+class ChecksummedRecords(Serializer):
+    """
+    Records framed by a marker, their lengths and a CRC-32 checksum,
+    holding the objects in compact JSON.
+    """
+
+    name = 'records'
+    header = records.MAGIC
+    empty = records.MAGIC
+
+    def encode(self, record):
+        """Encodes an object as compact ASCII JSON."""
+        return json.dumps(record, separators=(',', ':')).encode()
+
+    def decode(self, data):
+        """Decodes an object encoded as JSON."""
+        return json.loads(data)
+
+    def frame(self, key, encoded):
+        """Prefixes the object with its framing and key."""
+        return records.frame(key.encode('ascii'), encoded)
+
+    def read(self, f):
+        """Yields the intact records, skipping the damaged ones."""
+        scanner = records.Scanner(f)
+        for key, value in scanner:
+            yield key, json.loads(value)
+        return scanner
+
+
+SERIALIZERS = {cls.name: cls for cls in
+               (PrettyJSON, CompactJSON, MarshalRecords, ChecksummedRecords)}
+
+
+def get_serializer(name=None, compression=None):
+    """
+    Returns the serializer of a format and compression.
+
+    Args:
+        name (str): 'pretty', 'compact', 'marshal' or 'records'.
+                    Defaults to 'pretty'.
+        compression (str): 'gzip', 'lzma' or None.
+
+    Returns:
+        Serializer: The serializer.
+
+    Raises:
+        ValueError: If the format or the compression is unknown.
+    """
+    try:
+        cls = SERIALIZERS[name or 'pretty']
+    except KeyError:
+        raise ValueError(f"unknown format: {name}") from None
+    return cls(compression or None)
+
+
+@contextmanager
+def open_document(path):
+    """
+    Opens a file, decompressing it if needed, and detects its format
+    from its first bytes. A file that is neither JSON nor marshal is
+    read as records, whose scanner skips a damaged header.
+
+    Args:
+        path (str): The path of the file.
+
+    Yields:
+        tuple: The binary file, at the start of the uncompressed
+               document, and the serializer of its format and
+               compression.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        CorruptFileError: If the file is empty or cannot be decompressed.
+    """
+    with open(path, 'rb') as raw:
+        f = raw
+        compression = None
+        head = raw.peek(len(MAGIC))
+        if not head:
+            raise CorruptFileError(path, "empty file")
+        for magic, module in COMPRESSED_MAGICS.items():
+            if head.startswith(magic):
+                f = module.open(raw, 'rb')
+                compression = module.__name__
+        try:
+            try:
+                head = f.peek(len(MAGIC))[:len(MAGIC)]
+            except READ_ERRORS as e:
+                raise CorruptFileError(path, e) from e
+            if head == MAGIC:
+                cls = MarshalRecords
+            elif head[:2] == b'{"':
+                cls = CompactJSON
+            elif head[:1] and head[:1] in JSON_STARTS:
+                cls = PrettyJSON
+            else:
+                cls = ChecksummedRecords
+            yield f, cls(compression)
+        finally:
+            if f is not raw:
+                f.close()
+
+
+def load_items(path):
+    """
+    Yields the objects of a file one at a time, detecting its format and
+    compression from its first bytes. The damaged records of a records
+    file are skipped with a DamagedRecordsWarning.
+
+    Args:
+        path (str): The path of the file.
+
+    Yields:
+        tuple: The key and the dictionary of each object.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        CorruptFileError: If the file is empty or not valid, or if no
+                          intact record is left in a damaged records
+                          file. The objects before the error are yielded
+                          first.
+    """
+    with open_document(path) as (f, serializer):
+        try:
+            scanner = yield from serializer.read(f)
+        except READ_ERRORS as e:
+            raise CorruptFileError(path, e) from e
+    if scanner is not None and scanner.damaged:
+        if not scanner.records:
+            raise CorruptFileError(path, "no intact record")
+        warnings.warn(f"{path}: {scanner.lost} damaged bytes skipped, "
+                      f"{scanner.records} records recovered",
+                      DamagedRecordsWarning, stacklevel=2)
+
+
+def check_file(path):
+    """
+    Reads every object of a file, as reload() would, and reports what
+    could be recovered and how fast.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        dict: The 'path', 'format' and 'compression' of the file, its
+              'size' in bytes, the number of intact 'records', the
+              [start, end) byte ranges of the uncompressed document that
+              were 'damaged' and skipped, the number of bytes 'lost' in
+              them, the 'seconds' taken, and the 'error' that stopped
+              the reading, or None. The bytes lost after an error are
+              not known, and 'lost' is then None.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    report = {'path': path, 'format': None, 'compression': None,
+              'size': os.path.getsize(path), 'records': 0, 'damaged': [],
+              'lost': 0, 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    try:
+        with open_document(path) as (f, serializer):
+            report['format'] = serializer.name
+            report['compression'] = serializer.compression
+            items = serializer.read(f)
+            while True:
+                try:
+                    next(items)
+                except StopIteration as done:
+                    if done.value is not None:
+                        report['damaged'] = done.value.damaged
+                        report['lost'] = done.value.lost
+                    break
+                report['records'] += 1
+    except READ_ERRORS as e:
+        report['error'] = str(e)
+        report['lost'] = None
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def convert(source, target, name=None, compression=None):
+    """
+    Rewrites a file in another format, one object at a time. The target
+    is written to a temporary file that replaces it once the source has
+    been read whole, so the source may be the target itself, and a
+    conversion that fails leaves the target as it was.
+
+    Args:
+        source (str): The path of the file to read, in any format.
+        target (str): The path of the file to write.
+        name (str): The format to write.
+        compression (str): The compression to write, or None.
+
+    Returns:
+        int: The number of objects written.
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for item in load_items(source):
+            count += 1
+            yield item
+    serializer = get_serializer(name, compression)
+    Durability('always').replace(
+        target, lambda f: serializer.write(counted(), f))
+    return count
+
+
+def benchmark(records, repeat=3):
+    """
+    Measures the size of a document holding some objects and the time
+    taken to encode and decode it, for every format and compression.
+
+    Args:
+        records (dict): The dictionaries of the objects keyed by
+                        "ClassName.id".
+        repeat (int): The number of runs, the fastest being kept.
+
+    Returns:
+        list: For each format and compression, a dict with its 'format',
+              'compression', 'size' in bytes, and 'encode' and 'decode'
+              times in seconds.
+    """
+    keys = list(records)
+    results = []
+    for name in SERIALIZERS:
+        for compression in (None, 'gzip', 'lzma'):
+            serializer = get_serializer(name, compression)
+            encode = decode = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = serializer.pack(serializer.join(keys, [
+                    serializer.fragment(key, records[key])
+                    for key in keys])[0])
+                middle = time.perf_counter()
+                f = io.BytesIO(data)
+                if compression is not None:
+                    f = COMPRESSIONS[compression].open(f, 'rb')
+                for _ in serializer.read(f):
+                    pass
+                end = time.perf_counter()
+                encode = min(encode, middle - start)
+                decode = min(decode, end - middle)
+            results.append({'format': name, 'compression': compression,
+                            'size': len(data), 'encode': encode,
+                            'decode': decode})
+    return results
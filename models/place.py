@@ -28,6 +28,18 @@ class Place(BaseModel):
         latitude (float): Latitude coordinate of the place.
         longitude (float): Longitude coordinate of the place.
         amenity_ids (list): List of amenity IDs associated with the place.
+        _hash_indexes (tuple): Attributes indexed by the storage for
+                               equality lookups.
+        _range_indexes (tuple): Numeric attributes indexed by the storage
+                                for range queries.
+        _set_indexes (tuple): List attributes indexed by the storage for
+                              membership queries.
+        _geo_index (tuple): Latitude and longitude attributes indexed by
+                            the storage for distance queries.
+        _text_index (tuple): Text attributes indexed by the storage for
+                             keyword search.
+        _columns (tuple): Attributes the storage mirrors in columnar
+                          arrays for aggregates.
     """
 
     city_id = ""
@@ -40,3 +52,12 @@ class Place(BaseModel):
     latitude = 0.0
     longitude = 0.0
     amenity_ids = []
+
+    _hash_indexes = ('city_id',)
+    _range_indexes = ('price_by_night', 'max_guest',
+                      'number_rooms', 'number_bathrooms')
+    _set_indexes = ('amenity_ids',)
+    _geo_index = ('latitude', 'longitude')
+    _text_index = ('name', 'description')
+    _columns = ('city_id', 'number_rooms', 'number_bathrooms', 'max_guest',
+                'price_by_night', 'latitude', 'longitude')
@@ -24,8 +24,15 @@ class Review(BaseModel):
         user_id (str): The ID of the user who
         submitted the review. Defaults empty string.
         text (str): The content of the review. Defaults to an empty string.
+        _hash_indexes (tuple): Attributes indexed by the storage for
+                               equality lookups.
+        _text_index (tuple): Text attributes indexed by the storage for
+                             keyword search.
     """
 
     place_id = ""
     user_id = ""
     text = ""
+
+    _hash_indexes = ('place_id', 'user_id')
+    _text_index = ('text',)
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the commands of the console."""
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+import console
+from console import HBNBCommand
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+class TestConsole(unittest.TestCase):
+    """Test suite for the console commands."""
+
+    def setUp(self) -> None:
+        """Points the console at a journaled storage holding three
+        places."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.fs = FileStorage(self.path, journal=True)
+        patcher = patch.object(console, 'storage', self.fs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.places = []
+        for name, price, guests, lat in (("loft a)b", 80, 2, 48.85),
+                                         ("beach house", 150, 6, 48.86),
+                                         ("cabin", 60, 4, 40.71)):
+            place = Place()
+            place.name = name
+            place.price_by_night = price
+            place.max_guest = guests
+            place.latitude = lat
+            place.longitude = 2.35 if lat > 48 else -74.0
+            self.fs.new(place)
+            self.places.append(place)
+        self.fs.save()
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        self.fs.close()
+        shutil.rmtree(self.tmp)
+
+    def run_command(self, line):
+        """Runs a console command and returns what it printed."""
+        with redirect_stdout(io.StringIO()) as out:
+            HBNBCommand().onecmd(line)
+        return out.getvalue()
+
+    def testWhereChain(self):
+        """A where chain shows the matching instances in order."""
+        out = self.run_command(
+            'Place.where(price_by_night<100).order_by(-max_guest).limit(1)')
+        self.assertIn(self.places[2].id, out)
+        self.assertNotIn(self.places[0].id, out)
+        self.assertEqual(self.run_command(
+            'Place.where(price_by_night<100, max_guest>=2).count()'), "2\n")
+
+    def testQuotedParenthesis(self):
+        """Quoted values may hold parentheses and commas."""
+        out = self.run_command('Place.where(name="loft a)b")')
+        self.assertIn(self.places[0].id, out)
+        self.assertEqual(self.run_command(
+            'Place.where(name="loft a)b", max_guest=2).count()'), "1\n")
+        self.assertEqual(self.run_command(
+            "Place.where(name='a, (b').count()"), "0\n")
+
+    def testInvalidChain(self):
+        """Invalid chains print an error or are unknown syntax."""
+        self.assertEqual(self.run_command('Place.where(name).count()'),
+                         "** invalid condition **\n")
+        self.assertEqual(self.run_command('Place.limit(x)'),
+                         "** invalid number **\n")
+        for line in ('Place.where(name="a)', 'Place.drop()',
+                     'Nowhere.where(a=1)'):
+            self.assertIn("Unknown syntax", self.run_command(line))
+
+    def testCompact(self):
+        """compact folds the log into a fresh snapshot."""
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.run_command('compact'), "")
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.log'))
+
+    def testNearbyAndNearest(self):
+        """nearby and nearest show the instances closest to a point."""
+        out = self.run_command('nearby Place 48.85 2.35 5')
+        self.assertIn(self.places[0].id, out)
+        self.assertNotIn(self.places[2].id, out)
+        out = self.run_command('nearest Place 40.7 -74 1')
+        self.assertIn(self.places[2].id, out)
+        self.assertEqual(self.run_command('nearest Place 40.7 -74 1.5'),
+                         "** invalid number **\n")
+        for line in ('nearest Place 40.7 -74 -1', 'nearby Place 0 0 -5'):
+            self.assertEqual(self.run_command(line),
+                             "** invalid number **\n")
+
+    def testSearch(self):
+        """search shows the instances matching the words."""
+        out = self.run_command('search Place beach')
+        self.assertIn(self.places[1].id, out)
+        self.assertNotIn(self.places[0].id, out)
+        self.assertEqual(self.run_command('search Place'),
+                         "** query missing **\n")
+
+    def testCount(self):
+        """count shows the number of instances of a class."""
+        self.assertEqual(self.run_command('count Place'), "3\n")
+        self.assertEqual(self.run_command('count'),
+                         "** class name missing **\n")
+        self.assertEqual(self.run_command('count Nowhere'),
+                         "** class doesn't exist **\n")
+
+    def testStats(self):
+        """stats shows the statistics of an attribute."""
+        out = self.run_command('stats Place price_by_night')
+        self.assertIn("'sum': 290", out)
+        self.assertIn("'count': 3", out)
+        self.assertIn("usage", self.run_command('stats Place max_guest of'))
+
+    def testFsck(self):
+        """fsck reports each storage file and the objects found."""
+        self.fs.compact()
+        out = self.run_command('fsck')
+        self.assertIn(f"{self.path}: pretty, 3 records", out)
+        self.assertIn("  ok", out)
+
+    def testTransaction(self):
+        """begin, commit and rollback group and undo changes."""
+        self.assertEqual(self.run_command('begin'), "")
+        self.assertEqual(self.run_command('begin'),
+                         "** transaction already open **\n")
+        self.run_command(f'destroy Place {self.places[0].id}')
+        self.assertEqual(self.run_command('count Place'), "2\n")
+        self.assertEqual(self.run_command('rollback'), "")
+        self.assertEqual(self.run_command('count Place'), "3\n")
+        self.run_command('begin')
+        self.run_command(f'destroy Place {self.places[0].id}')
+        self.assertEqual(self.run_command('commit'), "")
+        self.assertEqual(self.run_command('commit'),
+                         "** no transaction open **\n")
+        self.assertEqual(self.run_command('count Place'), "2\n")
+
+    def testCorruptStore(self):
+        """The console starts on an unreadable file and fsck reports it."""
+        with open(self.path, 'w', encoding="UTF-8") as f:
+            f.write('{"BaseModel.1": {"id": "1", "__cl')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        for name in list(env):
+            if name.startswith('HBNB_'):
+                del env[name]
+        result = subprocess.run(
+            [sys.executable, os.path.join(root, 'console.py')],
+            input="fsck\nquit\n", cwd=self.tmp, env=env,
+            capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("run fsck", result.stderr)
+        self.assertIn("unreadable after 0 records", result.stdout)
+
+    def testAllPagination(self):
+        """all prints one page with --limit and --offset."""
+        ids = [key.split('.', 1)[1] for key in self.fs.all(Place)]
+        out = self.run_command('all Place --limit 2')
+        self.assertEqual([i for i in ids if i in out], ids[:2])
+        out = self.run_command('all Place --offset=1 --limit=5')
+        self.assertEqual([i for i in ids if i in out], ids[1:])
+        self.assertEqual(self.run_command('all Place --offset 3'), "[]\n")
+        self.assertEqual(self.run_command('all --offset 10'), "[]\n")
+        for line in ('all Place --limit -1', 'all Place --offset x',
+                     'all Place --limit'):
+            self.assertEqual(self.run_command(line),
+                             "** invalid number **\n")
+        self.assertEqual(self.run_command('all Place Nowhere'),
+                         "** class doesn't exist **\n")
+
+    def testCreate(self):
+        """create stores a new instance and prints its id."""
+        out = self.run_command('create Place').strip()
+        self.assertIsInstance(self.fs.get(Place, out), Place)
+        self.assertEqual(self.run_command('create Nowhere'),
+                         "** class doesn't exist **\n")
+
+if __name__ == "__main__":
+    unittest.main()
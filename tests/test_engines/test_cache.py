@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the QueryCache class and the
+cached reads of FileStorage."""
+
+import unittest
+from models.engine.cache import QueryCache, cached, freeze
+from models.engine.query import Query
+
+
+class Reader:
+    """A storage stand-in counting the reads it computes."""
+
+    def __init__(self):
+        """Initializes an empty cache."""
+        self.cache = QueryCache(2)
+        self.reads = 0
+
+    @cached
+    def find(self, cls, **eq):
+        """Returns the arguments as a list."""
+        self.reads += 1
+        return [cls, eq]
+
+    @cached
+    def search(self, query, cls=None):
+        """Returns the arguments as a list."""
+        self.reads += 1
+        return [query, cls]
+
+
+class TestQueryCache(unittest.TestCase):
+    """Test suite for the QueryCache class."""
+
+    def setUp(self) -> None:
+        """Creates a reader with a cache of two results."""
+        self.reader = Reader()
+
+    def testHit(self):
+        """A repeated read is served from the cache as a copy."""
+        first = self.reader.find("Place", city_id="1")
+        first.append("changed")
+        self.assertEqual(self.reader.find("Place", city_id="1"),
+                         ["Place", {"city_id": "1"}])
+        self.assertEqual(self.reader.reads, 1)
+        self.assertEqual(self.reader.cache.hits, 1)
+
+    def testWriteVersion(self):
+        """A write to the class of a result makes it stale."""
+        self.reader.find("Place", city_id="1")
+        self.reader.search("beach", "Review")
+        self.reader.cache.bump("User")
+        self.reader.find("Place", city_id="1")
+        self.reader.search("beach", "Review")
+        self.assertEqual(self.reader.reads, 2)
+        self.reader.cache.bump("Review")
+        self.reader.find("Place", city_id="1")
+        self.reader.search("beach", "Review")
+        self.assertEqual(self.reader.reads, 3)
+
+    def testAllClasses(self):
+        """Results for every class are stale after any write."""
+        self.reader.search("beach")
+        self.reader.cache.bump("User")
+        self.reader.search("beach")
+        self.assertEqual(self.reader.reads, 2)
+
+    def testEviction(self):
+        """The least recently used result is dropped first."""
+        self.reader.find("Place", city_id="1")
+        self.reader.find("Place", city_id="2")
+        self.reader.find("Place", city_id="1")
+        self.reader.find("Place", city_id="3")
+        self.assertEqual(len(self.reader.cache), 2)
+        self.reader.find("Place", city_id="1")
+        self.assertEqual(self.reader.reads, 3)
+        self.reader.find("Place", city_id="2")
+        self.assertEqual(self.reader.reads, 4)
+
+    def testUnhashable(self):
+        """Reads with arguments that cannot be hashed are not cached."""
+        self.reader.find("Place", name=bytearray(b"Loft"))
+        self.reader.find("Place", name=bytearray(b"Loft"))
+        self.assertEqual(self.reader.reads, 2)
+        self.assertEqual(len(self.reader.cache), 0)
+
+    def testFreeze(self):
+        """Queries and containers become hashable keys."""
+        query = Query(None, "Place").where(max_guest__in=[1, 2]).limit(3)
+        self.assertEqual(freeze(query), freeze(
+            Query(None, "Place").where(max_guest__in=[1, 2]).limit(3)))
+        self.assertNotEqual(freeze(query), freeze(query.limit(4)))
+        self.assertEqual(freeze({"b": [1], "a": {2}}),
+                         (("a", frozenset({(int, 2)})),
+                          ("b", ((int, 1),))))
+
+    def testFreezeKeepsTypes(self):
+        """Equal values of different types make different keys."""
+        keys = {freeze(value) for value in (1, 1.0, True)}
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(freeze(Query), freeze("Query"))
+
+    def testResultsAreDeepCopies(self):
+        """Nested containers of a hit are new on every call."""
+        first = self.reader.find("Place", city_id="1")
+        first[1]["city_id"] = "changed"
+        self.assertEqual(self.reader.find("Place", city_id="1"),
+                         ["Place", {"city_id": "1"}])
+        self.assertIsNot(self.reader.find("Place", city_id="1")[1],
+                         self.reader.find("Place", city_id="1")[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
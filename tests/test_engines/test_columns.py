@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the ColumnStore class."""
+
+import unittest
+from models.engine.columns import ColumnStore, aggregate_objects
+from models.place import Place
+
+
+class TestColumnStore(unittest.TestCase):
+    """Test suite for the ColumnStore class."""
+
+    rows = {"a": ("sf", 100, 2), "b": ("sf", 300, 4), "c": ("la", 50, 1),
+            "d": ("la", "free", 3)}
+
+    def setUp(self) -> None:
+        """Creates a store mirroring a few places."""
+        self.store = ColumnStore('city_id', 'price_by_night', 'max_guest')
+        self.places = {}
+        for key, (city_id, price, guests) in self.rows.items():
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            place.max_guest = guests
+            self.places[key] = place
+            self.store.add(key, place)
+
+    def testAggregate(self):
+        """Statistics skip the values that are not numbers."""
+        self.assertEqual(self.store.aggregate('price_by_night'),
+                         {'count': 3, 'sum': 450, 'avg': 150.0,
+                          'min': 50, 'max': 300})
+        self.assertEqual(self.store.aggregate('max_guest')['sum'], 10)
+
+    def testAggregateBy(self):
+        """Statistics are computed for each value of another attribute."""
+        stats = self.store.aggregate('price_by_night', by='city_id')
+        self.assertEqual(stats, {'sf': {'count': 2, 'sum': 400,
+                                        'avg': 200.0, 'min': 100,
+                                        'max': 300},
+                                 'la': {'count': 1, 'sum': 50, 'avg': 50.0,
+                                        'min': 50, 'max': 50}})
+        stats = self.store.aggregate('price_by_night', by='max_guest')
+        self.assertEqual(sorted(stats), [1, 2, 4])
+
+    def testUpdateAndDiscard(self):
+        """Updated and removed rows are reflected in the statistics."""
+        self.places["d"].price_by_night = 70
+        self.store.add("d", self.places["d"])
+        self.store.discard("a")
+        self.store.discard("a")
+        stats = self.store.aggregate('price_by_night', by='city_id')
+        self.assertEqual(stats['la']['sum'], 120)
+        self.assertEqual(stats['sf']['count'], 1)
+        self.assertEqual(len(self.store), 3)
+
+    def testMatchesObjectScan(self):
+        """The column statistics equal those of a pass over the objects."""
+        del self.places["b"]
+        self.store.discard("b")
+        for by in (None, 'city_id', 'max_guest'):
+            self.assertEqual(
+                self.store.aggregate('price_by_night', by),
+                aggregate_objects(self.places.values(), 'price_by_night',
+                                  by, int))
+
+    def testObjectScanTypes(self):
+        """A pass over the objects gives the types the columns give."""
+        self.places["a"].price_by_night = 100.0
+        self.places["b"].latitude = 2
+        self.places["c"].latitude = 0.5
+        store = ColumnStore('price_by_night', 'latitude')
+        for key, place in self.places.items():
+            store.add(key, place)
+        for attr, kind in (('price_by_night', int), ('latitude', float)):
+            expected = store.aggregate(attr)
+            stats = aggregate_objects(self.places.values(), attr,
+                                      kind=kind)
+            self.assertEqual(stats, expected)
+            self.assertEqual({k: type(v) for k, v in stats.items()},
+                             {k: type(v) for k, v in expected.items()})
+
+    def testUnknownColumn(self):
+        """Attributes that are not numeric columns raise KeyError."""
+        with self.assertRaises(KeyError):
+            self.store.aggregate('latitude')
+        with self.assertRaises(KeyError):
+            self.store.aggregate('city_id')
+        self.assertEqual(ColumnStore('max_guest').aggregate('max_guest'),
+                         {'count': 0, 'sum': 0, 'avg': None, 'min': None,
+                          'max': None})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,334 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the DBStorage class."""
+
+import gc
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import weakref
+from models.engine.db_storage import DBStorage
+from models.city import City
+from models.place import Place
+from models.user import User
+
+
+class TestDBStorage(unittest.TestCase):
+    """Test suite for the SQLite storage engine."""
+
+    def setUp(self) -> None:
+        """Opens a storage on a temporary database."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'hbnb.db')
+        self.db = DBStorage(self.path)
+        self.db.reload()
+
+    def tearDown(self) -> None:
+        """Closes the storage and removes the temporary directory."""
+        self.db.close()
+        shutil.rmtree(self.tmp)
+
+    def testTablePerClass(self):
+        """Each model class gets its own table and foreign key indexes."""
+        conn = sqlite3.connect(self.path)
+        tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        indexes = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        self.assertTrue({'User', 'Place', 'Review'} <= tables)
+        self.assertTrue({'City_state_id', 'Review_place_id'} <= indexes)
+
+    def testNewSaveGet(self):
+        """Saved objects survive a new connection with their attributes."""
+        place = Place()
+        place.name = "Villa"
+        place.max_guest = 4
+        place.amenity_ids = ["a", "b"]
+        place.max_guest_note = "kids"
+        self.db.new(place)
+        self.db.save()
+
+        other = DBStorage(self.path)
+        other.reload()
+        obj = other.get(Place, place.id)
+        other.close()
+        self.assertIsInstance(obj, Place)
+        self.assertEqual(obj.to_dict(), place.to_dict())
+
+    def testMismatchedTypeRoundTrip(self):
+        """A value of another type than declared keeps its type."""
+        place = Place()
+        place.max_guest = "many"
+        self.db.new(place)
+        self.db.save()
+        other = DBStorage(self.path)
+        other.reload()
+        obj = other.get('Place', place.id)
+        other.close()
+        self.assertEqual(obj.max_guest, "many")
+
+    def testAllAndCount(self):
+        """all() and count() can be limited to one class."""
+        objs = [User(), City(), City()]
+        for obj in objs:
+            self.db.new(obj)
+        self.assertEqual(self.db.count(), 3)
+        self.assertEqual(self.db.count(City), 2)
+        self.assertEqual(set(self.db.all('City')),
+                         {f"City.{obj.id}" for obj in objs[1:]})
+
+    def testIdentityMap(self):
+        """Reading a loaded row returns the instance already in use."""
+        user = User()
+        self.db.new(user)
+        self.db.save()
+        self.assertIs(self.db.get(User, user.id), user)
+        self.assertIs(self.db.all(User)[f"User.{user.id}"], user)
+
+    def testFind(self):
+        """find() matches declared columns and other attributes."""
+        cities = [City(), City(), City()]
+        for city, state in zip(cities, ["CA", "CA", "NV"]):
+            city.state_id = state
+            self.db.new(city)
+        cities[0].zip = "93650"
+        self.db.new(cities[0])
+        self.assertEqual(set(self.db.find(City, state_id="CA")),
+                         {f"City.{c.id}" for c in cities[:2]})
+        self.assertEqual(list(self.db.find('City', state_id="CA",
+                                           zip="93650").values()),
+                         [cities[0]])
+
+    def testBetween(self):
+        """between() filters and orders numeric columns in SQL."""
+        places = []
+        for price, guests in [(60, 2), (100, 6), (50, 4), (130, 8), (90, 4)]:
+            place = Place()
+            place.price_by_night = price
+            place.max_guest = guests
+            self.db.new(place)
+            places.append(place)
+        found = self.db.between(Place, order_by='price_by_night',
+                                price_by_night=(50, 120),
+                                max_guest=(4, None))
+        self.assertEqual(list(found.values()),
+                         [places[2], places[4], places[1]])
+        found = self.db.between(Place, order_by='price_by_night',
+                                reverse=True, limit=1)
+        self.assertEqual(list(found.values()), [places[3]])
+
+    def testBetweenOrdersOtherValuesLast(self):
+        """Values that are not numbers are ordered after the numbers."""
+        for price in [5, 'cheap', 1, 8, 1]:
+            place = Place()
+            place.price_by_night = price
+            self.db.new(place)
+        found = self.db.between(Place, order_by='price_by_night', limit=4)
+        self.assertEqual([p.price_by_night for p in found.values()],
+                         [1, 1, 5, 8])
+        found = self.db.between(Place, order_by='price_by_night',
+                                reverse=True, limit=2)
+        self.assertEqual([p.price_by_night for p in found.values()],
+                         ['cheap', 8])
+        found = self.db.between(Place, order_by='price_by_night')
+        self.assertEqual([p.price_by_night for p in found.values()],
+                         [1, 1, 5, 8, 'cheap'])
+
+    def testNearby(self):
+        """nearby() answers radius and nearest neighbour queries."""
+        places = []
+        for lat, lon in [(37.77, -122.42), (37.80, -122.27), (34.05, -118.24)]:
+            place = Place()
+            place.latitude = lat
+            place.longitude = lon
+            self.db.new(place)
+            places.append(place)
+        found = self.db.nearby(Place, 37.78, -122.4, radius_km=20)
+        self.assertEqual([obj for distance, obj in found], places[:2])
+        found = self.db.nearby('Place', 34, -118, k=2)
+        self.assertEqual([obj for distance, obj in found],
+                         [places[2], places[1]])
+
+    def testHaving(self):
+        """having() matches the items of a list attribute."""
+        places = []
+        for amenity_ids in (["wifi", "pool"], ["wifi"], ["pool"]):
+            place = Place()
+            place.amenity_ids = amenity_ids
+            self.db.new(place)
+            places.append(place)
+        found = self.db.having(Place, 'amenity_ids',
+                                  all_of=["wifi", "pool"])
+        self.assertEqual(list(found.values()), places[:1])
+        found = self.db.having('Place', 'amenity_ids', any_of=["pool"])
+        self.assertEqual(sorted(found.values(), key=places.index),
+                         [places[0], places[2]])
+
+    def testAggregate(self):
+        """aggregate() computes statistics in SQL, skipping non-numbers."""
+        for city_id, price in (("sf", 100), ("sf", 300), ("la", 50),
+                               ("la", "free"), ("la", 12.5)):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            self.db.new(place)
+        self.db.new(Place())
+        stats = self.db.aggregate(Place, 'price_by_night', by='city_id')
+        self.assertEqual(stats['sf'], {'count': 2, 'sum': 400, 'avg': 200.0,
+                                       'min': 100, 'max': 300})
+        self.assertEqual(stats['la']['sum'], 62.5)
+        self.assertEqual(stats['']['max'], 0)
+        self.assertEqual(self.db.aggregate('Place', 'price_by_night')['count'],
+                         5)
+        self.assertEqual(self.db.aggregate(User, 'age')['count'], 0)
+
+    def testIterate(self):
+        """iterate() pages through the objects across classes."""
+        places = sorted((Place() for _ in range(3)), key=lambda o: o.id)
+        users = [User(), User()]
+        for obj in places + users:
+            self.db.new(obj)
+        everything = list(self.db.iterate())
+        self.assertEqual(len(everything), 5)
+        self.assertEqual(list(self.db.iterate(Place)), places)
+        self.assertEqual(list(self.db.iterate(Place, offset=1, limit=1)),
+                         places[1:2])
+        self.assertEqual(list(self.db.iterate(offset=1, limit=3)),
+                         everything[1:4])
+        self.assertEqual(list(self.db.iterate(offset=4)), everything[4:])
+        self.assertEqual(list(self.db.iterate(limit=0)), [])
+
+    def testQuery(self):
+        """query() returns the matching objects in order, one page."""
+        places = []
+        for city_id, price, guests in (("sf", 100, 2), ("sf", 300, 4),
+                                       ("la", 50, 1), ("sf", "free", 3)):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            place.max_guest = guests
+            self.db.new(place)
+            places.append(place)
+        query = self.db.query(Place).where(city_id="sf")
+        self.assertEqual(query.order_by('-max_guest').all(),
+                         [places[1], places[3], places[0]])
+        self.assertEqual(query.where(price_by_night__lt=200).all(),
+                         [places[0]])
+        self.assertEqual(query.order_by('price_by_night').offset(1)
+                         .limit(2).all(), [places[1], places[3]])
+        self.assertEqual(self.db.query('Place').where(
+            max_guest__in=[1, 4]).count(), 2)
+        self.assertIsNone(query.where(name="Loft").first())
+        self.assertIn("INDEX Place_city_id", query.explain())
+
+    def testQueryCache(self):
+        """Cached reads are served until a write to their class."""
+        place = Place()
+        place.city_id = "sf"
+        self.db.new(place)
+        self.assertEqual(list(self.db.find(Place, city_id="sf").values()),
+                         [place])
+        hits = self.db.cache.hits
+        self.db.find(Place, city_id="sf")
+        self.assertEqual(self.db.cache.hits, hits + 1)
+        self.db.new(User())
+        self.db.find(Place, city_id="sf")
+        self.assertEqual(self.db.cache.hits, hits + 2)
+        other = Place()
+        other.city_id = "sf"
+        self.db.new(other)
+        self.assertEqual(len(self.db.find(Place, city_id="sf")), 2)
+        place.city_id = "la"
+        self.db.new(place)
+        self.assertEqual(self.db.query(Place).where(city_id="sf").all(),
+                         [other])
+        self.db.delete(other)
+        self.assertEqual(self.db.query(Place).where(city_id="sf").all(),
+                         [])
+
+    def testQueryCacheKeepsNoInstance(self):
+        """Cached results do not keep their instances loaded."""
+        place = Place(**dict(Place().to_dict(), city_id="sf"))
+        self.db.new(place)
+        ref = weakref.ref(place)
+        self.db.find(Place, city_id="sf")
+        del place
+        gc.collect()
+        self.assertIsNone(ref())
+        hits = self.db.cache.hits
+        found = list(self.db.find(Place, city_id="sf").values())
+        self.assertEqual(self.db.cache.hits, hits + 1)
+        self.assertEqual([obj.city_id for obj in found], ["sf"])
+        self.assertIs(self.db.get(Place, found[0].id), found[0])
+
+    def testSearch(self):
+        """search() ranks the objects whose text uses the query words."""
+        loft = Place()
+        loft.description = "A loft near the beach"
+        house = Place()
+        house.name = "Beach house"
+        house.description = "On the beach"
+        self.db.new(loft)
+        self.db.new(house)
+        found = self.db.search("beach house", Place)
+        self.assertEqual([obj for score, obj in found], [house, loft])
+        house.name = "Villa"
+        self.db.new(house)
+        self.assertEqual(self.db.search("house"), [])
+        self.db.delete(loft)
+        found = self.db.search("beach", limit=5)
+        self.assertEqual([obj for score, obj in found], [house])
+
+    def testDelete(self):
+        """Deleted objects are no longer returned."""
+        user = User()
+        self.db.new(user)
+        self.db.delete(user)
+        self.db.save()
+        self.assertIsNone(self.db.get(User, user.id))
+
+    def testFsck(self):
+        """fsck() runs the SQLite integrity check."""
+        self.db.new(User())
+        self.db.save()
+        report, = self.db.fsck()
+        self.assertEqual((report['path'], report['format'],
+                          report['records'], report['error']),
+                         (self.path, 'sqlite', 1, None))
+
+    def testTransactions(self):
+        """Rollback undoes the writes of a transaction in place."""
+        kept, gone = User(), User()
+        kept.email = "a@b.c"
+        self.db.new(kept)
+        self.db.new(gone)
+        self.db.save()
+        self.db.begin()
+        self.assertRaises(RuntimeError, self.db.begin)
+        kept.email = "x@y.z"
+        self.db.new(kept)
+        self.db.delete(gone)
+        self.db.new(User())
+        self.db.save()
+        self.db.rollback()
+        self.assertEqual(kept.email, "a@b.c")
+        self.assertIs(self.db.get(User, kept.id), kept)
+        self.assertIsNotNone(self.db.get(User, gone.id))
+        self.assertEqual(self.db.count(User), 2)
+        self.assertRaises(RuntimeError, self.db.commit)
+        with self.db.transaction():
+            self.db.new(User())
+        self.assertEqual(self.db.count(User), 3)
+
+    def testUncommittedChangesAreDiscarded(self):
+        """Changes not followed by save() are not persisted."""
+        user = User()
+        self.db.new(user)
+        self.db.reload()
+        self.assertIsNone(self.db.get(User, user.id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the durability policies."""
+
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+from models.engine.durability import UMASK, Durability
+
+
+class TestDurability(unittest.TestCase):
+    """Test suite for the atomic writes and the fsync policies."""
+
+    def setUp(self) -> None:
+        """Creates a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testUnknownPolicy(self):
+        """An unknown policy is rejected."""
+        with self.assertRaises(ValueError):
+            Durability('sometimes')
+
+    def testWriteReplacesFile(self):
+        """A write replaces the file and leaves no temporary file."""
+        durability = Durability('never')
+        durability.write(self.path, b'{}')
+        durability.write(self.path, b'{"A.1": {}}')
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), b'{"A.1": {}}')
+        self.assertEqual(os.listdir(self.tmp), ['file.json'])
+        self.assertEqual(durability.syncs, 0)
+
+    def testWriteKeepsPermissions(self):
+        """A new file gets the default permissions, a replaced one keeps
+        its own."""
+        durability = Durability('never')
+        durability.write(self.path, b'{}')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode),
+                         0o666 & ~UMASK)
+        os.chmod(self.path, 0o640)
+        durability.write(self.path, b'{"A.1": {}}')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+
+    def testFailedWriteKeepsFile(self):
+        """A write that fails leaves the old file and no temporary file."""
+        durability = Durability('never')
+        durability.write(self.path, b'{}')
+        with self.assertRaises(TypeError):
+            durability.write(self.path, '{"A.1": {}}')
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), b'{}')
+        self.assertEqual(os.listdir(self.tmp), ['file.json'])
+
+    def testAlwaysSyncs(self):
+        """Every write flushes the file and its directory."""
+        durability = Durability('always')
+        durability.write(self.path, b'{}')
+        self.assertEqual(durability.syncs, 2)
+        durability.append(self.path + '.log', 'line\n')
+        durability.append(self.path + '.log', 'line\n')
+        self.assertEqual(durability.syncs, 5)
+
+    def testBatchedSyncsTogether(self):
+        """Writes of one interval are flushed together by flush()."""
+        durability = Durability('batched', interval_ms=60000)
+        for _ in range(10):
+            durability.write(self.path, b'{}')
+            durability.append(self.path + '.log', 'line\n')
+        self.assertEqual(durability.syncs, 0)
+        durability.flush()
+        self.assertEqual(durability.syncs, 3)
+        durability.flush()
+        self.assertEqual(durability.syncs, 3)
+
+    def testBatchedTimer(self):
+        """The pending writes are flushed once the interval elapses."""
+        durability = Durability('batched', interval_ms=10)
+        durability.write(self.path, b'{}')
+        deadline = time.monotonic() + 5
+        while durability.syncs < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(durability.syncs, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,23 @@
 
 import unittest
 from models.base_model import BaseModel
+from models.city import City
 from models.engine.file_storage import FileStorage
+from models.engine.mapped import MappedRecord
+from models.engine.serializers import CorruptFileError, \
+    DamagedRecordsWarning
+from models.place import Place
+from models.user import User
 from models import storage
+import gc
+import json
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import weakref
 
 
 class TestBaseModel(unittest.TestCase):
@@ -72,5 +86,877 @@ class TestBaseModel(unittest.TestCase):
         self.assertNotEqual(storage._FileStorage__file_path, None)
 
 
+class TestDirtyTracking(unittest.TestCase):
+    """Test suite for the incremental save of FileStorage."""
+
+    def setUp(self) -> None:
+        """Creates a storage backed by a temporary file."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.fs = FileStorage(self.path)
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testNewMarksDirty(self):
+        """new() and delete() mark keys dirty and save() clears them."""
+        obj = BaseModel()
+        self.fs.new(obj)
+        self.assertIn(f"BaseModel.{obj.id}", self.fs._FileStorage__dirty)
+        self.fs.save()
+        self.assertEqual(self.fs._FileStorage__dirty, set())
+        self.fs.delete(obj)
+        self.assertIn(f"BaseModel.{obj.id}", self.fs._FileStorage__dirty)
+
+    def testIncrementalSaveMatchesFullDump(self):
+        """The incremental save writes the same text as json.dump."""
+        objs = [BaseModel() for _ in range(3)]
+        for obj in objs:
+            self.fs.new(obj)
+        self.fs.save()
+        objs[1].name = "changed"
+        self.fs.new(objs[1])
+        self.fs.delete(objs[2])
+        self.fs.save()
+        with open(self.path, 'r', encoding="UTF-8") as f:
+            text = f.read()
+        self.assertEqual(text, json.dumps(
+            {k: v.to_dict() for k, v in self.fs.all().items()}, indent=2))
+        self.assertEqual(json.loads(text)[f"BaseModel.{objs[1].id}"]["name"],
+                         "changed")
+
+    def testGetAndCount(self):
+        """get() looks up one object and count() counts per class."""
+        user = User()
+        self.fs.new(user)
+        self.fs.new(Place())
+        self.assertIs(self.fs.get(User, user.id), user)
+        self.assertIsNone(self.fs.get('Place', user.id))
+        self.assertEqual(self.fs.count(), 2)
+        self.assertEqual(self.fs.count('User'), 1)
+
+    def testJournalCoalescesUpdates(self):
+        """Repeated updates of one key between saves log a single record."""
+        fs = FileStorage(self.path, journal=True)
+        obj = BaseModel()
+        for _ in range(5):
+            fs.new(obj)
+        fs.save()
+        self.assertEqual(fs._FileStorage__journal.records, 1)
+
+    def testAllByClass(self):
+        """all(cls) returns only the objects of that class."""
+        user = User()
+        place = Place()
+        self.fs.new(user)
+        self.fs.new(place)
+        self.assertEqual(self.fs.all(User), {f"User.{user.id}": user})
+        self.assertEqual(self.fs.all('Place'), {f"Place.{place.id}": place})
+        self.assertEqual(self.fs.all('Review'), {})
+        self.fs.delete(user)
+        self.assertEqual(self.fs.all(User), {})
+        self.assertEqual(self.fs.count(User), 0)
+
+    def testReloadFillsClassIndex(self):
+        """reload() puts the rebuilt objects in the class index."""
+        self.fs.new(User())
+        self.fs.new(Place())
+        self.fs.save()
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(set(reloaded.all(Place)), set(self.fs.all(Place)))
+        self.assertEqual(reloaded.count(User), 1)
+
+    def testFind(self):
+        """find() matches indexed and plain attributes."""
+        cities = [City(), City(), City()]
+        for city, state in zip(cities, ["CA", "CA", "NV"]):
+            city.state_id = state
+            self.fs.new(city)
+        cities[0].name = "Fresno"
+        self.assertEqual(set(self.fs.find(City, state_id="CA")),
+                         {f"City.{c.id}" for c in cities[:2]})
+        self.assertEqual(list(self.fs.find(City, state_id="CA",
+                                           name="Fresno").values()),
+                         [cities[0]])
+        self.assertEqual(list(self.fs.find(City, name="Fresno").values()),
+                         [cities[0]])
+
+    def testFindFollowsUpdatesAndDeletes(self):
+        """The hash index follows new() and delete()."""
+        city = City()
+        city.state_id = "CA"
+        self.fs.new(city)
+        city.state_id = "NV"
+        self.fs.new(city)
+        self.assertEqual(self.fs.find(City, state_id="CA"), {})
+        self.assertEqual(len(self.fs.find(City, state_id="NV")), 1)
+        self.fs.delete(city)
+        self.assertEqual(self.fs.find(City, state_id="NV"), {})
+
+    def testBetween(self):
+        """between() combines ranges and orders by an indexed field."""
+        places = []
+        for price, guests in [(60, 2), (100, 6), (50, 4), (130, 8), (90, 4)]:
+            place = Place()
+            place.price_by_night = price
+            place.max_guest = guests
+            self.fs.new(place)
+            places.append(place)
+        found = self.fs.between(Place, price_by_night=(50, 120),
+                                max_guest=(4, None))
+        self.assertEqual(set(found.values()),
+                         {places[1], places[2], places[4]})
+        found = self.fs.between(Place, order_by='price_by_night',
+                                reverse=True, limit=2,
+                                max_guest=(4, None))
+        self.assertEqual(list(found.values()), [places[3], places[1]])
+
+    def testBetweenUnindexedOrder(self):
+        """between() sorts on an attribute without a sorted index."""
+        places = []
+        for name in ["b", "c", "a"]:
+            place = Place()
+            place.name = name
+            self.fs.new(place)
+            places.append(place)
+        found = self.fs.between(Place, order_by='name', limit=2)
+        self.assertEqual(list(found.values()), [places[2], places[0]])
+
+    def testNearby(self):
+        """nearby() answers radius and nearest neighbour queries."""
+        places = []
+        for lat, lon in [(37.77, -122.42), (37.80, -122.27), (34.05, -118.24)]:
+            place = Place()
+            place.latitude = lat
+            place.longitude = lon
+            self.fs.new(place)
+            places.append(place)
+        found = self.fs.nearby(Place, 37.78, -122.4, radius_km=20)
+        self.assertEqual([obj for distance, obj in found], places[:2])
+        found = self.fs.nearby('Place', 34, -118, k=1)
+        self.assertEqual([obj for distance, obj in found], [places[2]])
+        self.assertAlmostEqual(found[0][0], 23, delta=1)
+        with self.assertRaises(ValueError):
+            self.fs.nearby(Place, 0, 0)
+
+    def testHaving(self):
+        """having() matches the items of a list attribute."""
+        places = []
+        for amenity_ids in (["wifi", "pool"], ["wifi"], ["pool"]):
+            place = Place()
+            place.amenity_ids = amenity_ids
+            self.fs.new(place)
+            places.append(place)
+        found = self.fs.having(Place, 'amenity_ids',
+                                  all_of=["wifi", "pool"])
+        self.assertEqual(list(found.values()), places[:1])
+        found = self.fs.having('Place', 'amenity_ids', any_of=["pool"])
+        self.assertEqual(sorted(found.values(), key=places.index),
+                         [places[0], places[2]])
+
+    def testAggregate(self):
+        """aggregate() uses the columns of a class or scans its objects."""
+        for city_id, price in (("sf", 100), ("sf", 300), ("la", 50)):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            self.fs.new(place)
+            user = User()
+            user.age = price
+            self.fs.new(user)
+        stats = self.fs.aggregate(Place, 'price_by_night', by='city_id')
+        self.assertEqual(stats['sf']['avg'], 200)
+        self.assertEqual(stats['la']['count'], 1)
+        self.assertEqual(self.fs.aggregate('User', 'age')['sum'], 450)
+        self.assertEqual(self.fs.aggregate(Place, 'name')['count'], 0)
+
+    def testIterate(self):
+        """iterate() pages through the objects in the order of all()."""
+        places = [Place() for _ in range(3)]
+        for obj in places + [User()]:
+            self.fs.new(obj)
+        self.assertEqual(list(self.fs.iterate(Place)), places)
+        self.assertEqual(list(self.fs.iterate(Place, offset=1, limit=1)),
+                         places[1:2])
+        self.assertEqual(list(self.fs.iterate(offset=2)),
+                         list(self.fs.all().values())[2:])
+
+    def testQuery(self):
+        """query() returns the matching objects in order, one page."""
+        places = []
+        for city_id, price, guests in (("sf", 100, 2), ("sf", 300, 4),
+                                       ("la", 50, 1), ("sf", "free", 3)):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            place.max_guest = guests
+            self.fs.new(place)
+            places.append(place)
+        query = self.fs.query(Place).where(city_id="sf")
+        self.assertEqual(query.order_by('-max_guest').all(),
+                         [places[1], places[3], places[0]])
+        self.assertEqual(query.where(price_by_night__lt=200).all(),
+                         [places[0]])
+        self.assertEqual(query.order_by('price_by_night').offset(1)
+                         .limit(2).all(), [places[1], places[3]])
+        self.assertEqual(self.fs.query('Place').where(
+            max_guest__in=[1, 4]).count(), 2)
+        self.assertIsNone(query.where(name="Loft").first())
+        self.assertIn("eq on city_id", query.explain())
+        self.assertIn("range on price_by_night",
+                      query.where(price_by_night__le=60).explain())
+
+    def testQueryCache(self):
+        """Cached reads are served until a write to their class."""
+        place = Place()
+        place.city_id = "sf"
+        self.fs.new(place)
+        self.assertEqual(list(self.fs.find(Place, city_id="sf").values()),
+                         [place])
+        hits = self.fs.cache.hits
+        self.fs.find(Place, city_id="sf")
+        self.assertEqual(self.fs.cache.hits, hits + 1)
+        self.fs.new(User())
+        self.fs.find(Place, city_id="sf")
+        self.assertEqual(self.fs.cache.hits, hits + 2)
+        other = Place()
+        other.city_id = "sf"
+        self.fs.new(other)
+        self.assertEqual(len(self.fs.find(Place, city_id="sf")), 2)
+        place.city_id = "la"
+        self.fs.new(place)
+        self.assertEqual(self.fs.query(Place).where(city_id="sf").all(),
+                         [other])
+        self.fs.delete(other)
+        self.assertEqual(self.fs.query(Place).where(city_id="sf").all(),
+                         [])
+
+    def testSearch(self):
+        """search() ranks the objects whose text uses the query words."""
+        loft = Place()
+        loft.description = "A loft near the beach"
+        house = Place()
+        house.name = "Beach house"
+        house.description = "On the beach"
+        self.fs.new(loft)
+        self.fs.new(house)
+        found = self.fs.search("beach house", Place)
+        self.assertEqual([obj for score, obj in found], [house, loft])
+        self.assertEqual(len(self.fs.search("beach", limit=1)), 1)
+        self.fs.delete(house)
+        self.assertEqual(self.fs.search("house"), [])
+
+
+class TestShardedStorage(unittest.TestCase):
+    """Test suite for the per-class files of FileStorage."""
+
+    def setUp(self) -> None:
+        """Creates a sharded storage backed by a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.fs = FileStorage(self.path, sharded=True)
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testOneFilePerClass(self):
+        """Each class is written to its own file."""
+        self.fs.new(User())
+        self.fs.new(Place())
+        self.fs.save()
+        self.assertEqual(sorted(os.listdir(self.path + '.d')),
+                         ['Place.json', 'User.json'])
+
+    def testSaveTouchesOnlyDirtyClasses(self):
+        """A save leaves the files of clean classes untouched."""
+        user = User()
+        self.fs.new(user)
+        self.fs.new(Place())
+        self.fs.save()
+        user_file = os.path.join(self.path + '.d', 'User.json')
+        os.utime(user_file, (0, 0))
+        self.fs.new(Place())
+        self.fs.save()
+        self.assertEqual(os.stat(user_file).st_mtime, 0)
+        self.fs.delete(user)
+        self.fs.save()
+        self.assertFalse(os.path.exists(user_file))
+
+    def testReload(self):
+        """Reloading reads back every class file."""
+        objs = [User(), Place(), Place()]
+        for obj in objs:
+            self.fs.new(obj)
+        self.fs.save()
+        reloaded = FileStorage(self.path, sharded=True)
+        reloaded.reload()
+        self.assertEqual(set(reloaded.all()), set(self.fs.all()))
+
+    def testImportReloadsShards(self):
+        """Importing models reads existing class files without hanging."""
+        for obj in (User(), Place(), Place()):
+            self.fs.new(obj)
+        self.fs.save()
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        env = dict(os.environ, HBNB_FILE_SHARDED='1', PYTHONPATH=root)
+        env.pop('HBNB_TYPE_STORAGE', None)
+        result = subprocess.run(
+            [sys.executable, '-c',
+             'import models; print(models.storage.count())'],
+            cwd=self.tmp, env=env, capture_output=True, text=True,
+            timeout=30)
+        self.assertEqual((result.returncode, result.stdout), (0, "3\n"))
+
+    def testJournaledCompaction(self):
+        """Compaction in sharded mode writes every class file."""
+        fs = FileStorage(self.path, journal=True, sharded=True)
+        fs.new(User())
+        fs.new(Place())
+        fs.compact()
+        self.assertEqual(sorted(os.listdir(self.path + '.d')),
+                         ['Place.json', 'User.json'])
+        reloaded = FileStorage(self.path, journal=True, sharded=True)
+        reloaded.reload()
+        self.assertEqual(set(reloaded.all()), set(fs.all()))
+
+
+class TestFileFormats(unittest.TestCase):
+    """Test suite for the serializers of FileStorage."""
+
+    def setUp(self) -> None:
+        """Creates a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testFormatsReloadInAnyFormat(self):
+        """Files written in any format are read back by any storage."""
+        place = Place()
+        place.name = "Loft"
+        for name in ('compact', 'marshal'):
+            for compression in (None, 'gzip', 'lzma'):
+                fs = FileStorage(self.path, serializer=name,
+                                 compression=compression)
+                fs.new(place)
+                fs.save()
+                reloaded = FileStorage(self.path)
+                reloaded.reload()
+                self.assertEqual(
+                    reloaded.get(Place, place.id).to_dict(),
+                    place.to_dict())
+
+    def testCompactIsSmaller(self):
+        """Compact JSON takes less space than the default format."""
+        sizes = []
+        for name in ('pretty', 'compact'):
+            fs = FileStorage(self.path, serializer=name)
+            for i in range(5):
+                fs.new(Place())
+            fs.save()
+            sizes.append(os.path.getsize(self.path))
+        self.assertLess(sizes[1], sizes[0])
+
+    def testLazyMarshal(self):
+        """Lazy mode maps binary files through their offset index."""
+        place = Place()
+        fs = FileStorage(self.path, serializer='marshal', lazy=True)
+        fs.new(place)
+        fs.save()
+        reloaded = FileStorage(self.path, serializer='marshal', lazy=True)
+        reloaded.reload()
+        entry = reloaded._FileStorage__objects[f"Place.{place.id}"]
+        self.assertIsInstance(entry, MappedRecord)
+        self.assertEqual(reloaded.get(Place, place.id).to_dict(),
+                         place.to_dict())
+
+
+class TestDurableStorage(unittest.TestCase):
+    """Test suite for the atomic saves and the corrupt file checks."""
+
+    def setUp(self) -> None:
+        """Creates a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testPolicies(self):
+        """Every policy saves the objects and leaves no temporary file."""
+        place = Place()
+        for policy in ('always', 'batched', 'never'):
+            fs = FileStorage(self.path, journal=True, durability=policy)
+            fs.new(place)
+            fs.save()
+            fs.compact()
+            fs.sync()
+            reloaded = FileStorage(self.path)
+            reloaded.reload()
+            self.assertIn(f"Place.{place.id}", reloaded.all())
+        self.assertEqual(os.listdir(self.tmp), ['file.json'])
+
+    def testUnknownPolicy(self):
+        """An unknown durability policy is rejected."""
+        with self.assertRaises(ValueError):
+            FileStorage(self.path, durability='sometimes')
+
+    def testTruncatedFileRaises(self):
+        """A truncated file is reported instead of loading as empty."""
+        fs = FileStorage(self.path)
+        for i in range(3):
+            fs.new(Place())
+        fs.save()
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) // 2)
+        for lazy in (False, True):
+            with self.assertRaises(CorruptFileError) as raised:
+                FileStorage(self.path, lazy=lazy).reload()
+            self.assertIn(self.path, str(raised.exception))
+
+    def testRecordsRecoverIntactObjects(self):
+        """A damaged records file loads every intact object."""
+        fs = FileStorage(self.path, serializer='records', sharded=True)
+        places = [Place() for i in range(10)]
+        for place in places:
+            fs.new(place)
+        fs.new(User())
+        fs.save()
+        shard = os.path.join(self.path + '.d', 'Place.json')
+        with open(shard, 'rb+') as f:
+            f.seek(os.path.getsize(shard) // 2)
+            f.write(b'\x00\x00')
+        reloaded = FileStorage(self.path, serializer='records', sharded=True)
+        with self.assertWarns(DamagedRecordsWarning):
+            reloaded.reload()
+        self.assertEqual(reloaded.count(Place), 9)
+        self.assertEqual(reloaded.count(User), 1)
+        reports = {os.path.basename(report['path']): report
+                   for report in reloaded.fsck()}
+        self.assertEqual(reports['Place.json']['records'], 9)
+        self.assertEqual(len(reports['Place.json']['damaged']), 1)
+        self.assertEqual(reports['User.json']['damaged'], [])
+
+    def testFsckJson(self):
+        """fsck() reports where a JSON file stops being readable."""
+        fs = FileStorage(self.path)
+        self.assertEqual(fs.fsck(), [])
+        for i in range(3):
+            fs.new(Place())
+        fs.save()
+        report, = fs.fsck()
+        self.assertEqual((report['format'], report['records'],
+                          report['error']), ('pretty', 3, None))
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) // 2)
+        report, = fs.fsck()
+        self.assertLess(report['records'], 3)
+        self.assertIsNotNone(report['error'])
+
+    def testEmptyFileRaises(self):
+        """An empty file is reported, a missing one loads nothing."""
+        fs = FileStorage(self.path)
+        fs.reload()
+        self.assertEqual(fs.count(), 0)
+        open(self.path, 'w').close()
+        with self.assertRaises(CorruptFileError):
+            FileStorage(self.path).reload()
+
+
+class TestWriteBehind(unittest.TestCase):
+    """Test suite for the write-behind mode of FileStorage."""
+
+    def setUp(self) -> None:
+        """Creates a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def stored(self, **options):
+        """Returns the number of Place objects in the file."""
+        fs = FileStorage(self.path, **options)
+        fs.reload()
+        return fs.count(Place)
+
+    def wait_for(self, count, **options):
+        """Waits until the file holds `count` Place objects."""
+        deadline = time.monotonic() + 5
+        while self.stored(**options) != count and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.stored(**options), count)
+
+    def testSavesAreCoalesced(self):
+        """A burst of saves is written once, by flush()."""
+        fs = FileStorage(self.path, write_behind=True, debounce_ms=60000)
+        for i in range(10):
+            fs.new(Place())
+            fs.save()
+        self.assertEqual(self.stored(), 0)
+        syncs = fs._FileStorage__durability.syncs
+        fs.flush()
+        self.assertEqual(fs._FileStorage__durability.syncs - syncs, 2)
+        self.assertEqual(self.stored(), 10)
+        fs.flush()
+        self.assertEqual(fs._FileStorage__durability.syncs - syncs, 2)
+
+    def testDebounce(self):
+        """The writer writes once the saves stop for the interval."""
+        fs = FileStorage(self.path, journal=True, write_behind=True,
+                         debounce_ms=10)
+        fs.new(Place())
+        fs.save()
+        self.wait_for(1, journal=True)
+        fs.close()
+
+    def testMaxPending(self):
+        """Enough dirty keys are written without waiting."""
+        fs = FileStorage(self.path, write_behind=True, debounce_ms=60000,
+                         max_pending=3)
+        for i in range(3):
+            fs.new(Place())
+            fs.save()
+        self.wait_for(3)
+        fs.close()
+
+    def testCloseDrains(self):
+        """close() writes the pending changes, then saves synchronously."""
+        fs = FileStorage(self.path, write_behind=True, debounce_ms=60000)
+        fs.new(Place())
+        fs.save()
+        fs.close()
+        self.assertEqual(self.stored(), 1)
+        fs.new(Place())
+        fs.save()
+        self.assertEqual(self.stored(), 2)
+
+    def testFlushDuringDebounce(self):
+        """A flush while the writer waits leaves the writer working."""
+        fs = FileStorage(self.path, write_behind=True, debounce_ms=50)
+        for i in range(2):
+            fs.new(Place())
+            fs.save()
+            time.sleep(0.01)
+            fs.flush()
+            time.sleep(0.1)
+        self.assertTrue(fs._FileStorage__writer.is_alive())
+        fs.new(Place())
+        fs.save()
+        self.wait_for(3)
+        self.assertTrue(fs._FileStorage__writer.is_alive())
+        fs.close()
+
+    def testTransactionCommitWrites(self):
+        """commit() writes at once in write-behind mode."""
+        fs = FileStorage(self.path, write_behind=True, debounce_ms=60000)
+        with fs.transaction():
+            fs.new(Place())
+        self.assertEqual(self.stored(), 1)
+        fs.close()
+
+    def testErrorIsRaised(self):
+        """A failed background write is raised by the next call."""
+        path = os.path.join(self.tmp, 'missing', 'file.json')
+        fs = FileStorage(path, write_behind=True, debounce_ms=0)
+        fs.new(Place())
+        fs.save()
+        self.assertRaises(FileNotFoundError, fs.close)
+        fs.close()
+
+
+class TestTransactions(unittest.TestCase):
+    """Test suite for begin(), commit(), rollback() and transaction()."""
+
+    MODES = ({}, {'journal': True}, {'sharded': True}, {'max_live': 1},
+             {'lazy': True}, {'lazy': True, 'serializer': 'records'})
+
+    def setUp(self) -> None:
+        """Creates a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testCommitWritesOnce(self):
+        """Saves inside a transaction only write at commit."""
+        fs = FileStorage(self.path)
+        with fs.transaction():
+            for i in range(5):
+                fs.new(Place())
+                fs.save()
+            reloaded = FileStorage(self.path)
+            reloaded.reload()
+            self.assertEqual(reloaded.count(Place), 0)
+        reloaded.reload()
+        self.assertEqual(reloaded.count(Place), 5)
+
+    def testRollback(self):
+        """Rollback restores updated, created and deleted objects."""
+        for options in self.MODES:
+            shutil.rmtree(self.tmp)
+            os.mkdir(self.tmp)
+            fs = FileStorage(self.path, **options)
+            kept, gone = Place(), Place()
+            kept.name = "Loft"
+            for place in (kept, gone):
+                fs.new(place)
+            fs.save()
+            fs.reload()
+            kept = fs.get(Place, kept.id)
+            gone = fs.get(Place, gone.id)
+            self.assertEqual(list(fs.find(Place, name="Loft").values()),
+                             [kept])
+            fs.begin()
+            kept.name = "Barn"
+            fs.new(kept)
+            fs.delete(gone)
+            fs.new(Place())
+            fs.save()
+            self.assertEqual(list(fs.find(Place, name="Barn").values()),
+                             [kept])
+            fs.rollback()
+            self.assertEqual(kept.name, "Loft", options)
+            self.assertIs(fs.get(Place, kept.id), kept)
+            self.assertIs(fs.get(Place, gone.id), gone)
+            self.assertEqual(fs.count(Place), 2)
+            self.assertEqual(list(fs.find(Place, name="Loft").values()),
+                             [kept])
+            self.assertEqual(fs.find(Place, name="Barn"), {})
+            fs.save()
+            reloaded = FileStorage(self.path, **options)
+            reloaded.reload()
+            self.assertEqual(reloaded.get(Place, kept.id).name, "Loft")
+            self.assertEqual(reloaded.count(Place), 2)
+
+    def testTransactionRollsBackOnError(self):
+        """An exception in a transaction block rolls it back."""
+        fs = FileStorage(self.path)
+        with self.assertRaises(KeyError):
+            with fs.transaction():
+                fs.new(Place())
+                raise KeyError
+        self.assertEqual(fs.count(Place), 0)
+        fs.begin()
+        fs.commit()
+
+    def testMisuse(self):
+        """Opening twice, or closing without opening, is an error."""
+        fs = FileStorage(self.path, journal=True)
+        self.assertRaises(RuntimeError, fs.commit)
+        self.assertRaises(RuntimeError, fs.rollback)
+        fs.begin()
+        self.assertRaises(RuntimeError, fs.begin)
+        self.assertRaises(RuntimeError, fs.compact)
+        fs.reload()
+        self.assertRaises(RuntimeError, fs.commit)
+
+
+class TestIdentityMap(unittest.TestCase):
+    """Test suite for the live instances kept by FileStorage."""
+
+    def setUp(self) -> None:
+        """Creates a storage backed by a temporary file."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.fs = FileStorage(self.path)
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testStoresLiveInstance(self):
+        """new() keeps the instance itself, not a copy."""
+        user = User()
+        self.fs.new(user)
+        self.assertIs(self.fs.all()[f"User.{user.id}"], user)
+
+    def testChangesAreSerializedOnSave(self):
+        """Attributes set before save() are written to the file."""
+        user = User()
+        self.fs.new(user)
+        user.first_name = "Betty"
+        self.fs.new(user)
+        self.fs.save()
+        with open(self.path, 'r', encoding="UTF-8") as f:
+            data = json.load(f)
+        self.assertEqual(data[f"User.{user.id}"]["first_name"], "Betty")
+
+    def testReloadBuildsInstances(self):
+        """reload() rebuilds instances of the stored classes."""
+        place = Place()
+        self.fs.new(place)
+        self.fs.save()
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        obj = reloaded.get(Place, place.id)
+        self.assertIsInstance(obj, Place)
+        self.assertEqual(obj.to_dict(), place.to_dict())
+
+
+class TestBoundedStorage(unittest.TestCase):
+    """Test suite for the bounded instance cache of FileStorage."""
+
+    def setUp(self) -> None:
+        """Stores five places in a file."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        fs = FileStorage(self.path)
+        self.places = []
+        for i in range(5):
+            place = Place()
+            place.name = f"place {i}"
+            place.number_rooms = i
+            fs.new(place)
+            self.places.append(place)
+        fs.save()
+        self.fs = FileStorage(self.path, max_live=2)
+        self.fs.reload()
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testReloadKeepsRecords(self):
+        """reload() builds no instance until one is read."""
+        objects = self.fs._FileStorage__objects
+        self.assertTrue(all(type(v) is dict for v in objects.values()))
+        place = self.fs.get(Place, self.places[0].id)
+        self.assertIsInstance(place, Place)
+        self.assertIs(self.fs.get(Place, place.id), place)
+        self.assertEqual(place.to_dict(), self.places[0].to_dict())
+
+    def testEviction(self):
+        """Only max_live instances stay hydrated."""
+        for place in self.places:
+            self.fs.get(Place, place.id)
+        objects = self.fs._FileStorage__objects
+        live = [k for k, v in objects.items() if type(v) is not dict]
+        self.assertEqual(live, [f"Place.{p.id}" for p in self.places[3:]])
+
+    def testEvictedInstanceKeepsIdentity(self):
+        """An evicted instance still referenced is handed out again."""
+        first = self.fs.get(Place, self.places[0].id)
+        for place in self.places[1:]:
+            self.fs.get(Place, place.id)
+        self.assertIs(self.fs.get(Place, first.id), first)
+
+    def testQueriesReadRecords(self):
+        """Queries scan the records and hydrate the results only."""
+        found = self.fs.query(Place).where(number_rooms__ge=3) \
+            .order_by('-number_rooms').all()
+        self.assertEqual([p.name for p in found], ["place 4", "place 3"])
+        self.assertEqual(self.fs.aggregate(Place, 'number_rooms')['sum'], 10)
+        self.assertEqual(len(self.fs.find(Place, name="place 1")), 1)
+        self.assertEqual(len(self.fs.all(Place)), 5)
+        self.assertEqual([p.name for p in self.fs.iterate(Place, 1, 2)],
+                         ["place 1", "place 2"])
+
+    def testCachedQueriesKeepBound(self):
+        """Cached query results do not keep evicted instances alive."""
+        found = self.fs.query(Place).where(number_rooms__ge=0).all()
+        refs = [weakref.ref(place) for place in found]
+        del found
+        gc.collect()
+        self.assertEqual(sum(ref() is not None for ref in refs), 2)
+        hits = self.fs.cache.hits
+        found = self.fs.query(Place).where(number_rooms__ge=0).all()
+        self.assertEqual(self.fs.cache.hits, hits + 1)
+        self.assertEqual(sorted(p.name for p in found),
+                         [f"place {i}" for i in range(5)])
+
+    def testSaveWritesRecords(self):
+        """Saving writes hydrated and evicted objects alike."""
+        place = self.fs.get(Place, self.places[0].id)
+        place.name = "renamed"
+        self.fs.new(place)
+        for other in self.places[1:]:
+            self.fs.get(Place, other.id)
+        self.fs.save()
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.get(Place, place.id).name, "renamed")
+        self.assertEqual(reloaded.count(Place), 5)
+        self.assertEqual(self.fs._FileStorage__fragments, {})
+
+
+class TestLazyStorage(unittest.TestCase):
+    """Test suite for the lazy reload of FileStorage."""
+
+    def setUp(self) -> None:
+        """Stores three places and a user in a file with its index."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        fs = FileStorage(self.path, lazy=True)
+        self.places = []
+        for i in range(3):
+            place = Place()
+            place.city_id = str(i % 2)
+            place.number_rooms = i
+            fs.new(place)
+            self.places.append(place)
+        self.user = User()
+        fs.new(self.user)
+        fs.save()
+        self.fs = FileStorage(self.path, lazy=True)
+        self.fs.reload()
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testReloadParsesNothing(self):
+        """reload() only reads the index; get() parses one object."""
+        objects = self.fs._FileStorage__objects
+        self.assertEqual(len(objects), 4)
+        self.assertTrue(all(type(v) is MappedRecord
+                            for v in objects.values()))
+        place = self.fs.get(Place, self.places[0].id)
+        self.assertEqual(place.to_dict(), self.places[0].to_dict())
+        self.assertIs(objects[f"Place.{place.id}"], place)
+        self.assertEqual(sum(type(v) is MappedRecord
+                             for v in objects.values()), 3)
+
+    def testIndexesAreBuiltOnDemand(self):
+        """A query builds the indexes of its class only."""
+        found = self.fs.find(Place, city_id="0")
+        self.assertEqual(sorted(found), sorted(
+            f"Place.{p.id}" for p in self.places if p.city_id == "0"))
+        self.assertIs(type(self.fs._FileStorage__objects[
+            f"User.{self.user.id}"]), MappedRecord)
+        self.assertEqual(self.fs.count(User), 1)
+
+    def testSaveCopiesUnparsedRecords(self):
+        """Saving writes the unparsed objects back unchanged."""
+        with open(self.path, 'r', encoding="UTF-8") as f:
+            before = f.read()
+        self.fs.new(self.fs.get(User, self.user.id))
+        self.fs.save()
+        with open(self.path, 'r', encoding="UTF-8") as f:
+            self.assertEqual(f.read(), before)
+        reloaded = FileStorage(self.path, lazy=True)
+        reloaded.reload()
+        self.assertEqual(reloaded.get(Place, self.places[2].id).number_rooms,
+                         2)
+
+    def testStaleIndexFallsBack(self):
+        """A file rewritten without its index is read as a whole."""
+        FileStorage(self.path).save()
+        fs = FileStorage(self.path, lazy=True)
+        fs.reload()
+        self.assertEqual(fs.count(), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
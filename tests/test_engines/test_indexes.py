@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the secondary indexes."""
+
+import unittest
+from models.city import City
+from models.engine.indexes import BitmapIndex, GridIndex, HashIndex, \
+    SortedIndex, TextIndex, geo_window, haversine, in_range, tokenize
+from models.place import Place
+
+
+class TestHashIndex(unittest.TestCase):
+    """Test suite for the HashIndex class."""
+
+    def setUp(self) -> None:
+        """Creates an index on City.state_id."""
+        self.index = HashIndex('state_id')
+
+    def testLookup(self):
+        """Keys are found by the value of the indexed attribute."""
+        city = City()
+        city.state_id = "CA"
+        self.index.add("City.1", city)
+        self.assertEqual(self.index.lookup("CA"), {"City.1"})
+        self.assertEqual(self.index.lookup("NV"), set())
+
+    def testReindexOnUpdate(self):
+        """Adding a key again moves it to its new value."""
+        city = City()
+        city.state_id = "CA"
+        self.index.add("City.1", city)
+        city.state_id = "NV"
+        self.index.add("City.1", city)
+        self.assertEqual(self.index.lookup("CA"), set())
+        self.assertEqual(self.index.lookup("NV"), {"City.1"})
+
+    def testDiscard(self):
+        """Discarded keys are no longer found."""
+        city = City()
+        self.index.add("City.1", city)
+        self.index.discard("City.1")
+        self.index.discard("City.2")
+        self.assertEqual(self.index.lookup(""), set())
+
+    def testUnhashableValue(self):
+        """Unhashable values are left out of the index."""
+        city = City()
+        city.state_id = ["CA"]
+        self.index.add("City.1", city)
+        self.index.discard("City.1")
+
+
+class TestSortedIndex(unittest.TestCase):
+    """Test suite for the SortedIndex class."""
+
+    def setUp(self) -> None:
+        """Creates an index on Place.price_by_night with five places."""
+        self.index = SortedIndex('price_by_night')
+        for i, price in enumerate([80, 40, 120, 80, 200]):
+            place = Place()
+            place.price_by_night = price
+            self.index.add(f"Place.{i}", place)
+
+    def testRangeInOrder(self):
+        """Keys in the range come out ordered by value."""
+        self.assertEqual(list(self.index.range(50, 150)),
+                         ["Place.0", "Place.3", "Place.2"])
+        self.assertEqual(list(self.index.range(high=80, reverse=True)),
+                         ["Place.3", "Place.0", "Place.1"])
+        self.assertEqual(self.index.count(80, 80), 2)
+        self.assertEqual(self.index.count(), 5)
+
+    def testUpdateAndDiscard(self):
+        """Re-adding a key moves it and discarding removes it."""
+        place = Place()
+        place.price_by_night = 10
+        self.index.add("Place.2", place)
+        self.index.discard("Place.4")
+        self.assertEqual(list(self.index.range()),
+                         ["Place.2", "Place.1", "Place.0", "Place.3"])
+
+    def testNonNumericValuesAreSkipped(self):
+        """Values that are not numbers are not indexed."""
+        place = Place()
+        place.price_by_night = "cheap"
+        self.index.add("Place.0", place)
+        self.assertEqual(self.index.count(), 4)
+
+    def testInRange(self):
+        """in_range() handles open bounds and incomparable values."""
+        self.assertTrue(in_range(5, None, 5))
+        self.assertFalse(in_range(5, 6, None))
+        self.assertFalse(in_range("5", 1, 10))
+
+
+class TestBitmapIndex(unittest.TestCase):
+    """Test suite for the BitmapIndex class."""
+
+    amenities = {"a": ["wifi", "pool"], "b": ["wifi"],
+                 "c": ["pool", "parking"], "d": []}
+
+    def setUp(self) -> None:
+        """Creates an index over the amenities of a few places."""
+        self.index = BitmapIndex('amenity_ids')
+        for key, amenity_ids in self.amenities.items():
+            place = Place()
+            place.amenity_ids = amenity_ids
+            self.index.add(key, place)
+
+    def testAllOf(self):
+        """Keys holding every item are found."""
+        self.assertEqual(list(self.index.lookup(all_of=["wifi", "pool"])),
+                         ["a"])
+        self.assertEqual(list(self.index.lookup(all_of=["wifi", "spa"])),
+                         [])
+        self.assertEqual(self.index.count(all_of=["pool"]), 2)
+
+    def testAnyOf(self):
+        """Keys holding one of the items are found."""
+        self.assertEqual(list(self.index.lookup(any_of=["parking", "wifi"])),
+                         ["a", "b", "c"])
+        self.assertEqual(list(self.index.lookup(all_of=["pool"],
+                                                any_of=["wifi"])), ["a"])
+        self.assertEqual(list(self.index.lookup()), ["a", "b", "c", "d"])
+
+    def testUpdateAndDiscard(self):
+        """Removed keys free their ordinal for new keys."""
+        self.index.discard("a")
+        self.assertEqual(list(self.index.lookup(all_of=["wifi"])), ["b"])
+        place = Place()
+        place.amenity_ids = ["wifi", "spa"]
+        self.index.add("e", place)
+        self.assertEqual(list(self.index.lookup(all_of=["wifi"])),
+                         ["e", "b"])
+        place.amenity_ids = "wifi"
+        self.index.add("e", place)
+        self.assertEqual(self.index.count(any_of=["wifi", "spa"]), 1)
+        self.assertEqual(len(self.index), 3)
+
+
+class TestGridIndex(unittest.TestCase):
+    """Test suite for the GridIndex class."""
+
+    positions = {"SF": (37.7749, -122.4194), "OAK": (37.8044, -122.2712),
+                 "LA": (34.0522, -118.2437), "FJI": (-17.7134, 178.065),
+                 "SAM": (-13.759, -172.1046)}
+
+    def setUp(self) -> None:
+        """Creates an index holding a few cities."""
+        self.index = GridIndex('latitude', 'longitude')
+        for key, (lat, lon) in self.positions.items():
+            place = Place()
+            place.latitude = lat
+            place.longitude = lon
+            self.index.add(key, place)
+
+    def testHaversine(self):
+        """The distance from San Francisco to Los Angeles is ~559 km."""
+        sf = self.positions["SF"]
+        la = self.positions["LA"]
+        self.assertAlmostEqual(haversine(*sf, *la), 559, delta=2)
+
+    def testWithin(self):
+        """A radius search returns the keys in range, nearest first."""
+        found = self.index.within(37.78, -122.41, 20)
+        self.assertEqual([key for distance, key in found], ["SF", "OAK"])
+        self.assertLess(found[0][0], found[1][0])
+
+    def testWithinAcrossAntimeridian(self):
+        """A radius search wraps around the 180th meridian."""
+        found = self.index.within(-16, 179.9, 1200)
+        self.assertEqual([key for distance, key in found], ["FJI", "SAM"])
+
+    def testNearest(self):
+        """The k nearest keys are found whatever their distance."""
+        found = self.index.nearest(34, -118, 2)
+        self.assertEqual([key for distance, key in found], ["LA", "OAK"])
+        self.assertEqual(len(self.index.nearest(0, 0, 10)), 5)
+
+    def testUpdateAndDiscard(self):
+        """Moved keys are found at their new position only."""
+        place = Place()
+        place.latitude = 34.05
+        place.longitude = -118.25
+        self.index.add("SF", place)
+        self.index.discard("LA")
+        found = self.index.within(34.05, -118.24, 5)
+        self.assertEqual([key for distance, key in found], ["SF"])
+        self.assertEqual(len(self.index), 4)
+
+    def testGeoWindowNearPole(self):
+        """Near a pole the window spans every longitude."""
+        self.assertEqual(geo_window(89.9, 0, 50)[2], [(-180.0, 180.0)])
+
+
+class TestTextIndex(unittest.TestCase):
+    """Test suite for the TextIndex class."""
+
+    texts = {"loft": ("Cozy loft", "A cozy loft near the beach"),
+             "house": ("Beach house", "Big house on the beach, beach views"),
+             "cabin": ("Cabin", "Quiet cabin in the woods")}
+
+    def setUp(self) -> None:
+        """Creates an index over the name and description of places."""
+        self.index = TextIndex('name', 'description')
+        for key, (name, description) in self.texts.items():
+            place = Place()
+            place.name = name
+            place.description = description
+            self.index.add(key, place)
+
+    def testTokenize(self):
+        """Words are lowercased and punctuation is dropped."""
+        self.assertEqual(tokenize("Beach, BEACH views!"),
+                         ["beach", "beach", "views"])
+
+    def testSearchRanks(self):
+        """Keys using more of the query words, more often, come first."""
+        found = self.index.search("beach house")
+        self.assertEqual([key for score, key in found], ["house", "loft"])
+        self.assertGreater(found[0][0], found[1][0])
+        self.assertEqual(self.index.search("BEACH", limit=1)[0][1], "house")
+        self.assertEqual(self.index.search("castle"), [])
+
+    def testUpdateAndDiscard(self):
+        """Updated text replaces the old words of the key."""
+        place = Place()
+        place.name = "Cabin"
+        place.description = "Cabin by the beach"
+        self.index.add("cabin", place)
+        self.assertEqual(self.index.search("woods"), [])
+        self.index.discard("house")
+        found = self.index.search("beach")
+        self.assertEqual(sorted(key for score, key in found),
+                         ["cabin", "loft"])
+        self.assertEqual(len(self.index), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
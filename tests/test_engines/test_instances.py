@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the InstanceCache, RecordView and
+LazyObjects classes."""
+
+import unittest
+from datetime import datetime
+from models.engine.instances import InstanceCache, LazyObjects, \
+    RecordView, sizeof
+from models.place import Place
+
+
+class TestInstanceCache(unittest.TestCase):
+    """Test suite for the InstanceCache class."""
+
+    def testEvictsLeastRecentlyUsed(self):
+        """Touching beyond max_count evicts the oldest untouched key."""
+        cache = InstanceCache(max_count=2)
+        places = [Place() for _ in range(3)]
+        self.assertEqual(cache.touch('a', places[0]), [])
+        self.assertEqual(cache.touch('b', places[1]), [])
+        self.assertEqual(cache.touch('a', places[0]), [])
+        self.assertEqual(cache.touch('c', places[2]), ['b'])
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+
+    def testMaxBytes(self):
+        """The estimated size bounds the cache, keeping the last key."""
+        place = Place()
+        cache = InstanceCache(max_bytes=sizeof(place) * 2)
+        cache.touch('a', place)
+        cache.touch('b', Place())
+        self.assertEqual(cache.touch('c', Place()), ['a'])
+        big = Place()
+        big.description = "x" * 100000
+        self.assertEqual(cache.touch('d', big), ['b', 'c'])
+        self.assertIn('d', cache)
+        self.assertEqual(cache.size, sizeof(big))
+
+    def testDiscard(self):
+        """A discarded key no longer counts against the bounds."""
+        cache = InstanceCache(max_count=1)
+        cache.touch('a', Place())
+        cache.discard('a')
+        cache.discard('a')
+        self.assertEqual(cache.touch('b', Place()), [])
+        self.assertEqual(len(cache), 1)
+
+
+class TestRecordView(unittest.TestCase):
+    """Test suite for the RecordView class."""
+
+    def testAnswersLikeTheInstance(self):
+        """A view reads the record, then the class defaults."""
+        place = Place()
+        place.name = "Loft"
+        view = RecordView(Place, place.to_dict())
+        self.assertIs(view.__class__, Place)
+        self.assertEqual(view.name, "Loft")
+        self.assertEqual(view.number_rooms, 0)
+        self.assertEqual(view.created_at, place.created_at)
+        self.assertIsInstance(view.updated_at, datetime)
+        self.assertIsNone(getattr(view, 'missing', None))
+
+
+class TestLazyObjects(unittest.TestCase):
+    """Test suite for the LazyObjects class."""
+
+    def testHydratesOnRead(self):
+        """Only the values read are hydrated."""
+        hydrated = []
+
+        def hydrate(key):
+            hydrated.append(key)
+            return key.upper()
+        objects = LazyObjects({'a': {}, 'b': {}}, hydrate)
+        self.assertEqual(len(objects), 2)
+        self.assertIn('a', objects)
+        self.assertEqual(list(objects), ['a', 'b'])
+        self.assertEqual(hydrated, [])
+        self.assertEqual(objects['b'], 'B')
+        self.assertEqual(hydrated, ['b'])
+        self.assertRaises(KeyError, objects.__getitem__, 'c')
+        self.assertEqual(list(objects.values()), ['A', 'B'])
+
+
+if __name__ == "__main__":
+    unittest.main()
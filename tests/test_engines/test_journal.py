@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the Journal class and the
+journaled mode of FileStorage."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from models.base_model import BaseModel
+from models.engine.file_storage import FileStorage
+from models.engine.journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+    """Test suite for the Journal class."""
+
+    def setUp(self) -> None:
+        """Creates a temporary directory for the log files."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testReplayInOrder(self):
+        """Records are replayed in the order they were appended."""
+        journal = Journal(self.path + '.log')
+        journal.append('new', 'BaseModel.1', {'id': '1'})
+        journal.append('delete', 'BaseModel.1')
+        self.assertEqual(list(journal.replay()),
+                         [('new', 'BaseModel.1', {'id': '1'}),
+                          ('delete', 'BaseModel.1', None)])
+        self.assertEqual(journal.records, 2)
+
+    def testReplayMissingFile(self):
+        """A missing log replays as empty."""
+        self.assertEqual(list(Journal(self.path + '.log').replay()), [])
+
+    def testTruncatedLineIsSkipped(self):
+        """A partially written last line does not stop the replay."""
+        journal = Journal(self.path + '.log')
+        journal.append('new', 'BaseModel.1', {'id': '1'})
+        with open(journal.path, 'a', encoding="UTF-8") as f:
+            f.write('{"op": "new", "key": "Base')
+        self.assertEqual(len(list(journal.replay())), 1)
+
+    def testAppendAfterTornLine(self):
+        """Records appended after a crash are not lost in the torn line."""
+        journal = Journal(self.path + '.log')
+        journal.append('new', 'BaseModel.1', {'id': '1'})
+        with open(journal.path, 'a', encoding="UTF-8") as f:
+            f.write('{"op": "new", "key": "Base')
+        for replay in (True, False):
+            journal = Journal(self.path + '.log')
+            if replay:
+                self.assertEqual(len(list(journal.replay())), 1)
+            journal.append('new', 'BaseModel.2', {'id': '2'})
+            journal.rotate()
+            journal.append('delete', 'BaseModel.1')
+            with open(journal.path, 'a', encoding="UTF-8") as f:
+                f.write('{"op": "del')
+        journal = Journal(self.path + '.log')
+        journal.append('new', 'BaseModel.3', {'id': '3'})
+        self.assertEqual([(op, key) for op, key, value in journal.replay()],
+                         [('new', 'BaseModel.1'), ('new', 'BaseModel.2'),
+                          ('delete', 'BaseModel.1'),
+                          ('new', 'BaseModel.2'),
+                          ('delete', 'BaseModel.1'),
+                          ('new', 'BaseModel.3')])
+
+    def testSaveAppendsInsteadOfRewriting(self):
+        """Journaled storage leaves the JSON file alone and replays the log."""
+        fs = FileStorage(self.path, journal=True)
+        obj = BaseModel()
+        fs.new(obj)
+        fs.save()
+        self.assertFalse(os.path.exists(self.path))
+        other = BaseModel()
+        fs.new(other)
+        fs.delete(obj)
+        fs.save()
+
+        reloaded = FileStorage(self.path, journal=True)
+        reloaded.reload()
+        self.assertNotIn(f"BaseModel.{obj.id}", reloaded.all())
+        self.assertIn(f"BaseModel.{other.id}", reloaded.all())
+
+    def testCompactFoldsLogIntoSnapshot(self):
+        """compact() writes the JSON file and empties the log."""
+        fs = FileStorage(self.path, journal=True)
+        objs = [BaseModel() for _ in range(3)]
+        for obj in objs:
+            fs.new(obj)
+        fs.delete(objs[0])
+        fs.compact()
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.log'))
+        self.assertFalse(os.path.exists(self.path + '.log.1'))
+
+        fs.new(objs[0])
+        fs.save()
+        reloaded = FileStorage(self.path, journal=True)
+        reloaded.reload()
+        self.assertEqual(set(reloaded.all()), set(fs.all()))
+        self.assertEqual(reloaded._FileStorage__journal.records, 1)
+
+    def testBackgroundCompaction(self):
+        """save() compacts in the background once the log is too long."""
+        fs = FileStorage(self.path, journal=True, compact_threshold=2)
+        objs = [BaseModel(), BaseModel()]
+        for _ in range(3):
+            for obj in objs:
+                fs.new(obj)
+            fs.save()
+        fs._FileStorage__compaction.join()
+        self.assertTrue(os.path.exists(self.path))
+        reloaded = FileStorage(self.path, journal=True)
+        reloaded.reload()
+        self.assertEqual(set(reloaded.all()), set(fs.all()))
+
+    def testReplayRotatedLog(self):
+        """A rotated log left by an interrupted compaction is replayed."""
+        journal = Journal(self.path + '.log')
+        journal.append('new', 'BaseModel.1', {'id': '1'})
+        journal.rotate()
+        journal.append('delete', 'BaseModel.1')
+        ops = [op for op, key, value in journal.replay()]
+        self.assertEqual(ops, ['new', 'delete'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the streaming JSON reader."""
+
+import io
+import json
+import unittest
+from models.engine.json_stream import iter_items
+
+
+class TestIterItems(unittest.TestCase):
+    """Test suite for the iter_items function."""
+
+    def testMatchesJsonLoad(self):
+        """Members are decoded as json.load() does, whatever the chunk."""
+        objects = {
+            "Place.1": {"id": "1", "name": "Loft é\"", "rooms": 3,
+                        "price": 1e-07, "tags": [1, -2.5e+30, None]},
+            "Place.2": {"nested": {"a": [True, False, {}]}},
+            "Place.3": 123456789,
+        }
+        for indent in (None, 2):
+            text = json.dumps(objects, indent=indent)
+            for chunk_size in (1, 2, 3, 7, 1024):
+                self.assertEqual(
+                    list(iter_items(io.StringIO(text), chunk_size)),
+                    list(objects.items()))
+
+    def testEmpty(self):
+        """An empty file or object holds no member."""
+        self.assertEqual(list(iter_items(io.StringIO(" \n"))), [])
+        self.assertEqual(list(iter_items(io.StringIO("{ }"))), [])
+
+    def testInvalid(self):
+        """Invalid documents raise after the members read before."""
+        for text in ('{"a": 1', '{"a" 1}', '[1]', '{"a": 1} x', '{1: 2}',
+                     '{"a": 1,}', '{"a": 1e}'):
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_items(io.StringIO(text), 2))
+        items = iter_items(io.StringIO('{"a": 1, "b": }'))
+        self.assertEqual(next(items), ("a", 1))
+        self.assertRaises(json.JSONDecodeError, next, items)
+
+
+if __name__ == "__main__":
+    unittest.main()
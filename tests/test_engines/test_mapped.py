@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the offset index of a mapped file."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from models.engine.mapped import MappedRecord, index_path, map_file, \
+    remove_index, write_index
+
+
+class TestMappedFile(unittest.TestCase):
+    """Test suite for write_index() and map_file()."""
+
+    def setUp(self) -> None:
+        """Writes a JSON file of two objects and its index."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.objects = {"A.1": {"id": "1"}, "A.2": {"id": "2", "n": [1]}}
+        text = json.dumps(self.objects)
+        with open(self.path, 'w', encoding="UTF-8") as f:
+            f.write(text)
+        self.offsets = {}
+        for key, value in self.objects.items():
+            start = text.index(json.dumps(value))
+            self.offsets[key] = [start, start + len(json.dumps(value))]
+        write_index(self.path, self.offsets)
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def testMapsRecords(self):
+        """Each key maps to the unparsed bytes of its object."""
+        mapped = map_file(self.path)
+        self.assertEqual(list(mapped), ["A.1", "A.2"])
+        self.assertIsInstance(mapped["A.2"], MappedRecord)
+        self.assertEqual(mapped["A.2"].load(), self.objects["A.2"])
+        self.assertEqual(mapped["A.1"].raw(), b'{"id": "1"}')
+
+    def testOtherFormatIsIgnored(self):
+        """An index written for another format is not used."""
+        write_index(self.path, self.offsets, 'marshal')
+        self.assertIsNone(map_file(self.path))
+
+    def testStaleIndexIsIgnored(self):
+        """An index no longer matching its file is not used."""
+        with open(self.path, 'a', encoding="UTF-8") as f:
+            f.write(' ')
+        self.assertIsNone(map_file(self.path))
+
+    def testMissingIndex(self):
+        """A file without an index, or no file, maps to None."""
+        remove_index(self.path)
+        remove_index(self.path)
+        self.assertFalse(os.path.exists(index_path(self.path)))
+        self.assertIsNone(map_file(self.path))
+        self.assertIsNone(map_file(os.path.join(self.tmp, 'none.json')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the Query class."""
+
+import unittest
+from models.engine.query import OPERATORS, Query
+from models.place import Place
+
+
+class TestQuery(unittest.TestCase):
+    """Test suite for the Query class."""
+
+    def testWhere(self):
+        """Conditions are parsed from the keyword names."""
+        query = Query(None, Place).where(city_id="1", price_by_night__lt=90)
+        self.assertEqual(query.cls, "Place")
+        self.assertEqual(query.conditions, (("city_id", "eq", "1"),
+                                            ("price_by_night", "lt", 90)))
+        with self.assertRaises(ValueError):
+            query.where(price__below=3)
+
+    def testImmutable(self):
+        """Refining a query leaves the original unchanged."""
+        query = Query(None, "Place")
+        refined = query.where(max_guest=2).order_by('-price_by_night') \
+            .offset(5).limit(10)
+        self.assertEqual(query.conditions, ())
+        self.assertIsNone(query.order)
+        self.assertEqual((query.start, query.size), (0, None))
+        self.assertEqual(refined.order, ("price_by_night", True))
+        self.assertEqual((refined.start, refined.size), (5, 10))
+
+    def testAccepts(self):
+        """Values that cannot be compared fail the condition."""
+        query = Query(None, Place).where(price_by_night__ge=10,
+                                         amenity_ids__contains="wifi")
+        values = {"price_by_night": 20, "amenity_ids": ["wifi"]}
+        self.assertTrue(query.accepts(values.get))
+        values["price_by_night"] = "free"
+        self.assertFalse(query.accepts(values.get))
+        self.assertFalse(OPERATORS['contains']("wifi", "wifi"))
+        self.assertTrue(OPERATORS['in'](2, [1, 2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
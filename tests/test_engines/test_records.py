@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the checksummed record framing."""
+
+import io
+import json
+import unittest
+from models.engine.records import MAGIC, MARKER, Scanner, frame
+
+
+def document(count):
+    """Returns a records document of `count` objects."""
+    return MAGIC + b''.join(
+        frame(f"A.{i}".encode(), json.dumps({"id": i}).encode())
+        for i in range(count))
+
+
+class TestScanner(unittest.TestCase):
+    """Test suite for Scanner."""
+
+    def scan(self, data, chunk_size=7):
+        """Scans bytes in small chunks and returns the scanner and keys."""
+        scanner = Scanner(io.BytesIO(data), chunk_size)
+        return scanner, [key for key, value in scanner]
+
+    def testIntact(self):
+        """Every record of an intact document is read back."""
+        scanner, keys = self.scan(document(20))
+        self.assertEqual(keys, [f"A.{i}" for i in range(20)])
+        self.assertEqual(scanner.records, 20)
+        self.assertEqual(scanner.damaged, [])
+        self.assertEqual(scanner.size, len(document(20)))
+
+    def testEmpty(self):
+        """An empty document, or no bytes at all, holds no record."""
+        for data in (MAGIC, b''):
+            scanner, keys = self.scan(data)
+            self.assertEqual((keys, scanner.damaged), ([], []))
+
+    def testEveryFlippedByte(self):
+        """Flipping any byte loses at most its record and is reported."""
+        data = document(5)
+        for i in range(len(data)):
+            damaged = bytearray(data)
+            damaged[i] ^= 0x40
+            scanner, keys = self.scan(bytes(damaged))
+            self.assertGreaterEqual(len(keys), 4, i)
+            self.assertEqual(len(set(keys)), len(keys))
+            self.assertEqual(bool(scanner.damaged),
+                             len(keys) < 5 or i < len(MAGIC), i)
+            for start, end in scanner.damaged:
+                self.assertLessEqual(start, i)
+                self.assertGreater(end, i)
+
+    def testGarbageBetweenRecords(self):
+        """Bytes between records are skipped and reported."""
+        records = document(3)[len(MAGIC):]
+        half = len(records) // 3
+        data = MAGIC + records[:half] + b'\x00' * 100 + records[half:]
+        scanner, keys = self.scan(data, chunk_size=16)
+        self.assertEqual(keys, ["A.0", "A.1", "A.2"])
+        self.assertEqual(scanner.damaged,
+                         [[len(MAGIC) + half, len(MAGIC) + half + 100]])
+        self.assertEqual(scanner.lost, 100)
+
+    def testTruncatedTail(self):
+        """A record cut by the end of the file is reported as lost."""
+        data = document(3)
+        scanner, keys = self.scan(data[:-5])
+        self.assertEqual(keys, ["A.0", "A.1"])
+        self.assertEqual(scanner.damaged[-1][1], len(data) - 5)
+
+    def testMarkerSplitByChunks(self):
+        """A marker split across two chunks is still found."""
+        data = document(2)
+        data = data[:len(MAGIC)] + b'x' + MARKER[:1] + data[len(MAGIC):]
+        for chunk_size in range(1, 12):
+            keys = self.scan(data, chunk_size)[1]
+            self.assertEqual(keys, ["A.0", "A.1"], chunk_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+"""Module containing unit tests for the file formats of FileStorage."""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from models.engine.formats import main
+from models.engine.serializers import SERIALIZERS, CorruptFileError, \
+    DamagedRecordsWarning, benchmark, check_file, convert, \
+    get_serializer, load_items
+
+RECORDS = {
+    "Place.1": {"__class__": "Place", "id": "1", "name": "Loft é",
+                "price_by_night": 120, "latitude": 37.5,
+                "amenity_ids": ["a", "b"]},
+    "User.2": {"__class__": "User", "id": "2", "email": None},
+}
+
+
+class TestSerializers(unittest.TestCase):
+    """Test suite for the serializers and load_items()."""
+
+    def setUp(self) -> None:
+        """Creates a temporary directory."""
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def write(self, serializer, records=RECORDS):
+        """Writes records with a serializer and returns the path."""
+        keys = list(records)
+        document, offsets = serializer.join(keys, [
+            serializer.fragment(key, records[key]) for key in keys])
+        path = os.path.join(self.tmp, 'file')
+        with open(path, 'wb') as f:
+            f.write(serializer.pack(document))
+        return path, document, offsets
+
+    def testPrettyMatchesJsonDump(self):
+        """The default format is what json.dump(indent=2) writes."""
+        serializer = get_serializer()
+        for records in (RECORDS, {}):
+            document = self.write(serializer, records)[1]
+            self.assertEqual(document.decode(),
+                             json.dumps(records, indent=2))
+
+    def testRoundTrip(self):
+        """Every format and compression reads back what it wrote."""
+        for name in SERIALIZERS:
+            for compression in (None, 'gzip', 'lzma'):
+                serializer = get_serializer(name, compression)
+                path = self.write(serializer)[0]
+                self.assertEqual(list(load_items(path)),
+                                 list(RECORDS.items()))
+                path = os.path.join(self.tmp, 'dumped')
+                serializer.dump(RECORDS.items(), path)
+                self.assertEqual(dict(load_items(path)), RECORDS)
+
+    def testOffsets(self):
+        """The offsets delimit each encoded object in the document."""
+        for name in SERIALIZERS:
+            serializer = get_serializer(name)
+            document, offsets = self.write(serializer)[1:]
+            for key, (start, end) in offsets.items():
+                self.assertEqual(serializer.decode(document[start:end]),
+                                 RECORDS[key])
+
+    def testCompactIsSmaller(self):
+        """Compact JSON and compressed files are smaller than pretty."""
+        sizes = {(row['format'], row['compression']): row['size']
+                 for row in benchmark(RECORDS, repeat=1)}
+        self.assertEqual(len(sizes), 3 * len(SERIALIZERS))
+        self.assertLess(sizes['compact', None], sizes['pretty', None])
+
+    def testUnknownFormat(self):
+        """Unknown formats and compressions are rejected."""
+        self.assertRaises(ValueError, get_serializer, 'xml')
+        self.assertRaises(ValueError, get_serializer, 'pretty', 'zip')
+
+    def testTruncatedMarshal(self):
+        """A truncated binary file raises after the complete records."""
+        path = self.write(get_serializer('marshal'))[0]
+        with open(path, 'rb+') as f:
+            f.truncate(os.path.getsize(path) - 3)
+        items = load_items(path)
+        self.assertEqual(next(items), ("Place.1", RECORDS["Place.1"]))
+        self.assertRaises(ValueError, next, items)
+
+    def testDamagedRecords(self):
+        """A damaged record is skipped with a warning, the others load."""
+        path, document, offsets = self.write(get_serializer('records'))
+        start, end = offsets["Place.1"]
+        with open(path, 'rb+') as f:
+            f.seek(start + 3)
+            f.write(b'X')
+        with self.assertWarns(DamagedRecordsWarning):
+            self.assertEqual(dict(load_items(path)),
+                             {"User.2": RECORDS["User.2"]})
+        report = check_file(path)
+        self.assertEqual((report['format'], report['records']),
+                         ('records', 1))
+        self.assertLessEqual(report['damaged'][0][0], start + 3)
+        self.assertGreater(report['lost'], 0)
+        self.assertIsNone(report['error'])
+
+    def testNoIntactRecord(self):
+        """A file without any intact record is corrupt."""
+        path = os.path.join(self.tmp, 'file')
+        with open(path, 'wb') as f:
+            f.write(b'\x00garbage')
+        with self.assertRaises(CorruptFileError):
+            list(load_items(path))
+
+    def testCheckFile(self):
+        """check_file() reports the records of a file, or its error."""
+        path = self.write(get_serializer('compact', 'gzip'))[0]
+        report = check_file(path)
+        self.assertEqual((report['format'], report['compression'],
+                          report['records'], report['damaged'],
+                          report['error']), ('compact', 'gzip', 2, [], None))
+        with open(path, 'rb+') as f:
+            f.truncate(os.path.getsize(path) - 5)
+        report = check_file(path)
+        self.assertIsNotNone(report['error'])
+        self.assertIsNone(report['lost'])
+
+    def testConvert(self):
+        """The converter rewrites a file in another format."""
+        source = self.write(get_serializer())[0]
+        target = os.path.join(self.tmp, 'converted')
+        self.assertEqual(convert(source, target, 'marshal', 'gzip'), 2)
+        self.assertEqual(dict(load_items(target)), RECORDS)
+        back = os.path.join(self.tmp, 'back')
+        with redirect_stdout(io.StringIO()) as out:
+            main(['convert', target, back])
+        self.assertEqual(out.getvalue(), f"2 objects written to {back}\n")
+        with open(source, 'rb') as f, open(back, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+    def testConvertInPlace(self):
+        """A file converted onto itself keeps its objects, and a failed
+        conversion leaves the target as it was."""
+        path = self.write(get_serializer())[0]
+        self.assertEqual(convert(path, path, 'compact'), 2)
+        self.assertEqual(dict(load_items(path)), RECORDS)
+        with open(path, 'rb') as f:
+            content = f.read()
+        with self.assertRaises(FileNotFoundError):
+            convert(os.path.join(self.tmp, 'missing'), path, 'records')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(len(os.listdir(self.tmp)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()